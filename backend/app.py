@@ -1,40 +1,395 @@
 """
 Flask server for FinSight RAG application
 """
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import os
+import sys
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from ingest import DocumentIngestor
-from groq_client import GroqClient
+import faiss_store
+from ingest import DocumentIngestor, DEFAULT_EMBEDDING_MODEL
+from document_registry import DocumentRegistry, UnknownDocument
+from index_cache import IndexCache
+from embedding_cache import EmbeddingCache
+from page_cache import PageCache
+from jobs import JobManager
+from query_cache import QueryCache
+from context_packer import ContextPacker
+from conversation_store import ConversationStore, SQLiteConversationStore
+from pdf_parser import PDFParser
+from pipeline import IngestionCancelled
+from model_registry import get_registry
+from groq_client import GroqClient, StreamInterrupted
+from metrics import REGISTRY, collect_timings, resident_memory_bytes, span, timings_ms
+from upload_store import (IncomingFile, InvalidUpload, UploadBusy, UploadOffsetMismatch, UploadStore,
+                          UploadTooLarge)
 from dotenv import load_dotenv
 
 # Load environment variables (.env)
 load_dotenv()
 
+
+class UploadRequest(Request):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.incoming_files = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Multipart file parts are written straight to disk and hashed as they
+        # are parsed, instead of being spooled to a temporary file first
+        incoming = upload_store.incoming()
+        self.incoming_files.append(incoming)
+        return incoming
+
+    def close(self):
+        super().close()
+        # Parts of a body that failed to parse never reach request.files;
+        # uncommitted files are deleted here rather than left for expire()
+        for incoming in self.incoming_files:
+            incoming.close()
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app)
 
-# Upload settings
+# Serving: `python app.py` runs one process. gunicorn.conf.py forks WEB_CONCURRENCY
+# workers from a master that called preload(), so the model and indexes are
+# shared copy-on-write. With several workers, state that must be visible to all
+# of them (documents, jobs, conversations) lives on disk.
+WORKERS = int(os.getenv("WEB_CONCURRENCY", 1))
+SHARED_STATE = WORKERS > 1
+STATE_DIR = Path(os.getenv("STATE_DIR", "cache/state"))
+
+# Upload settings: files are streamed to disk in UPLOAD_BLOCK_KB blocks and stored
+# as uploads/<sha256>.pdf, so memory per upload does not grow with the file size
 UPLOAD_FOLDER = Path("uploads")
-UPLOAD_FOLDER.mkdir(exist_ok=True)
 ALLOWED_EXTENSIONS = {"pdf"}
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", 500)) * 1024 * 1024
+upload_store = UploadStore(
+    upload_dir=str(UPLOAD_FOLDER),
+    max_bytes=MAX_UPLOAD_BYTES,
+    block_size=int(os.getenv("UPLOAD_BLOCK_KB", 1024)) * 1024,
+    partial_ttl=float(os.getenv("UPLOAD_PARTIAL_TTL_S", 24 * 3600))
+)
+
+# Resumable uploads (/api/uploads): chunk size suggested to clients
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_MB", 8)) * 1024 * 1024
 
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-app.config["MAX_CONTENT_LENGTH"] = 50 * 1024 * 1024  # 50MB
+# Room for the multipart envelope around the largest accepted file
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 1024 * 1024
+
+# Persistent index cache (re-uploading the same PDF skips re-ingestion)
+index_cache = IndexCache(
+    cache_dir=os.getenv("INDEX_CACHE_DIR", "cache/index"),
+    max_bytes=int(os.getenv("INDEX_CACHE_MAX_MB", 2048)) * 1024 * 1024
+)
+
+# Chunk embeddings keyed by text hash: amended documents only embed changed chunks
+embedding_cache = EmbeddingCache(
+    path=os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite"),
+    max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 500_000))
+)
+
+# Extracted PDF text per (document hash, engine, page): re-parsing a document is free
+page_cache = PageCache(
+    path=os.getenv("PAGE_CACHE_PATH", "cache/pages.sqlite"),
+    max_entries=int(os.getenv("PAGE_CACHE_MAX_PAGES", 200_000))
+)
+
+# Embedding runtime: torch (fp32), torch_int8, onnx or onnx_int8
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+
+# FAISS backend: flat, ivf_flat, ivf_pq, hnsw, or auto (chosen by vector count)
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto")
+
+# Chunking: tokens (sentence-aligned, sized to the model's sequence length) or chars
+CHUNKER = os.getenv("CHUNKER", "tokens")
+
+# Vector encoding: fp32, fp16 (half the memory), sq8 (a quarter) or pq
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "fp32")
+
+# Worker processes for PDF text extraction
+PARSER_WORKERS = int(os.getenv("PDF_PARSER_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Text extraction: pdfplumber, pdftotext (poppler-utils), pdfium, or auto (fastest installed)
+PARSER_BACKEND = os.getenv("PDF_PARSER_BACKEND", "auto")
+
+# Re-extract pages that look tabular with pdfplumber when a faster backend is used
+PARSER_TABLE_FALLBACK = os.getenv("PDF_TABLE_FALLBACK", "1") == "1"
+
+# One parser for all ingestion jobs, so they share a single worker pool
+pdf_parser = PDFParser(
+    workers=PARSER_WORKERS,
+    backend=PARSER_BACKEND,
+    table_fallback=PARSER_TABLE_FALLBACK,
+    page_cache=page_cache
+)
+
+# Repeated questions: cached query embeddings and LLM answers
+query_cache = QueryCache(
+    max_embeddings=int(os.getenv("QUERY_CACHE_EMBEDDINGS", 1024)),
+    max_answers=int(os.getenv("QUERY_CACHE_ANSWERS", 512)),
+    ttl=float(os.getenv("QUERY_CACHE_TTL_S", 3600)),
+    similarity_threshold=float(os.getenv("QUERY_CACHE_SIMILARITY", 0))
+)
 
 # Components
-ingestor = None
-llm_client = GroqClient()
-chat_history = []
-current_filename = None
+# One FAISS shard per uploaded document; cold shards are evicted to disk
+registry = DocumentRegistry(
+    DEFAULT_EMBEDDING_MODEL,
+    query_cache=query_cache,
+    shard_dir=os.getenv("SHARD_DIR", "cache/shards"),
+    memory_budget=int(os.getenv("SHARD_MEMORY_MB", 1024)) * 1024 * 1024,
+    search_workers=int(os.getenv("SHARD_SEARCH_WORKERS", 4)),
+    embedding_backend=EMBEDDING_BACKEND,
+    shared=SHARED_STATE
+)
+llm_client = GroqClient(cache=query_cache)
+state_lock = threading.Lock()
+
+# Post-retrieval: MMR over fetch_k candidates, overlap trimming, prompt token budget
+context_packer = ContextPacker(
+    top_k=int(os.getenv("CONTEXT_TOP_K", 6)),
+    fetch_k=int(os.getenv("RETRIEVAL_FETCH_K", 20)),
+    mmr_lambda=float(os.getenv("MMR_LAMBDA", 0.7)),
+    max_context_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", 1500))
+)
+
+# Per-session chat history: idle sessions expire, the least recently used are
+# evicted beyond the cap, and each prompt carries a token-budgeted history.
+# With CONVERSATION_SUMMARIZE=1 dropped turns are folded into a running summary.
+conversation_settings = dict(
+    max_sessions=int(os.getenv("CONVERSATION_MAX_SESSIONS", 1000)),
+    ttl=float(os.getenv("CONVERSATION_TTL_S", 3600)),
+    max_history_tokens=int(os.getenv("HISTORY_MAX_TOKENS", 1500)),
+    summarizer=llm_client.summarize if os.getenv("CONVERSATION_SUMMARIZE", "0") == "1" else None
+)
+if SHARED_STATE:
+    conversation_store = SQLiteConversationStore(path=str(STATE_DIR / "conversations.sqlite"),
+                                                 **conversation_settings)
+else:
+    conversation_store = ConversationStore(**conversation_settings)
+
+# End-to-end budget for a query; the LLM call gets whatever is left after retrieval
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT_S", 30))
+
+# Batch queries: max questions per request and concurrent LLM calls
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", 50))
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BATCH_LLM_CONCURRENCY", 4)),
+    thread_name_prefix="batch-llm"
+)
+
+# Background ingestion; the limit keeps CPU free for /api/query traffic
+job_manager = JobManager(
+    max_workers=int(os.getenv("INGEST_WORKERS", 2)),
+    store_path=str(STATE_DIR / "jobs.sqlite") if SHARED_STATE else None
+)
+
+# /api/query includes a per-stage timing breakdown when the request sets
+# "timings": true, or always with QUERY_TIMINGS=1
+QUERY_TIMINGS = os.getenv("QUERY_TIMINGS", "0") == "1"
+
+# Metrics at /metrics. With several workers each one writes its counters to
+# STATE_DIR/metrics at most every METRICS_FLUSH_S, and any worker answering a
+# scrape reports the totals.
+if SHARED_STATE:
+    REGISTRY.enable_multiprocess(str(STATE_DIR / "metrics"), float(os.getenv("METRICS_FLUSH_S", 5)))
+
+HTTP_REQUESTS = REGISTRY.counter("finsight_http_requests_total", "HTTP requests by route and status",
+                                 ["method", "route", "status"])
+# Streamed responses are measured until the response starts, not until the body ends
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("finsight_http_request_seconds", "HTTP request latency by route",
+                                          ["method", "route"])
+
+
+def _cache_counts(field):
+    stats = query_cache.stats()
+    return {
+        "query_embedding": stats["embeddings"][field],
+        "answer": stats["answers"][field],
+        "chunk_embedding": embedding_cache.stats()[field],
+        "page": page_cache.stats()[field]
+    }
+
+
+def _job_counts():
+    counts = dict.fromkeys(("queued", "running", "succeeded", "failed", "cancelled"), 0)
+    for job in job_manager.list():
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    return counts
+
+
+REGISTRY.counter("finsight_cache_hits_total", "Cache hits", ["cache"], function=lambda: _cache_counts("hits"))
+REGISTRY.counter("finsight_cache_misses_total", "Cache misses", ["cache"], function=lambda: _cache_counts("misses"))
+REGISTRY.counter("finsight_answer_cache_near_duplicate_hits_total", "Answers served for a near-duplicate question",
+                 function=lambda: query_cache.stats()["answers"]["near_duplicate_hits"])
+REGISTRY.gauge("finsight_documents", "Indexed documents", function=lambda: len(registry))
+REGISTRY.gauge("finsight_index_vectors", "Vectors across all indexed documents",
+               function=lambda: sum(d["chunks"] for d in registry.list()))
+REGISTRY.gauge("finsight_index_loaded_documents", "Document shards loaded in memory",
+               function=lambda: sum(1 for d in registry.list() if d["loaded"]), per_process=True)
+REGISTRY.gauge("finsight_index_memory_bytes", "Memory of the loaded document shards",
+               function=lambda: sum(d["memory_bytes"] for d in registry.list() if d["loaded"]), per_process=True)
+REGISTRY.gauge("finsight_conversation_sessions", "Active chat sessions",
+               function=lambda: conversation_store.stats()["sessions"])
+REGISTRY.gauge("finsight_ingestion_jobs", "Ingestion jobs by status", ["status"], function=_job_counts)
+REGISTRY.gauge("finsight_model_ready", "1 once the embedding model is loaded and warmed up",
+               function=lambda: int(get_registry().status(DEFAULT_EMBEDDING_MODEL, EMBEDDING_BACKEND)["state"]
+                                    == "ready"), per_process=True)
+REGISTRY.gauge("finsight_process_resident_memory_bytes", "Resident memory of the server process",
+               function=resident_memory_bytes, per_process=True)
+
+
+# Nothing heavy is imported or loaded at module level (faiss, pdfplumber and
+# torch are imported on first use), so the server binds and /api/health answers
+# at once; /api/ready turns 200 when the background warmup has finished.
+def start_warmup():
+    """
+    Server start-up: drop shards a previous run left behind, then load the
+    embedding model and run a dummy encode on a background thread
+
+    Not done at import: processes started with forkserver or spawn import
+    the main module again.
+    """
+    registry.remove_stale_shards()
+    threading.Thread(
+        target=get_registry().warmup,
+        args=([DEFAULT_EMBEDDING_MODEL], EMBEDDING_BACKEND),
+        daemon=True
+    ).start()
+
+
+def preload():
+    """
+    Load model weights and persisted shards in the gunicorn master, after the
+    socket is bound and before forking (called from gunicorn.conf.py)
+
+    No inference runs here: thread pools (torch, OpenMP) must not exist at fork time.
+    """
+    try:
+        get_registry().get(DEFAULT_EMBEDDING_MODEL, EMBEDDING_BACKEND)
+        registry.sync(load=True)
+    except Exception as e:
+        # Workers retry in their own warmup; /api/ready reports the failure
+        print(f"Preload failed: {e}")
+
+
+def on_worker_start(threads):
+    """
+    Per-worker setup after fork (called from gunicorn.conf.py)
+
+    Args:
+        threads: CPU threads this worker may use for inference and search,
+            so workers do not oversubscribe the cores
+    """
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    faiss_store.faiss.omp_set_num_threads(threads)
+    start_warmup()
+
+
+def shutdown():
+    """Stop background work cleanly: cancel ingestion, drain pools, close databases"""
+    print(f"Worker {os.getpid()} shutting down")
+    REGISTRY.remove_snapshot()
+    job_manager.shutdown(wait=True)
+    pdf_parser.shutdown()
+    batch_executor.shutdown(wait=True, cancel_futures=True)
+    registry.shutdown()
+    conversation_store.shutdown()
+    embedding_cache.close()
+    page_cache.close()
 
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def json_body():
+    """The request body if it is a JSON object, else None"""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+
+def selected_documents(data):
+    """
+    Documents a query should search
+
+    `document_ids` may be a list of ids or "all"; when omitted the most
+    recently uploaded document is used. Raises ValueError for anything else.
+    """
+    document_ids = data.get("document_ids")
+    if document_ids == "all":
+        return None
+    if document_ids is not None:
+        if not isinstance(document_ids, list) or not all(isinstance(d, str) and d for d in document_ids):
+            raise ValueError('document_ids must be "all" or a list of document ids')
+        if document_ids:
+            return list(document_ids)
+    current_document_id = registry.latest_id()
+    return [current_document_id] if current_document_id else None
+
+
+def wants_timings(data):
+    return QUERY_TIMINGS or bool(data.get("timings"))
+
+
+def session_id_of(data):
+    """Conversation a request belongs to; a new one is issued when none is given"""
+    return (data.get("session_id") or request.headers.get("X-Session-Id")
+            or conversation_store.new_session_id())
+
+
+def retrieve(query_embeddings, document_ids):
+    """
+    Retrieve candidates for each query and pack them into prompt context
+
+    Returns:
+        List of (cited chunks, prompt chunks, token report) tuples, one per
+        query; cited chunks keep their full text for the client
+    """
+    with span("search"):
+        candidates = registry.search_batch(
+            query_embeddings, document_ids, top_k=context_packer.fetch_k, with_vectors=True
+        )
+    with span("pack"):
+        return [
+            context_packer.pack(embedding, per_query)
+            for embedding, per_query in zip(query_embeddings, candidates)
+        ]
+
+
+def documents_key(document_ids):
+    """Answer-cache key for the set of documents a query searched"""
+    if document_ids is None:
+        document_ids = [d["document_id"] for d in registry.list()]
+    return "+".join(sorted(document_ids))
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+    if "request_started" in g:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, method=request.method, route=route)
+    REGISTRY.maybe_flush()
+    return response
+
+
 # ----------------------------------------------------
 # HEALTH CHECK
 # ----------------------------------------------------
@@ -46,13 +401,39 @@ def health():
     })
 
 
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    """Readiness: 200 once the embedding model is loaded and warmed up, 503 before"""
+    model = get_registry().status(DEFAULT_EMBEDDING_MODEL, EMBEDDING_BACKEND)
+    documents = registry.list()
+    is_ready = model["state"] == "ready"
+    return jsonify({
+        "ready": is_ready,
+        "model": {"name": DEFAULT_EMBEDDING_MODEL, "backend": EMBEDDING_BACKEND, **model},
+        "index": {
+            "faiss_loaded": faiss_store.faiss.loaded,
+            "documents": len(documents),
+            "loaded_documents": sum(1 for d in documents if d["loaded"])
+        }
+    }), 200 if is_ready else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ----------------------------------------------------
 # PDF UPLOAD ROUTE
 # ----------------------------------------------------
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({"error": f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}), 413
+
+
 @app.route("/api/upload", methods=["POST"])
 def upload_pdf():
-    global ingestor, chat_history, current_filename
-
     if "file" not in request.files:
         return jsonify({"error": "No file provided"}), 400
 
@@ -64,30 +445,204 @@ def upload_pdf():
     if not allowed_file(file.filename):
         return jsonify({"error": "Only PDF files are allowed"}), 400
 
+    # Optional: id of an indexed document this upload amends
+    replaces = request.form.get("replaces") or None
+    if replaces and registry.get(replaces) is None:
+        return jsonify({"error": f"Unknown document id: {replaces}"}), 404
+
+    try:
+        # Already on disk and hashed (see UploadRequest); this only renames it
+        stored = upload_store.commit(file.stream) if isinstance(file.stream, IncomingFile) \
+            else upload_store.save_stream(file.stream)
+    except InvalidUpload as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
-        filename = secure_filename(file.filename)
-        filepath = UPLOAD_FOLDER / filename
-        file.save(filepath)
+        # The uploader's conversation starts over once the new document is indexed
+        session_id = request.form.get("session_id") or request.headers.get("X-Session-Id")
+        return jsonify(submit_ingestion(stored, secure_filename(file.filename), replaces, session_id)), 202
+
+    except Exception as e:
+        print("Error in upload:", e)
+        return jsonify({"error": str(e)}), 500
+
 
-        # Initialize ingestor
-        ingestor = DocumentIngestor()
+def submit_ingestion(stored, filename, replaces=None, session_id=None):
+    """Queue ingestion of a stored upload; returns the upload response body"""
+    # Process PDF → extract text, chunk it, embed it, store FAISS index
+    job = job_manager.submit(
+        filename, lambda job: _ingest(job, stored.path, filename, replaces, session_id, stored.sha256)
+    )
+    return {
+        "status": job.status,
+        "job_id": job.id,
+        "filename": filename,
+        "sha256": stored.sha256,
+        "bytes": stored.size
+    }
 
-        # Process PDF → extract text, chunk it, embed it, store FAISS index
-        result = ingestor.ingest_pdf(str(filepath))
 
-        chat_history = []
-        current_filename = filename
+# ----------------------------------------------------
+# RESUMABLE CHUNKED UPLOAD
+# ----------------------------------------------------
+@app.route("/api/uploads", methods=["POST"])
+def create_upload():
+    data = json_body() or {}
+    filename = secure_filename(data.get("filename") or "")
+
+    if not filename or not allowed_file(filename):
+        return jsonify({"error": "Only PDF files are allowed"}), 400
 
-        return jsonify({
-            "status": "success",
-            "filename": filename,
-            "pages": result["total_pages"],
-            "chunks": result["total_chunks"]
+    replaces = data.get("replaces") or None
+    if replaces and registry.get(replaces) is None:
+        return jsonify({"error": f"Unknown document id: {replaces}"}), 404
+
+    try:
+        status = upload_store.create(filename, int(data.get("size") or 0), {
+            "replaces": replaces,
+            "session_id": data.get("session_id") or request.headers.get("X-Session-Id")
         })
+    except UploadTooLarge as e:
+        return jsonify({"error": e.description}), 413
+    except (InvalidUpload, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
 
-    except Exception as e:
-        print("Error in upload:", e)
-        return jsonify({"error": str(e)}), 500
+    return jsonify({**status, "chunk_size": UPLOAD_CHUNK_BYTES}), 201
+
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    try:
+        return jsonify(upload_store.status(upload_id))
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+
+
+@app.route("/api/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    """
+    Append the request body at ?offset= (or an Upload-Offset header); when the
+    last byte arrives the file is stored and ingestion starts (202 with job_id)
+    """
+    offset = request.args.get("offset", request.headers.get("Upload-Offset"))
+    if offset is None or not str(offset).isdigit():
+        return jsonify({"error": "offset is required"}), 400
+
+    try:
+        status = upload_store.append(upload_id, int(offset), request.stream)
+        if status["offset"] < status["size"]:
+            return jsonify(status)
+
+        stored, info = upload_store.complete(upload_id)
+        metadata = info["metadata"]
+        return jsonify(submit_ingestion(stored, info["filename"], metadata.get("replaces"),
+                                        metadata.get("session_id"))), 202
+
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+    except UploadOffsetMismatch as e:
+        # The client resumes from the returned offset
+        return jsonify({"error": str(e), "offset": e.offset}), 409
+    except UploadBusy as e:
+        return jsonify({"error": str(e)}), 409
+    except InvalidUpload as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/api/uploads/<upload_id>", methods=["DELETE"])
+def abort_upload(upload_id):
+    try:
+        if not upload_store.abort(upload_id):
+            return jsonify({"error": "Upload not found"}), 404
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify({"status": "success"})
+
+
+def _ingest(job, filepath, filename, replaces=None, session_id=None, document_hash=None):
+    """Run ingestion for an upload job and register the document"""
+    # Initialize ingestor (reuses the already-loaded embedding model)
+    job_ingestor = DocumentIngestor(
+        index_cache=index_cache,
+        query_cache=query_cache,
+        index_type=INDEX_TYPE,
+        embedding_cache=embedding_cache,
+        embedding_backend=EMBEDDING_BACKEND,
+        vector_storage=VECTOR_STORAGE,
+        chunker=CHUNKER,
+        pdf_parser=pdf_parser
+    )
+    if replaces:
+        # Amended filing: diff against the previous version's index
+        result = job_ingestor.update_pdf(
+            str(filepath),
+            registry.load_store(replaces),
+            progress=job.update_progress,
+            cancel_event=job.cancel_event,
+            document_hash=document_hash
+        )
+    else:
+        result = job_ingestor.ingest_pdf(
+            str(filepath),
+            progress=job.update_progress,
+            cancel_event=job.cancel_event,
+            document_hash=document_hash
+        )
+
+    with state_lock:
+        # Reset or cancel may have raced with a cache hit
+        if job.cancel_event.is_set():
+            raise IngestionCancelled()
+
+        document_id = result["document_hash"][:16]
+        registry.add(document_id, filename, job_ingestor.vector_store, result["total_pages"])
+        if replaces and replaces != document_id:
+            registry.remove(replaces)
+        if session_id:
+            conversation_store.clear(session_id)
+
+    response = {
+        "document_id": document_id,
+        "filename": filename,
+        "pages": result["total_pages"],
+        "chunks": result["total_chunks"],
+        "cached": result["cached"]
+    }
+    if replaces:
+        response.update({
+            "replaces": replaces,
+            "added": result.get("added", 0),
+            "removed": result.get("removed", 0)
+        })
+    return response
+
+
+# ----------------------------------------------------
+# INGESTION JOB STATUS
+# ----------------------------------------------------
+@app.route("/api/jobs", methods=["GET"])
+def list_jobs():
+    return jsonify({"jobs": job_manager.list()})
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job.to_dict())
+
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job.to_dict())
 
 
 # ----------------------------------------------------
@@ -95,53 +650,243 @@ def upload_pdf():
 # ----------------------------------------------------
 @app.route("/api/query", methods=["POST"])
 def query():
-    global ingestor, llm_client, chat_history
-
-    if not ingestor:
+    if not len(registry):
         return jsonify({"error": "No document uploaded"}), 400
 
-    data = request.get_json()
-    query_text = data.get("query", "").strip()
+    data = json_body()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    query_text = data.get("query")
 
-    if not query_text:
+    if not isinstance(query_text, str) or not query_text.strip():
         return jsonify({"error": "Query cannot be empty"}), 400
+    query_text = query_text.strip()
 
     try:
-        # RAG: semantic search → top_k chunks
-        retrieved_chunks = ingestor.query(query_text, top_k=6)
-
-        # LLM answer generation
-        answer = llm_client.generate_answer(query_text, retrieved_chunks, chat_history)
+        document_ids = selected_documents(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Maintain conversation history
-        chat_history.append({"role": "user", "content": query_text})
-        chat_history.append({"role": "assistant", "content": answer})
+    started = time.perf_counter()
+    deadline = time.monotonic() + QUERY_TIMEOUT
+    session_id = session_id_of(data)
 
-        if len(chat_history) > 20:
-            chat_history = chat_history[-20:]
-
-        return jsonify({
+    try:
+        with collect_timings() as timings:
+            # RAG: semantic search over the selected documents, then MMR and
+            # context packing → diverse, de-duplicated chunks within the token budget
+            with span("embed"):
+                query_embedding = registry.embedder.embed_query(query_text)
+            retrieved_chunks, prompt_chunks, context = retrieve(query_embedding[None, :], document_ids)[0]
+
+            # LLM answer generation
+            with span("history"):
+                history = conversation_store.history(session_id)
+            answer = llm_client.generate_answer(
+                query_text, prompt_chunks, history,
+                deadline=deadline,
+                document_hash=documents_key(document_ids),
+                query_embedding=query_embedding
+            )
+
+            # Maintain conversation history
+            with span("history"):
+                conversation_store.append(session_id, query_text, answer)
+
+        response = {
             "answer": answer,
-            "chunks": retrieved_chunks
-        })
+            "chunks": retrieved_chunks,
+            "context": context,
+            "session_id": session_id
+        }
+        if wants_timings(data):
+            response["timings"] = timings_ms(timings, time.perf_counter() - started)
+        return jsonify(response)
+
+    except UnknownDocument as e:
+        return jsonify({"error": str(e)}), 404
 
     except Exception as e:
         print("Query error:", e)
         return jsonify({"error": str(e)}), 500
 
 
+# ----------------------------------------------------
+# QUERY PDF (MANY QUESTIONS AT ONCE)
+# ----------------------------------------------------
+@app.route("/api/query/batch", methods=["POST"])
+def query_batch():
+    if not len(registry):
+        return jsonify({"error": "No document uploaded"}), 400
+
+    data = json_body()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    queries = data.get("queries")
+
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "queries must be a non-empty list"}), 400
+
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}), 400
+
+    try:
+        document_ids = selected_documents(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    deadline = time.monotonic() + QUERY_TIMEOUT
+    documents = documents_key(document_ids)
+    queries = [q.strip() if isinstance(q, str) else "" for q in queries]
+    valid = [i for i, q in enumerate(queries) if q]
+
+    try:
+        # One embedding forward pass and one matrix search per shard for every question
+        with span("embed"):
+            embeddings = registry.embedder.embed_queries([queries[i] for i in valid]) if valid else []
+        retrieved = retrieve(embeddings, document_ids) if valid else []
+    except UnknownDocument as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        print("Batch query error:", e)
+        return jsonify({"error": str(e)}), 500
+
+    def answer(position):
+        i = valid[position]
+        try:
+            # Batch questions are independent: no shared chat history
+            chunks, prompt_chunks, context = retrieved[position]
+            return {
+                "query": queries[i],
+                "answer": llm_client.generate_answer(
+                    queries[i], prompt_chunks, None,
+                    deadline=deadline,
+                    document_hash=documents,
+                    query_embedding=embeddings[position]
+                ),
+                "chunks": chunks,
+                "context": context
+            }
+        except Exception as e:
+            print("Batch query error:", e)
+            return {"query": queries[i], "error": str(e)}
+
+    answers = dict(zip(valid, batch_executor.map(answer, range(len(valid)))))
+
+    results = [
+        answers.get(i, {"query": q, "error": "Query cannot be empty"})
+        for i, q in enumerate(queries)
+    ]
+    return jsonify({"results": results})
+
+
+# ----------------------------------------------------
+# QUERY PDF (STREAMING, SERVER-SENT EVENTS)
+# ----------------------------------------------------
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/api/query/stream", methods=["POST"])
+def query_stream():
+    if not len(registry):
+        return jsonify({"error": "No document uploaded"}), 400
+
+    data = json_body()
+    if data is None:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    query_text = data.get("query")
+
+    if not isinstance(query_text, str) or not query_text.strip():
+        return jsonify({"error": "Query cannot be empty"}), 400
+    query_text = query_text.strip()
+
+    try:
+        document_ids = selected_documents(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + QUERY_TIMEOUT
+    session_id = session_id_of(data)
+
+    def generate():
+        try:
+            with span("embed"):
+                query_embedding = registry.embedder.embed_query(query_text)
+            retrieved_chunks, prompt_chunks, context = retrieve(query_embedding[None, :], document_ids)[0]
+            retrieval_ms = (time.perf_counter() - started) * 1000
+
+            # Send citations first so the UI can render them while the answer streams
+            yield _sse("chunks", retrieved_chunks)
+
+            answer_parts = []
+            first_token_ms = None
+            answer_stream = llm_client.stream_answer(
+                query_text, prompt_chunks, conversation_store.history(session_id),
+                deadline=deadline,
+                document_hash=documents_key(document_ids),
+                query_embedding=query_embedding
+            )
+            for delta in answer_stream:
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                answer_parts.append(delta)
+                yield _sse("token", {"delta": delta})
+
+            # Reached only when the answer is complete; a cut-off stream raises
+            # StreamInterrupted and is neither stored in the history nor cached
+            answer = "".join(answer_parts)
+            conversation_store.append(session_id, query_text, answer)
+
+            yield _sse("done", {
+                "retrieval_ms": round(retrieval_ms, 1),
+                "time_to_first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                "context": context,
+                "session_id": session_id
+            })
+
+        except StreamInterrupted as e:
+            print("Streaming query interrupted:", e)
+            yield _sse("error", {"error": str(e), "truncated": True})
+
+        except Exception as e:
+            print("Streaming query error:", e)
+            yield _sse("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ----------------------------------------------------
+# QUERY CACHE STATS
+# ----------------------------------------------------
+@app.route("/api/cache", methods=["GET"])
+def cache_stats():
+    return jsonify({
+        **query_cache.stats(),
+        "chunk_embeddings": embedding_cache.stats(),
+        "pages": page_cache.stats(),
+        "conversations": conversation_store.stats()
+    })
+
+
 # ----------------------------------------------------
 # GET SPECIFIC CHUNK
 # ----------------------------------------------------
 @app.route("/api/chunk/<int:chunk_id>", methods=["GET"])
 def get_chunk(chunk_id):
-    global ingestor
+    document_id = request.args.get("document_id") or registry.latest_id()
 
-    if not ingestor:
+    if not document_id:
         return jsonify({"error": "No document uploaded"}), 400
 
     try:
-        chunk = ingestor.get_chunk(chunk_id)
+        chunk = registry.get_chunk(document_id, chunk_id)
 
         if not chunk:
             return jsonify({"error": "Chunk not found"}), 404
@@ -153,23 +898,40 @@ def get_chunk(chunk_id):
         return jsonify({"error": str(e)}), 500
 
 
+# ----------------------------------------------------
+# DOCUMENTS
+# ----------------------------------------------------
+@app.route("/api/documents", methods=["GET"])
+def list_documents():
+    return jsonify({
+        "documents": registry.list(),
+        "current_document_id": registry.latest_id()
+    })
+
+
+@app.route("/api/documents/<document_id>", methods=["DELETE"])
+def delete_document(document_id):
+    if not registry.remove(document_id):
+        return jsonify({"error": "Document not found"}), 404
+
+    return jsonify({"status": "success"})
+
+
 # ----------------------------------------------------
 # RESET EVERYTHING
 # ----------------------------------------------------
 @app.route("/api/reset", methods=["POST"])
 def reset():
-    global ingestor, chat_history, current_filename
-
     try:
-        if ingestor:
-            ingestor.reset()
+        for job in job_manager.list():
+            if job["status"] in ("queued", "running"):
+                job_manager.cancel(job["job_id"])
 
-        ingestor = None
-        chat_history = []
-        current_filename = None
+        with state_lock:
+            registry.clear()
+            conversation_store.clear_all()
 
-        for file in UPLOAD_FOLDER.glob("*.pdf"):
-            file.unlink()
+        upload_store.clear()
 
         return jsonify({"status": "success"})
 
@@ -197,5 +959,7 @@ def serve_frontend(path):
 # START SERVER
 # ----------------------------------------------------
 if __name__ == "__main__":
+    # Development server; use `gunicorn -c gunicorn.conf.py app:app` in production
     port = int(os.getenv("PORT", 3000))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    start_warmup()
+    app.run(host="0.0.0.0", port=port, debug=os.getenv("FLASK_DEBUG", "0") == "1", threaded=True)
@@ -0,0 +1,152 @@
+"""
+Recall vs latency benchmark for the FAISSStore index backends
+
+Compares every backend and vector storage (fp32, fp16, sq8, pq) against the
+exact flat float32 index on the same vectors, including bytes per vector.
+Uses synthetic clustered embeddings by default, or the vectors of a saved
+index (--index) so settings can be picked from real data.
+
+Usage:
+    python backend/benchmarks/ann_benchmark.py --num-vectors 100000
+    python backend/benchmarks/ann_benchmark.py --storage fp32 fp16 sq8 --backends flat hnsw
+    python backend/benchmarks/ann_benchmark.py --index cache/index/<key>/index.faiss --json out.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from faiss_store import INDEX_TYPES, STORAGE_TYPES, build_index, index_storage, unwrap_index  # noqa: E402
+
+
+def synthetic_vectors(num_vectors: int, dimension: int, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    """Normalized vectors drawn around random centroids, like real embeddings"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((clusters, dimension)).astype('float32')
+    labels = rng.integers(0, clusters, num_vectors)
+    vectors = centroids[labels] + 0.5 * rng.standard_normal((num_vectors, dimension)).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def time_queries(index, queries: np.ndarray, k: int):
+    """Search one query at a time (like /api/query) and collect latencies"""
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results[i] = ids[0]
+    return results, np.array(latencies)
+
+
+def bytes_per_vector(index) -> float:
+    return round(faiss.serialize_index(index).nbytes / index.ntotal, 1)
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, k: int, nprobes, ef_searches,
+        backends=INDEX_TYPES, storages=('fp32',)) -> list:
+    num_vectors, dimension = vectors.shape
+    rows = []
+
+    exact, _ = build_index('flat', dimension, num_vectors)
+    exact.add(vectors)
+    truth, flat_latency = time_queries(exact, queries, k)
+    rows.append({'backend': 'flat', 'storage': 'fp32', 'param': None, 'build_seconds': 0.0, 'recall': 1.0,
+                 'bytes_per_vector': bytes_per_vector(exact),
+                 'p50_ms': float(np.percentile(flat_latency, 50)),
+                 'p95_ms': float(np.percentile(flat_latency, 95))})
+
+    params = {'flat': (None, [None]), 'ivf_flat': ('nprobe', nprobes),
+              'ivf_pq': ('nprobe', nprobes), 'hnsw': ('efSearch', ef_searches)}
+    for index_type in backends:
+        param_name, values = params[index_type]
+        # ivf_pq always stores PQ codes, so the storage option does not apply
+        for storage in (['pq'] if index_type == 'ivf_pq' else storages):
+            if index_type == 'flat' and storage == 'fp32':
+                continue
+            started = time.perf_counter()
+            index, effective = build_index(index_type, dimension, num_vectors, storage=storage)
+            if effective != index_type or (index_type != 'ivf_pq' and index_storage(index) != storage):
+                print(f"Skipping {index_type}/{storage}: too few vectors to train")
+                continue
+            if not index.is_trained:
+                index.train(vectors)
+            index.add(vectors)
+            build_seconds = time.perf_counter() - started
+
+            for value in values:
+                if param_name == 'nprobe':
+                    index.nprobe = value
+                elif param_name == 'efSearch':
+                    index.hnsw.efSearch = value
+                found, latency = time_queries(index, queries, k)
+                rows.append({
+                    'backend': index_type,
+                    'storage': storage,
+                    'param': f"{param_name}={value}" if param_name else None,
+                    'build_seconds': round(build_seconds, 3),
+                    'recall': round(recall_at_k(found, truth), 4),
+                    'bytes_per_vector': bytes_per_vector(index),
+                    'p50_ms': float(np.percentile(latency, 50)),
+                    'p95_ms': float(np.percentile(latency, 95))
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num-vectors', type=int, default=50_000)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--index', help='Benchmark on the vectors of a saved flat/HNSW index instead')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--ef-search', type=int, nargs='+', default=[16, 32, 64, 128])
+    parser.add_argument('--backends', nargs='+', default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument('--storage', nargs='+', default=['fp32'], choices=STORAGE_TYPES,
+                        help='Vector encodings to compare against flat fp32')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    if args.index:
+        saved = unwrap_index(faiss.read_index(args.index))
+        vectors = saved.reconstruct_n(0, saved.ntotal)
+    else:
+        vectors = synthetic_vectors(args.num_vectors, args.dimension)
+
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    # Perturb so queries are near, not identical to, indexed vectors
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype('float32')
+    faiss.normalize_L2(queries)
+
+    rows = run(vectors, queries, args.k, args.nprobe, args.ef_search, args.backends, args.storage)
+
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, recall@{args.k}")
+    print(f"{'backend':<10} {'storage':<8} {'param':<14} {'build s':>8} {'recall':>7} {'B/vec':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8}")
+    for row in rows:
+        print(f"{row['backend']:<10} {row['storage']:<8} {row['param'] or '-':<14} {row['build_seconds']:>8.2f} "
+              f"{row['recall']:>7.3f} {row['bytes_per_vector']:>7.1f} {row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'num_vectors': len(vectors), 'dimension': int(vectors.shape[1]),
+                       'queries': len(queries), 'k': args.k, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,376 @@
+"""
+End-to-end ingest and query benchmark on a synthetic financial-PDF corpus
+
+For each document (generated by synthetic_pdf.py, or given with --pdf):
+  * stages in isolation: parse (PDFParser), chunk, embed (Embedder) and
+    index (FAISSStore), each with its own throughput
+  * text extraction per parser backend (pdfplumber, pdftotext, pdfium; the
+    fast ones with their pdfplumber table fallback): pages/s cold, pages
+    re-extracted by the fallback, and pages/s from a warm page cache
+  * DocumentIngestor.ingest_pdf end to end (caches off), with the streaming
+    pipeline's per-stage busy time
+  * retrieval for generated questions: query embedding, vector search and
+    context packing (MMR + token budget) timed separately per query, plus
+    batched queries/s. The LLM call is not included.
+
+Reports pages/s, chunks/s, queries/s, p50/p95/p99 latencies and peak RSS, and
+writes JSON for comparing runs (--baseline prints the change against one).
+Runs offline: the model is loaded from the local Hugging Face cache
+(--online allows downloads), and --embedder hashing needs no model at all.
+
+Usage:
+    python backend/benchmarks/e2e_benchmark.py --pages 20 200 --json run.json
+    python backend/benchmarks/e2e_benchmark.py --embedder hashing --pages 500 --tables-per-page 3
+    python backend/benchmarks/e2e_benchmark.py --pdf report.pdf --baseline run.json
+    python backend/benchmarks/e2e_benchmark.py --embedder hashing --tables-per-page 0 --parser-backends pdfplumber pdfium
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from synthetic_pdf import questions, write_pdf  # noqa: E402
+
+HASHING_MODEL = 'hashing-384'
+
+
+class HashingModel:
+    def __init__(self, dimension: int = 384):
+        """
+        Model-free stand-in for the sentence transformer: signed feature
+        hashing of lowercased words. Keeps every non-model stage measurable
+        on a machine without the model weights.
+
+        Args:
+            dimension: Embedding size (384 like all-MiniLM-L6-v2)
+        """
+        self.dimension = dimension
+        self.max_seq_length = 256
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts, batch_size: int = 32, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        output = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'little')
+                output[row, digest % self.dimension] += 1.0 if digest >> 63 else -1.0
+        # Avoid zero vectors, which cannot be normalized
+        output[:, 0] += 1e-3
+        return output
+
+
+def peak_rss_mb(children: bool = False) -> float:
+    """Peak resident set size so far (of the parser worker processes if children)"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def latency_ms(seconds) -> dict:
+    ms = np.asarray(seconds) * 1000
+    return {
+        'mean': round(float(ms.mean()), 3),
+        'p50': round(float(np.percentile(ms, 50)), 3),
+        'p95': round(float(np.percentile(ms, 95)), 3),
+        'p99': round(float(np.percentile(ms, 99)), 3)
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def bench_stages(pdf_path: str, ingestor, repeat: int) -> dict:
+    """Each stage on its own, on the output of the previous one"""
+    from faiss_store import FAISSStore
+
+    runs = {'parse': [], 'chunk': [], 'embed': [], 'index': []}
+    batch_seconds = []
+    for _ in range(repeat):
+        parsed, seconds = timed(ingestor.pdf_parser.parse_pdf, pdf_path)
+        runs['parse'].append(seconds)
+        chunks, seconds = timed(ingestor.chunker.chunk_text, parsed['pages'])
+        runs['chunk'].append(seconds)
+
+        texts = [chunk['text'] for chunk in chunks]
+        embeddings = []
+        started = time.perf_counter()
+        for start in range(0, len(texts), ingestor.embed_batch_size):
+            batch, seconds = timed(ingestor.embedder.embed_texts,
+                                   texts[start:start + ingestor.embed_batch_size], show_progress_bar=False)
+            embeddings.append(batch)
+            batch_seconds.append(seconds)
+        runs['embed'].append(time.perf_counter() - started)
+
+        store = FAISSStore(dimension=ingestor.embedder.dimension, index_type=ingestor.vector_store.index_type,
+                           storage=ingestor.vector_store.storage)
+        started = time.perf_counter()
+        for start, batch in zip(range(0, len(chunks), ingestor.embed_batch_size), embeddings):
+            store.add_embeddings(batch, [dict(c) for c in chunks[start:start + ingestor.embed_batch_size]])
+        store.finalize()
+        runs['index'].append(time.perf_counter() - started)
+
+    pages, count = parsed['total_pages'], len(chunks)
+    units = {'parse': ('pages_per_s', pages), 'chunk': ('chunks_per_s', count),
+             'embed': ('chunks_per_s', count), 'index': ('chunks_per_s', count)}
+    stages = {}
+    for name, seconds in runs.items():
+        unit, items = units[name]
+        median = float(np.median(seconds))
+        stages[name] = {'seconds': round(median, 4), unit: round(items / median, 1) if median > 0 else None}
+    stages['embed']['batch_latency_ms'] = latency_ms(batch_seconds)
+    return {'pages': pages, 'chunks': count, 'stages': stages, 'store': store}
+
+
+def bench_parsers(pdf_path: str, backends, workers: int, repeat: int, cache_dir: str) -> dict:
+    """Text extraction alone for each parser backend, cold and from a warm page cache"""
+    from index_cache import hash_file
+    from page_cache import PageCache
+    from pdf_parser import PARSED_PAGES, PDFParser
+
+    document_hash = hash_file(pdf_path)
+    results = {}
+    for backend in backends:
+        parser = PDFParser(workers=workers, backend=backend)
+        extracted_before = PARSED_PAGES.values()
+        seconds = [timed(parser.parse_pdf, pdf_path)[1] for _ in range(repeat)]
+        extracted = {engine: int(count - extracted_before.get((engine,), 0)) // repeat
+                     for (engine,), count in PARSED_PAGES.values().items()}
+
+        page_cache = PageCache(os.path.join(cache_dir, f"pages_{backend}.sqlite"))
+        cached = PDFParser(workers=workers, backend=backend, page_cache=page_cache)
+        cached.parse_pdf(pdf_path, document_hash)
+        cached_seconds = [timed(cached.parse_pdf, pdf_path, document_hash)[1] for _ in range(repeat)]
+        cached.shutdown()
+        page_cache.close()
+
+        parser.shutdown()
+        pages = parser.count_pages(pdf_path)
+        median, cached_median = float(np.median(seconds)), float(np.median(cached_seconds))
+        results[backend] = {
+            'seconds': round(median, 4),
+            'pages_per_s': round(pages / median, 1),
+            'fallback_pages': extracted.get(parser.fallback, 0) if parser.fallback else 0,
+            'cached_pages_per_s': round(pages / cached_median, 1)
+        }
+    return results
+
+
+def bench_ingest(pdf_path: str, make_ingestor, repeat: int) -> dict:
+    """DocumentIngestor.ingest_pdf with its overlapping pipeline, caches off"""
+    seconds, result = [], None
+    for _ in range(repeat):
+        ingestor = make_ingestor()
+        result, elapsed = timed(ingestor.ingest_pdf, pdf_path)
+        seconds.append(elapsed)
+    median = float(np.median(seconds))
+    return {
+        'seconds': round(median, 4),
+        'pages_per_s': round(result['total_pages'] / median, 2),
+        'chunks_per_s': round(result['total_chunks'] / median, 2),
+        'run_latency_ms': latency_ms(seconds),
+        'pipeline_stages': result.get('stages')
+    }
+
+
+def bench_query(store, embedder, packer, asked, batch_size: int) -> dict:
+    """Per-query stage latencies (one query at a time, like /api/query), then batched throughput"""
+    stages = {'embed': [], 'search': [], 'pack': [], 'total': []}
+    context_tokens = []
+    for query in asked:
+        started = time.perf_counter()
+        embedding, embed_s = timed(embedder.embed_query, query)
+        results, search_s = timed(store.search_batch, embedding[None, :], packer.fetch_k, with_vectors=True)
+        (_, _, report), pack_s = timed(packer.pack, embedding, results[0])
+        stages['embed'].append(embed_s)
+        stages['search'].append(search_s)
+        stages['pack'].append(pack_s)
+        stages['total'].append(time.perf_counter() - started)
+        context_tokens.append(report['tokens_after'])
+
+    started = time.perf_counter()
+    for start in range(0, len(asked), batch_size):
+        embeddings = embedder.embed_queries(asked[start:start + batch_size])
+        store.search_batch(embeddings, packer.fetch_k)
+    batched = time.perf_counter() - started
+
+    return {
+        'queries': len(asked),
+        'queries_per_s': round(len(asked) / sum(stages['total']), 1),
+        'batched_queries_per_s': round(len(asked) / batched, 1),
+        'latency_ms': {name: latency_ms(seconds) for name, seconds in stages.items()},
+        'mean_context_tokens': round(float(np.mean(context_tokens)), 1)
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str):
+    """Print the change of the headline metrics against an earlier run"""
+    with open(baseline_path, 'r') as f:
+        baseline = {doc['name']: doc for doc in json.load(f)['documents']}
+    metrics = [
+        ('ingest pages/s', lambda d: d['ingest']['pages_per_s'], True),
+        ('ingest chunks/s', lambda d: d['ingest']['chunks_per_s'], True),
+        ('query p95 ms', lambda d: d['query']['latency_ms']['total']['p95'], False),
+        ('queries/s', lambda d: d['query']['queries_per_s'], True),
+        ('peak RSS MB', lambda d: d['peak_rss_mb'], False),
+    ]
+    print(f"\nChange vs {baseline_path} (+ is better):")
+    for doc in results['documents']:
+        old = baseline.get(doc['name'])
+        if old is None:
+            continue
+        changes = []
+        for label, get, higher_is_better in metrics:
+            before, after = get(old), get(doc)
+            if before:
+                change = (after - before) / before * (1 if higher_is_better else -1)
+                changes.append(f"{label} {change:+.1%}")
+        print(f"  {doc['name']}: " + ', '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[20, 100], help='One synthetic document per size')
+    parser.add_argument('--tables-per-page', type=int, default=1)
+    parser.add_argument('--table-rows', type=int, default=8)
+    parser.add_argument('--numeric-density', type=float, default=0.6,
+                        help='Share of narrative sentences stating figures (0-1)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pdf', nargs='+', help='Benchmark these PDFs instead of synthetic ones')
+    parser.add_argument('--embedder', choices=['model', 'hashing'], default='model',
+                        help="'hashing' replaces the sentence transformer with a model-free stand-in")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--backend', default='torch', help='Embedding backend (torch, onnx, ...)')
+    parser.add_argument('--chunker', choices=['tokens', 'chars'], default='tokens')
+    parser.add_argument('--index-type', default='auto')
+    parser.add_argument('--storage', default='fp32')
+    parser.add_argument('--parser-workers', type=int, default=1)
+    parser.add_argument('--parser-backend', default='auto', help='Parser backend used for the stage and ingest runs')
+    parser.add_argument('--parser-backends', nargs='+', choices=['pdfplumber', 'pdftotext', 'pdfium'],
+                        help='Backends compared for extraction alone (default: all installed)')
+    parser.add_argument('--batch-size', type=int, default=32, help='Chunks per embedding batch')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per ingest measurement (median reported)')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--online', action='store_true', help='Allow downloading the model')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--baseline', help='Earlier --json output to compare against')
+    args = parser.parse_args()
+
+    if not args.online:
+        os.environ.setdefault('HF_HUB_OFFLINE', '1')
+        os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+    from context_packer import ContextPacker
+    from ingest import DocumentIngestor
+    from model_registry import get_registry
+    from pdf_parser import BACKENDS
+
+    model_name, backend = args.model, args.backend
+    if args.embedder == 'hashing':
+        model_name, backend = HASHING_MODEL, 'torch'
+        get_registry().register(model_name, HashingModel())
+
+    def make_ingestor():
+        return DocumentIngestor(model_name=model_name, parser_workers=args.parser_workers,
+                                embed_batch_size=args.batch_size, index_type=args.index_type,
+                                embedding_backend=backend, vector_storage=args.storage, chunker=args.chunker,
+                                parser_backend=args.parser_backend)
+
+    # Load and warm the model before anything is timed
+    started = time.perf_counter()
+    ingestor = make_ingestor()
+    ingestor.embedder.embed_texts(['warmup'], show_progress_bar=False)
+    model_load_s = time.perf_counter() - started
+    packer = ContextPacker()
+    asked = questions(args.queries, args.seed)
+    parser_backends = args.parser_backends or [name for name, cls in BACKENDS.items() if cls.available()]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.pdf:
+            corpus = [(Path(p).name, p) for p in args.pdf]
+        else:
+            corpus = []
+            for pages in args.pages:
+                path = os.path.join(workdir, f"synthetic_{pages}p.pdf")
+                write_pdf(path, pages, args.tables_per_page, args.table_rows, args.numeric_density, args.seed)
+                corpus.append((f"synthetic_{pages}p", path))
+
+        documents = []
+        for name, path in corpus:
+            print(f"Benchmarking {name}...")
+            stages = bench_stages(path, ingestor, args.repeat)
+            parsers = bench_parsers(path, parser_backends, args.parser_workers, args.repeat, workdir)
+            ingest = bench_ingest(path, make_ingestor, args.repeat)
+            query = bench_query(stages.pop('store'), ingestor.embedder, packer, asked, args.batch_size)
+            documents.append({
+                'name': name,
+                'bytes': os.path.getsize(path),
+                **stages,
+                'parsers': parsers,
+                'ingest': ingest,
+                'query': query,
+                'peak_rss_mb': peak_rss_mb(),
+                'peak_rss_children_mb': peak_rss_mb(children=True)
+            })
+
+    results = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'model_load_s': round(model_load_s, 3)
+        },
+        'config': vars(args),
+        'documents': documents
+    }
+
+    print(f"\n{'document':<20} {'pages':>6} {'chunks':>7} {'parse p/s':>10} {'embed c/s':>10} "
+          f"{'ingest p/s':>11} {'q/s':>7} {'q p50':>8} {'q p95':>8} {'q p99':>8} {'RSS MB':>8}")
+    for doc in documents:
+        total = doc['query']['latency_ms']['total']
+        print(f"{doc['name']:<20} {doc['pages']:>6} {doc['chunks']:>7} "
+              f"{doc['stages']['parse']['pages_per_s']:>10} {doc['stages']['embed']['chunks_per_s']:>10} "
+              f"{doc['ingest']['pages_per_s']:>11} {doc['query']['queries_per_s']:>7} "
+              f"{total['p50']:>8.2f} {total['p95']:>8.2f} {total['p99']:>8.2f} {doc['peak_rss_mb']:>8}")
+
+    print(f"\n{'document':<20} {'parser':<12} {'pages/s':>9} {'fallback pages':>15} {'cached pages/s':>15}")
+    for doc in documents:
+        for backend, stats in doc['parsers'].items():
+            print(f"{doc['name']:<20} {backend:<12} {stats['pages_per_s']:>9} {stats['fallback_pages']:>15} "
+                  f"{stats['cached_pages_per_s']:>15}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
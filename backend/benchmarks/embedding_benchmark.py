@@ -0,0 +1,129 @@
+"""
+Throughput and parity benchmark for the embedding backends
+
+Encodes the same documents and queries with the fp32 torch model and each
+candidate backend, then reports texts/s, speedup, cosine drift against the
+fp32 embeddings, and retrieval recall@k (candidate top-k vs fp32 top-k).
+
+Usage:
+    python backend/benchmarks/embedding_benchmark.py --backends torch_int8 onnx onnx_int8
+    python backend/benchmarks/embedding_benchmark.py --pdf report.pdf --json embed.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model_registry import BACKENDS, load_model  # noqa: E402
+from synthetic_pdf import CLAUSES, SEGMENTS, SUBJECTS  # noqa: E402
+
+
+def synthetic_texts(count: int, seed: int = 0):
+    """Filing-like documents of varied length, plus short questions about them"""
+    rng = np.random.default_rng(seed)
+    documents = []
+    for _ in range(count):
+        sentences = []
+        for _ in range(int(rng.integers(1, 12))):
+            sentences.append(
+                f"{rng.choice(SUBJECTS)} in {rng.choice(SEGMENTS)} was ${rng.integers(1, 900)}.{rng.integers(0, 9)} "
+                f"million, {'up' if rng.random() < 0.5 else 'down'} {rng.integers(1, 40)}% "
+                f"{rng.choice(CLAUSES)}."
+            )
+        documents.append(' '.join(sentences))
+    queries = [f"What was {rng.choice(SUBJECTS).lower()} in {rng.choice(SEGMENTS)}?" for _ in range(max(count // 4, 1))]
+    return documents, queries
+
+
+def pdf_texts(pdf_path: str):
+    from chunker import TextChunker
+    from pdf_parser import PDFParser
+
+    pages = PDFParser().parse_pdf(pdf_path)['pages']
+    documents = [chunk['text'] for chunk in TextChunker().chunk_text(pages)]
+    _, queries = synthetic_texts(len(documents))
+    return documents, queries
+
+
+def encode(model, texts, batch_size: int):
+    started = time.perf_counter()
+    embeddings = np.asarray(model.encode(texts, batch_size=batch_size, show_progress_bar=False), dtype=np.float32)
+    elapsed = time.perf_counter() - started
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True), elapsed
+
+
+def recall_at_k(reference_docs, reference_queries, docs, queries, k: int) -> float:
+    truth = np.argsort(-(reference_queries @ reference_docs.T), axis=1)[:, :k]
+    found = np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+    return sum(len(set(f) & set(t)) for f, t in zip(found, truth)) / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--backends', nargs='+', default=['torch_int8', 'onnx', 'onnx_int8'],
+                        choices=[b for b in BACKENDS if b != 'torch'])
+    parser.add_argument('--pdf', help='Embed the chunks of this PDF instead of synthetic text')
+    parser.add_argument('--documents', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    documents, queries = pdf_texts(args.pdf) if args.pdf else synthetic_texts(args.documents)
+
+    rows = []
+    reference = None
+    for backend in ['torch'] + args.backends:
+        model = load_model(args.model, backend)
+        model.encode(['warmup'], show_progress_bar=False)
+        doc_vectors, doc_seconds = encode(model, documents, args.batch_size)
+        # Queries one at a time, like /api/query
+        query_vectors, query_seconds = [], 0.0
+        for query in queries:
+            vector, elapsed = encode(model, [query], 1)
+            query_vectors.append(vector[0])
+            query_seconds += elapsed
+        query_vectors = np.stack(query_vectors)
+
+        row = {'backend': backend,
+               'docs_per_s': round(len(documents) / doc_seconds, 1),
+               'queries_per_s': round(len(queries) / query_seconds, 1)}
+        if reference is None:
+            reference = (doc_vectors, query_vectors, row)
+            row.update({'doc_speedup': 1.0, 'query_speedup': 1.0, 'cosine_mean': 1.0,
+                        'cosine_min': 1.0, 'recall': 1.0})
+        else:
+            ref_docs, ref_queries, ref_row = reference
+            cosine = np.concatenate([(doc_vectors * ref_docs).sum(axis=1),
+                                     (query_vectors * ref_queries).sum(axis=1)])
+            row.update({
+                'doc_speedup': round(row['docs_per_s'] / ref_row['docs_per_s'], 2),
+                'query_speedup': round(row['queries_per_s'] / ref_row['queries_per_s'], 2),
+                'cosine_mean': round(float(cosine.mean()), 5),
+                'cosine_min': round(float(cosine.min()), 5),
+                'recall': round(recall_at_k(ref_docs, ref_queries, doc_vectors, query_vectors, args.k), 4)
+            })
+        rows.append(row)
+        del model
+
+    print(f"{len(documents)} documents, {len(queries)} queries, model {args.model}, recall@{args.k} vs torch fp32")
+    print(f"{'backend':<11} {'docs/s':>8} {'x':>5} {'queries/s':>10} {'x':>5} {'cos mean':>9} {'cos min':>8} {'recall':>7}")
+    for row in rows:
+        print(f"{row['backend']:<11} {row['docs_per_s']:>8.1f} {row['doc_speedup']:>5.2f} "
+              f"{row['queries_per_s']:>10.1f} {row['query_speedup']:>5.2f} "
+              f"{row['cosine_mean']:>9.5f} {row['cosine_min']:>8.5f} {row['recall']:>7.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'model': args.model, 'documents': len(documents), 'queries': len(queries),
+                       'k': args.k, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+"""
+Load test for the Flask backend with mixed upload/query traffic
+
+Closed-loop clients (one thread each) repeatedly pick an operation from the
+mix and wait for it to finish:
+  * query:  POST /api/query
+  * stream: POST /api/query/stream, read to the end (time to first token too)
+  * batch:  POST /api/query/batch
+  * upload: POST /api/upload of a synthetic report, then poll the job until
+            ingestion finishes (reported as 'upload' and 'ingest')
+
+Each concurrency level runs for --duration seconds and reports throughput,
+p50/p95/p99 latency and error rate per operation, plus LLM retries and
+fallbacks and the mean time embeds waited for the shared model (queries
+behind ingestion batches) from /metrics. The saturation point is the level after which
+throughput stops growing while latency does.
+
+With --start-server, the mock LLM (mock_llm_server.py) and the backend are
+started in a temporary directory, so no Groq quota is used. The answer cache
+is disabled there, so every query reaches the LLM.
+
+Usage:
+    python backend/benchmarks/load_test.py --start-server gunicorn --workers 2 --concurrency 1 4 16 32
+    python backend/benchmarks/load_test.py --start-server dev --mix query=6,stream=3,upload=1 --rate-limit-rate 0.05
+    python backend/benchmarks/load_test.py --url http://127.0.0.1:3000 --duration 60 --json load.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_llm_server import add_arguments as add_mock_arguments  # noqa: E402
+from startup_benchmark import BACKEND_DIR, free_port, run_env, wait_for  # noqa: E402
+from synthetic_pdf import questions, write_pdf  # noqa: E402
+
+OPERATIONS = ('query', 'stream', 'batch', 'upload')
+JOB_DONE = ('succeeded', 'failed', 'cancelled')
+
+# Counters read from /metrics before and after each level
+METRIC_TOTALS = {
+    'llm_requests': 'finsight_llm_requests_total',
+    'llm_retries': 'finsight_llm_retries_total',
+    'llm_fallbacks': 'finsight_llm_fallbacks_total',
+    'query_encode_wait_s': 'finsight_embedding_encode_wait_seconds_sum{caller="query"}',
+    'query_encodes': 'finsight_embedding_encode_wait_seconds_count{caller="query"}',
+    'ingest_encode_wait_s': 'finsight_embedding_encode_wait_seconds_sum{caller="ingest"}',
+    'ingest_encodes': 'finsight_embedding_encode_wait_seconds_count{caller="ingest"}'
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{name}' (choose from {', '.join(OPERATIONS)})")
+        weights[name] = float(weight or 1)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def metric_totals(session: requests.Session, base: str) -> Dict[str, float]:
+    """Sum of each series in METRIC_TOTALS over all its (remaining) label sets"""
+    try:
+        text = session.get(f"{base}/metrics", timeout=10).text
+    except requests.RequestException:
+        return {}
+    totals = {}
+    for key, name in METRIC_TOTALS.items():
+        pattern = re.compile(rf'^{re.escape(name)}(?:\{{[^}}]*\}})? (\S+)$', re.MULTILINE)
+        totals[key] = sum(float(value) for value in pattern.findall(text))
+    return totals
+
+
+class Recorder:
+    def __init__(self):
+        """Thread-safe list of (operation, seconds, ok, extra) samples"""
+        self.samples = []
+        self.errors: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def add(self, operation: str, seconds: float, ok: bool, error: str = None, **extra):
+        with self.lock:
+            self.samples.append((operation, seconds, ok, extra))
+            if error:
+                key = f"{operation}: {error[:80]}"
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+
+class Client:
+    def __init__(self, base: str, recorder: Recorder, asked: List[str], pdfs: List[str], args):
+        """
+        One simulated user with its own HTTP connection
+
+        Args:
+            base: API base URL, e.g. http://127.0.0.1:3000/api
+            recorder: Where results go
+            asked: Question pool
+            pdfs: Synthetic reports to upload
+            args: Parsed command line
+        """
+        self.base = base
+        self.recorder = recorder
+        self.asked = asked
+        self.pdfs = pdfs
+        self.args = args
+        self.session = requests.Session()
+        self.random = random.Random()
+
+    def run(self, operations: List[str], weights: List[float], stop: threading.Event):
+        while not stop.is_set():
+            operation = self.random.choices(operations, weights)[0]
+            started = time.perf_counter()
+            try:
+                ok, error, extra = getattr(self, operation)()
+            except requests.RequestException as e:
+                ok, error, extra = False, type(e).__name__, {}
+            # An operation may report its own latency (upload: the request, without ingestion)
+            seconds = extra.pop('seconds', time.perf_counter() - started)
+            self.recorder.add(operation, seconds, ok, error, **extra)
+
+    def _question(self) -> str:
+        return self.random.choice(self.asked)
+
+    def _check(self, response: requests.Response):
+        if response.status_code == 200:
+            return True, None, {}
+        return False, f"HTTP {response.status_code}", {}
+
+    def query(self):
+        response = self.session.post(f"{self.base}/query", json={'query': self._question()},
+                                     timeout=self.args.timeout)
+        return self._check(response)
+
+    def batch(self):
+        batch = [self._question() for _ in range(self.args.batch_size)]
+        response = self.session.post(f"{self.base}/query/batch", json={'queries': batch}, timeout=self.args.timeout)
+        return self._check(response)
+
+    def stream(self):
+        started = time.perf_counter()
+        first_token = None
+        event = None
+        with self.session.post(f"{self.base}/query/stream", json={'query': self._question()},
+                               timeout=self.args.timeout, stream=True) as response:
+            if response.status_code != 200:
+                return False, f"HTTP {response.status_code}", {}
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('event:'):
+                    event = line[len('event:'):].strip()
+                    if event == 'token' and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif event == 'error':
+                        return False, 'stream error event', {}
+        if event != 'done':
+            return False, 'stream ended early', {}
+        return True, None, {'first_token_s': first_token}
+
+    def upload(self):
+        path = self.random.choice(self.pdfs)
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            response = self.session.post(f"{self.base}/upload", files={'file': (os.path.basename(path), f)},
+                                         timeout=self.args.timeout)
+        if response.status_code != 202:
+            return False, f"HTTP {response.status_code}", {}
+        uploaded = time.perf_counter() - started
+        if self.args.wait_ingest:
+            status = wait_for_job(self.session, self.base, response.json()['job_id'], self.args.timeout)
+            self.recorder.add('ingest', time.perf_counter() - started - uploaded, status == 'succeeded',
+                              None if status == 'succeeded' else f"job {status}")
+        return True, None, {'seconds': uploaded}
+
+
+def wait_for_job(session: requests.Session, base: str, job_id: str, timeout: float) -> str:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = session.get(f"{base}/jobs/{job_id}", timeout=10).json().get('status')
+        if status in JOB_DONE:
+            return status
+        time.sleep(0.2)
+    return 'timeout'
+
+
+def summarize(recorder: Recorder, elapsed: float, concurrency: int, before: Dict, after: Dict) -> Dict:
+    level = {'concurrency': concurrency, 'seconds': round(elapsed, 2), 'operations': {}}
+    requests_done = [s for s in recorder.samples if s[0] != 'ingest']
+    level['requests'] = len(requests_done)
+    level['throughput_rps'] = round(len(requests_done) / elapsed, 2)
+    level['error_rate'] = round(sum(1 for s in requests_done if not s[2]) / len(requests_done), 4) \
+        if requests_done else None
+
+    for operation in sorted({s[0] for s in recorder.samples}):
+        samples = [s for s in recorder.samples if s[0] == operation]
+        latencies = np.array([s[1] for s in samples]) * 1000
+        stats = {
+            'count': len(samples),
+            'per_s': round(len(samples) / elapsed, 2),
+            'error_rate': round(sum(1 for s in samples if not s[2]) / len(samples), 4),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 1)
+        }
+        first_tokens = [s[3]['first_token_s'] for s in samples if s[3].get('first_token_s') is not None]
+        if first_tokens:
+            stats['first_token_p95_ms'] = round(float(np.percentile(first_tokens, 95)) * 1000, 1)
+        level['operations'][operation] = stats
+
+    level['server'] = server = {key: after[key] - before.get(key, 0) for key in after}
+    for caller in ('query', 'ingest'):
+        if server.get(f'{caller}_encodes'):
+            server[f'{caller}_encode_wait_mean_ms'] = round(
+                server[f'{caller}_encode_wait_s'] / server[f'{caller}_encodes'] * 1000, 2)
+    level['errors'] = recorder.errors
+    return level
+
+
+def worst_p95(level: Dict) -> float:
+    return max((op['p95_ms'] for op in level['operations'].values()), default=0)
+
+
+def find_saturation(levels: List[Dict]) -> Optional[int]:
+    """Last concurrency before throughput gains fall under 10% while p95 latency rises by half"""
+    for previous, current in zip(levels, levels[1:]):
+        if (current['throughput_rps'] < previous['throughput_rps'] * 1.1
+                and worst_p95(current) > worst_p95(previous) * 1.5):
+            return previous['concurrency']
+    return None
+
+
+def start_services(args, workdir: str):
+    """Start the mock LLM and the backend; returns (base URL, processes)"""
+    processes = []
+    mock_port = free_port()
+    mock_command = [sys.executable, str(Path(__file__).resolve().parent / 'mock_llm_server.py'),
+                    '--port', str(mock_port)]
+    for flag in ('latency_ms', 'jitter_ms', 'tokens_per_s', 'answer_tokens', 'error_rate', 'rate_limit_rate',
+                 'retry_after', 'max_concurrency', 'seed'):
+        value = getattr(args, flag)
+        if value is not None:
+            mock_command += [f"--{flag.replace('_', '-')}", str(value)]
+    mock_log = os.path.join(workdir, 'mock.log')
+    with open(mock_log, 'wb') as log:
+        processes.append(subprocess.Popen(mock_command, stdout=log, stderr=subprocess.STDOUT))
+    if wait_for(f"http://127.0.0.1:{mock_port}/stats", time.perf_counter() + 30, processes[0], mock_log) is None:
+        raise RuntimeError("Mock LLM server did not start")
+
+    port = free_port()
+    env = run_env()
+    env.update(PORT=str(port), GROQ_API_KEY='mock', GROQ_BASE_URL=f"http://127.0.0.1:{mock_port}/v1")
+    if not args.answer_cache:
+        env['QUERY_CACHE_ANSWERS'] = '0'
+    if args.start_server == 'gunicorn':
+        env['WEB_CONCURRENCY'] = str(args.workers)
+        command = [sys.executable, '-m', 'gunicorn', '-c', str(BACKEND_DIR / 'gunicorn.conf.py'), 'app:app']
+    else:
+        command = [sys.executable, str(BACKEND_DIR / 'app.py')]
+    server_log = os.path.join(workdir, 'server.log')
+    with open(server_log, 'wb') as log:
+        processes.append(subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT))
+
+    base = f"http://127.0.0.1:{port}"
+    if wait_for(f"{base}/api/ready", time.perf_counter() + args.ready_timeout, processes[1], server_log) is None:
+        raise RuntimeError(f"Server not ready within {args.ready_timeout:g}s (see {server_log})")
+    return base, processes
+
+
+def run_level(base: str, concurrency: int, mix: Dict[str, float], asked: List[str], pdfs: List[str], args) -> Dict:
+    recorder = Recorder()
+    stop = threading.Event()
+    session = requests.Session()
+    before = metric_totals(session, base)
+    clients = [Client(f"{base}/api", recorder, asked, pdfs, args) for _ in range(concurrency)]
+    threads = [threading.Thread(target=client.run, args=(list(mix), list(mix.values()), stop), daemon=True)
+               for client in clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=args.timeout)
+    # In-flight requests finishing after the stop count toward the level
+    elapsed = time.perf_counter() - started
+    return summarize(recorder, elapsed, concurrency, before, metric_totals(session, base))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:3000', help='Server to test (ignored with --start-server)')
+    parser.add_argument('--start-server', choices=['dev', 'gunicorn'], help='Start the mock LLM and the backend')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--answer-cache', action='store_true', help='Keep the answer cache on in the started server')
+    parser.add_argument('--ready-timeout', type=float, default=300)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per concurrency level')
+    parser.add_argument('--mix', default='query=7,stream=2,upload=1', help='Operation weights')
+    parser.add_argument('--batch-size', type=int, default=8, help='Questions per batch request')
+    parser.add_argument('--upload-pages', type=int, default=10)
+    parser.add_argument('--upload-pool', type=int, default=8,
+                        help='Distinct PDFs to upload; repeats hit the index cache')
+    parser.add_argument('--no-wait-ingest', dest='wait_ingest', action='store_false',
+                        help='Do not wait for uploaded documents to be ingested')
+    parser.add_argument('--timeout', type=float, default=120, help='Per-request timeout')
+    parser.add_argument('--max-error-rate', type=float, help='Fail if any level exceeds this error rate')
+    parser.add_argument('--json', help='Write results to this file')
+    add_mock_arguments(parser.add_argument_group('mock LLM (with --start-server)'))
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    processes = []
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            base = args.url.rstrip('/')
+            if args.start_server:
+                base, processes = start_services(args, workdir)
+
+            pdfs = [write_pdf(os.path.join(workdir, f"report_{seed}.pdf"), args.upload_pages, seed=seed)
+                    for seed in range(args.upload_pool)]
+            asked = questions(500, seed=1)
+
+            # Queries need a document
+            session = requests.Session()
+            with open(pdfs[0], 'rb') as f:
+                job_id = session.post(f"{base}/api/upload", files={'file': ('report_0.pdf', f)},
+                                      timeout=args.timeout).json()['job_id']
+            if wait_for_job(session, f"{base}/api", job_id, args.ready_timeout) != 'succeeded':
+                raise RuntimeError("Initial upload failed")
+
+            levels = []
+            for concurrency in args.concurrency:
+                print(f"Concurrency {concurrency} for {args.duration:g}s...")
+                levels.append(run_level(base, concurrency, mix, asked, pdfs, args))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    print(f"\n{'conc':>5} {'req/s':>8} {'errors':>7} {'operation':<8} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'err':>6}")
+    for level in levels:
+        head = f"{level['concurrency']:>5} {level['throughput_rps']:>8} {level['error_rate'] or 0:>7.1%}"
+        for name, op in level['operations'].items():
+            print(f"{head} {name:<8} {op['count']:>6} {op['p50_ms']:>9} {op['p95_ms']:>9} {op['p99_ms']:>9} "
+                  f"{op['error_rate']:>6.1%}")
+            head = ' ' * len(head)
+        server = level['server']
+        if server:
+            print(f"{'':>22}LLM requests {server['llm_requests']:g}, retries {server['llm_retries']:g}, "
+                  f"fallbacks {server['llm_fallbacks']:g}")
+            if 'query_encode_wait_mean_ms' in server:
+                print(f"{'':>22}Query embeds waited {server['query_encode_wait_mean_ms']:g} ms on average "
+                      f"for the model ({server['query_encodes']:g} embeds)")
+        for error, count in level['errors'].items():
+            print(f"{'':>22}{count} x {error}")
+
+    saturation = find_saturation(levels)
+    print(f"\nSaturation: {f'around concurrency {saturation}' if saturation else 'not reached'}")
+
+    failures = []
+    if args.max_error_rate is not None:
+        failures = [f"concurrency {level['concurrency']}: error rate {level['error_rate']}"
+                    for level in levels if (level['error_rate'] or 0) > args.max_error_rate]
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'levels': levels, 'saturation_concurrency': saturation,
+                       'failures': failures}, f, indent=2)
+
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
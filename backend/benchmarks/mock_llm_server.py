@@ -0,0 +1,248 @@
+"""
+Local OpenAI-compatible chat completions server for load tests
+
+Stands in for Groq: answers POST /v1/chat/completions (streamed or not) after a
+configurable latency, produces tokens at a configurable rate, and fails a
+configurable share of requests with 500 or 429 (with Retry-After). Answers
+cite the chunks found in the prompt, so the full answer path runs, including
+caching and history, without spending API quota.
+
+Usage:
+    python backend/benchmarks/mock_llm_server.py --port 8400 --latency-ms 300 --tokens-per-s 80
+    GROQ_BASE_URL=http://127.0.0.1:8400/v1 GROQ_API_KEY=mock python backend/app.py
+
+GET /stats returns request counts by outcome.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+# Context blocks in GroqClient prompts: "[Page 5, Chunk 12]" or "[Document x.pdf, Pages 5-6, Chunk 12]"
+SOURCE_PATTERN = re.compile(r'\[(?:Document [^,\]]+, )?Pages? (\d+)(?:-\d+)?, Chunk (\d+)\]')
+
+
+class MockSettings:
+    def __init__(self, latency_ms: float = 300, jitter_ms: float = 100, tokens_per_s: float = 80,
+                 answer_tokens: int = 120, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, max_concurrency: int = 0, seed: int = None):
+        """
+        Behaviour of the mock server
+
+        Args:
+            latency_ms: Mean delay before the response starts (queueing plus prefill)
+            jitter_ms: Standard deviation of that delay
+            tokens_per_s: Generation speed; streamed tokens are spaced accordingly
+            answer_tokens: Answer length (capped by the request's max_tokens)
+            error_rate: Share of requests answered with 500
+            rate_limit_rate: Share of requests answered with 429
+            retry_after: Retry-After seconds sent with 429
+            max_concurrency: Requests served at once; more get 429 (0 = unlimited)
+            seed: Random seed for reproducible failures and latencies
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_s = tokens_per_s
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.max_concurrency = max_concurrency
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.in_flight = 0
+        self.stats: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def roll(self) -> float:
+        with self.random_lock:
+            return self.random.random()
+
+    def delay(self) -> float:
+        with self.random_lock:
+            return max(0.0, self.random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+
+    def count(self, outcome: str):
+        with self.lock:
+            self.stats[outcome] = self.stats.get(outcome, 0) + 1
+
+
+def answer_words(messages: List[Dict], count: int) -> List[str]:
+    """A deterministic answer citing the sources in the last user message"""
+    prompt = messages[-1]['content'] if messages else ''
+    citations = [f"(page: {page}, chunk: {chunk})" for page, chunk in SOURCE_PATTERN.findall(prompt)[:3]]
+    filler = ("Based on the retrieved context the reported figures changed over the period "
+              "as management describes in the filing").split()
+    words = []
+    while len(words) < count:
+        words.extend(filler)
+        if citations:
+            words.append(citations[len(words) % len(citations)])
+    return words[:count]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    settings: MockSettings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/stats':
+            self._json(404, {'error': {'message': 'Not found'}})
+            return
+        with self.settings.lock:
+            self._json(200, {'requests': dict(self.settings.stats), 'in_flight': self.settings.in_flight})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._json(404, {'error': {'message': 'Not found'}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        settings = self.settings
+
+        with settings.lock:
+            saturated = settings.max_concurrency and settings.in_flight >= settings.max_concurrency
+            if not saturated:
+                settings.in_flight += 1
+        if saturated:
+            settings.count('429_concurrency')
+            self._json(429, {'error': {'message': 'Too many concurrent requests'}},
+                       {'Retry-After': str(settings.retry_after)})
+            return
+
+        try:
+            roll = settings.roll()
+            if roll < settings.rate_limit_rate:
+                settings.count('429')
+                self._json(429, {'error': {'message': 'Rate limit reached'}},
+                           {'Retry-After': str(settings.retry_after)})
+                return
+            time.sleep(settings.delay())
+            if roll < settings.rate_limit_rate + settings.error_rate:
+                settings.count('500')
+                self._json(500, {'error': {'message': 'Mock server error'}})
+                return
+
+            words = answer_words(body.get('messages', []),
+                                 min(settings.answer_tokens, int(body.get('max_tokens') or settings.answer_tokens)))
+            if body.get('stream'):
+                self._stream(body, words)
+            else:
+                time.sleep(len(words) / settings.tokens_per_s)
+                self._json(200, self._completion(body, ' '.join(words), len(words)))
+            settings.count('200')
+        except (BrokenPipeError, ConnectionResetError):
+            settings.count('client_disconnected')
+        finally:
+            with settings.lock:
+                settings.in_flight -= 1
+
+    def _completion(self, body: Dict, content: str, tokens: int) -> Dict:
+        prompt_tokens = sum(len(m.get('content', '')) for m in body.get('messages', [])) // 4
+        return {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': tokens,
+                      'total_tokens': prompt_tokens + tokens}
+        }
+
+    def _stream(self, body: Dict, words: List[str]):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        interval = 1 / self.settings.tokens_per_s
+        for i, word in enumerate(words):
+            time.sleep(interval)
+            delta = {'content': word if i == 0 else f" {word}"}
+            self._chunk({'id': completion_id, 'object': 'chat.completion.chunk', 'model': body.get('model', 'mock'),
+                         'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})
+        self._chunk({'id': completion_id, 'object': 'chat.completion.chunk', 'model': body.get('model', 'mock'),
+                     'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _chunk(self, data: Dict):
+        self._write_chunk(f"data: {json.dumps(data)}\n\n".encode())
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _json(self, status: int, data: Dict, headers: Dict = None):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_server(settings: MockSettings, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """
+    Serve the mock API on a background thread
+
+    Args:
+        settings: Latency, token rate and failure behaviour
+        host: Interface to bind
+        port: Port to bind (0 picks a free one; see server.server_port)
+
+    Returns:
+        The running server; call shutdown() to stop it
+    """
+    handler = type('BoundMockHandler', (MockHandler,), {'settings': settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Mock behaviour flags, shared with load_test.py"""
+    parser.add_argument('--latency-ms', type=float, default=300, help='Mean delay before the response starts')
+    parser.add_argument('--jitter-ms', type=float, default=100)
+    parser.add_argument('--tokens-per-s', type=float, default=80)
+    parser.add_argument('--answer-tokens', type=int, default=120)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests failing with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of requests failing with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--max-concurrency', type=int, default=0, help='Concurrent requests before 429 (0 = no limit)')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def settings_from(args: argparse.Namespace) -> MockSettings:
+    return MockSettings(args.latency_ms, args.jitter_ms, args.tokens_per_s, args.answer_tokens, args.error_rate,
+                        args.rate_limit_rate, args.retry_after, args.max_concurrency, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8400)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(settings_from(args), args.host, args.port)
+    print(f"Mock LLM server on http://{args.host}:{server.server_port}/v1 (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Import-time and cold-start benchmark for the Flask backend
+
+Measures, each in a fresh interpreter:
+  * how long `import app` takes, its slowest imports (-X importtime) and
+    whether any heavy module (torch, faiss, ...) is imported eagerly
+  * cold start of the server: seconds until /api/health answers and until
+    /api/ready reports the embedding model warmed up
+
+Thresholds make it usable as a regression check (exit status 1 when exceeded).
+
+Usage:
+    python backend/benchmarks/startup_benchmark.py
+    python backend/benchmarks/startup_benchmark.py --max-import-s 1.5 --max-health-s 3 --json startup.json
+    python backend/benchmarks/startup_benchmark.py --server gunicorn --workers 2
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Must stay out of `import app`; they load on first use or in the background
+HEAVY_MODULES = ('torch', 'sentence_transformers', 'transformers', 'onnxruntime', 'faiss', 'pdfplumber')
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({{'import_s': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def run_env() -> dict:
+    # Runs in a temporary directory, so relative cache and upload paths stay out of the repository
+    return dict(os.environ, PYTHONPATH=str(BACKEND_DIR), PYTHONUNBUFFERED='1')
+
+
+def measure_import(workdir: str, top: int):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', IMPORT_PROBE], cwd=workdir,
+                            env=run_env(), capture_output=True, text=True, check=True)
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # stderr lines: "import time: self [us] | cumulative | imported package", children
+    # before their parent, nesting shown by two spaces per level
+    imports, children = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative) / 1e6, name.strip()))
+        elif depth == 0:
+            # The modules app imports directly; deeper ones are included in these
+            if name.strip() == 'app':
+                imports = children
+            children = []
+    probe['slowest'] = [{'module': name, 'seconds': round(seconds, 3)}
+                        for seconds, name in sorted(imports, reverse=True)[:top]]
+    return probe
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float, process: subprocess.Popen, log_path: str):
+    """perf_counter() time at which url first answers 200, or None"""
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            with open(log_path, 'r', errors='replace') as f:
+                error = f.read()[-2000:]
+            raise RuntimeError(f"Server exited with status {process.returncode}:\n{error}")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def measure_cold_start(workdir: str, server: str, workers: int, timeout: float):
+    port = free_port()
+    env = run_env()
+    env['PORT'] = str(port)
+    if server == 'gunicorn':
+        env['WEB_CONCURRENCY'] = str(workers)
+        command = [sys.executable, '-m', 'gunicorn', '-c', str(BACKEND_DIR / 'gunicorn.conf.py'), 'app:app']
+    else:
+        command = [sys.executable, str(BACKEND_DIR / 'app.py')]
+
+    log_path = os.path.join(workdir, 'server.log')
+    started = time.perf_counter()
+    with open(log_path, 'wb') as log:
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        base = f"http://127.0.0.1:{port}/api"
+        health = wait_for(f"{base}/health", started + timeout, process, log_path)
+        ready = wait_for(f"{base}/ready", started + timeout, process, log_path) if health else None
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {
+        'health_s': round(health - started, 3) if health else None,
+        'ready_s': round(ready - started, 3) if ready else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='Import measurements (median is reported)')
+    parser.add_argument('--top', type=int, default=10, help='Slowest direct imports of app to list')
+    parser.add_argument('--server', choices=['dev', 'gunicorn'], default='dev')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--timeout', type=float, default=300, help='Seconds to wait for readiness')
+    parser.add_argument('--skip-server', action='store_true', help='Only measure the import')
+    parser.add_argument('--max-import-s', type=float, help='Fail if importing app takes longer')
+    parser.add_argument('--max-health-s', type=float, help='Fail if /api/health takes longer to answer')
+    parser.add_argument('--max-ready-s', type=float, help='Fail if /api/ready takes longer to turn ready')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        probes = [measure_import(workdir, args.top) for _ in range(args.repeat)]
+        results = {
+            'import_s': round(statistics.median(p['import_s'] for p in probes), 3),
+            'heavy_modules_imported': probes[0]['heavy'],
+            'slowest_imports': probes[0]['slowest']
+        }
+        if not args.skip_server:
+            results.update(measure_cold_start(workdir, args.server, args.workers, args.timeout))
+            results['server'] = args.server
+
+    print(f"import app: {results['import_s']:.3f}s (median of {args.repeat})")
+    for entry in results['slowest_imports']:
+        print(f"  {entry['seconds']:>7.3f}s  {entry['module']}")
+    print(f"heavy modules imported eagerly: {', '.join(results['heavy_modules_imported']) or 'none'}")
+    if not args.skip_server:
+        def seconds(value):
+            return f"{value:.3f}s" if value is not None else f"not within {args.timeout:g}s"
+        print(f"{args.server} server: /api/health after {seconds(results['health_s'])}, "
+              f"/api/ready after {seconds(results['ready_s'])}")
+
+    failures = []
+    if results['heavy_modules_imported']:
+        failures.append(f"eager heavy imports: {', '.join(results['heavy_modules_imported'])}")
+    for name, limit in (('import_s', args.max_import_s), ('health_s', args.max_health_s),
+                        ('ready_s', args.max_ready_s)):
+        if limit is not None and (results.get(name) is None or results[name] > limit):
+            failures.append(f"{name} {results.get(name)} exceeds {limit}")
+    results['failures'] = failures
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
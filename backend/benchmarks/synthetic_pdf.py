@@ -0,0 +1,217 @@
+"""
+Synthetic financial-filing PDF generator (no dependencies beyond numpy)
+
+Writes text-based PDFs that pdfplumber parses like real filings: narrative
+paragraphs full of figures and ruled tables of line items by year. Pages are
+streamed to disk one at a time, so very large documents use little memory.
+
+Usage:
+    python backend/benchmarks/synthetic_pdf.py out.pdf --pages 200 --tables-per-page 1 --numeric-density 0.6
+"""
+import argparse
+from typing import BinaryIO, List
+
+import numpy as np
+
+SUBJECTS = ['Revenue', 'Operating income', 'Net interest margin', 'Free cash flow', 'Gross margin',
+            'Total debt', 'Diluted EPS', 'Capital expenditure', 'Goodwill', 'Deferred tax liability']
+SEGMENTS = ['North America', 'Europe', 'Asia Pacific', 'the retail segment', 'cloud services',
+            'the consumer lending book', 'wholesale banking', 'the industrial division']
+CLAUSES = ['compared with the prior fiscal year', 'driven by higher pricing and volume',
+           'partly offset by foreign exchange headwinds', 'reflecting one-time restructuring charges',
+           'as disclosed in Note 12 to the consolidated financial statements',
+           'excluding the impact of the divestiture completed in the third quarter']
+QUALITATIVE = ['Management continues to evaluate the capital allocation framework',
+               'The Board reviewed the principal risks and uncertainties facing the Group',
+               'Liquidity remained sufficient to meet obligations as they fall due',
+               'The Company maintains a disciplined approach to cost management',
+               'Internal controls over financial reporting were assessed as effective',
+               'Competition in core markets remained intense throughout the period']
+LINE_ITEMS = ['Net sales', 'Cost of sales', 'Gross profit', 'Selling and administrative', 'Research and development',
+              'Operating profit', 'Interest expense', 'Profit before tax', 'Income tax', 'Net income',
+              'Cash and equivalents', 'Total assets', 'Total liabilities', 'Shareholders equity']
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 54
+FONT_SIZE = 10
+LEADING = 13
+# Helvetica averages about half an em per character
+LINE_CHARS = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.5))
+
+
+def sentence(rng: np.random.Generator, numeric_density: float) -> str:
+    """One narrative sentence; numeric_density is the share that state figures"""
+    if rng.random() >= numeric_density:
+        return f"{rng.choice(QUALITATIVE)} in {rng.choice(SEGMENTS)}."
+    return (f"{rng.choice(SUBJECTS)} in {rng.choice(SEGMENTS)} was ${rng.integers(1, 900)}.{rng.integers(0, 9)} "
+            f"million, {'up' if rng.random() < 0.5 else 'down'} {rng.integers(1, 40)}% {rng.choice(CLAUSES)}.")
+
+
+def questions(count: int, seed: int = 0) -> List[str]:
+    """Questions about the generated content"""
+    rng = np.random.default_rng(seed)
+    asked = []
+    for i in range(count):
+        if i % 3 == 2:
+            asked.append(f"What was {rng.choice(LINE_ITEMS).lower()} in {rng.integers(2019, 2025)}?")
+        else:
+            asked.append(f"What was {rng.choice(SUBJECTS).lower()} in {rng.choice(SEGMENTS)}?")
+    return asked
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _wrap(text: str) -> List[str]:
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > LINE_CHARS:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+class _Page:
+    def __init__(self):
+        self.ops: List[str] = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def room(self, lines: int) -> bool:
+        return self.y - lines * LEADING >= MARGIN
+
+    def text(self, x: float, line: str, bold: bool = False):
+        font = 'F2' if bold else 'F1'
+        self.ops.append(f"BT /{font} {FONT_SIZE} Tf {x:.1f} {self.y:.1f} Td ({_escape(line)}) Tj ET")
+
+    def newline(self, lines: int = 1):
+        self.y -= lines * LEADING
+
+    def content(self) -> bytes:
+        return '\n'.join(self.ops).encode('latin-1', errors='replace')
+
+
+def _table(page: _Page, rng: np.random.Generator, rows: int, years: List[int]):
+    """A ruled table: line items down, fiscal years across"""
+    columns = ['(in millions)'] + [f"FY{year}" for year in years]
+    first_width = 190
+    width = (PAGE_WIDTH - 2 * MARGIN - first_width) / (len(columns) - 1)
+    xs = [MARGIN, MARGIN + first_width] + [MARGIN + first_width + width * i for i in range(1, len(columns))]
+    top = page.y + LEADING - 3
+    items = rng.choice(LINE_ITEMS, size=rows, replace=rows > len(LINE_ITEMS))
+
+    for i, name in enumerate(columns):
+        page.text(xs[i] + 4, name, bold=True)
+    page.newline()
+    for item in items:
+        page.text(xs[0] + 4, str(item))
+        base = rng.uniform(50, 5000)
+        for i in range(1, len(columns)):
+            value = base * (1 + rng.normal(0.05, 0.1)) ** i
+            page.text(xs[i] + 4, f"{value:,.1f}")
+        page.newline()
+
+    # Grid lines, so table finders see the structure like in a real filing
+    bottom = page.y + LEADING - 3
+    right = PAGE_WIDTH - MARGIN
+    rules = [f"{MARGIN} {top - LEADING * r:.1f} m {right} {top - LEADING * r:.1f} l"
+             for r in range(rows + 2)]
+    rules += [f"{x:.1f} {top:.1f} m {x:.1f} {bottom:.1f} l" for x in xs[:-1] + [right]]
+    page.ops.append('0.5 w ' + ' '.join(rules) + ' S')
+    page.newline()
+
+
+def _pages(pages: int, tables_per_page: int, table_rows: int, numeric_density: float, seed: int):
+    rng = np.random.default_rng(seed)
+    for number in range(1, pages + 1):
+        page = _Page()
+        page.text(MARGIN, f"Annual Report - Section {number}", bold=True)
+        page.newline(2)
+        # Tables are spread between paragraphs
+        table_slots = set(rng.choice(np.arange(1, 6), size=min(tables_per_page, 5), replace=False))
+        block = 0
+        while page.room(2):
+            block += 1
+            if block in table_slots and page.room(table_rows + 3):
+                end_year = int(rng.integers(2021, 2025))
+                _table(page, rng, table_rows, list(range(end_year - 3, end_year + 1)))
+                continue
+            paragraph = ' '.join(sentence(rng, numeric_density) for _ in range(int(rng.integers(3, 8))))
+            for line in _wrap(paragraph):
+                if not page.room(1):
+                    break
+                page.text(MARGIN, line)
+                page.newline()
+            page.newline()
+        page.text(PAGE_WIDTH / 2 - 10, str(number))
+        yield page.content()
+
+
+def write_pdf(path: str, pages: int = 50, tables_per_page: int = 1, table_rows: int = 8,
+              numeric_density: float = 0.6, seed: int = 0) -> str:
+    """
+    Write a synthetic financial report
+
+    Args:
+        path: Output file
+        pages: Page count
+        tables_per_page: Ruled tables per page (0-5)
+        table_rows: Line items per table
+        numeric_density: Share of narrative sentences that state figures (0-1)
+        seed: Random seed; the same arguments always give the same file
+
+    Returns:
+        path
+    """
+    with open(path, 'wb') as f:
+        _write(f, _pages(pages, tables_per_page, table_rows, numeric_density, seed), pages)
+    return path
+
+
+def _write(f: BinaryIO, contents, pages: int):
+    # Objects: 1 catalog, 2 page tree, 3-4 fonts, then a page and its content stream per page
+    offsets = {}
+
+    def obj(number: int, body: bytes):
+        offsets[number] = f.tell()
+        f.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    kids = ' '.join(f"{5 + 2 * i} 0 R" for i in range(pages))
+    obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    for number, font in ((3, 'Helvetica'), (4, 'Helvetica-Bold')):
+        obj(number, f"<< /Type /Font /Subtype /Type1 /BaseFont /{font} /Encoding /WinAnsiEncoding >>".encode())
+    for i, content in enumerate(contents):
+        page, stream = 5 + 2 * i, 6 + 2 * i
+        obj(page, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                   f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {stream} 0 R >>").encode())
+        obj(stream, f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+
+    size = 5 + 2 * pages
+    xref = f.tell()
+    f.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+    for number in range(1, size):
+        f.write(f"{offsets[number]:010d} 00000 n \n".encode())
+    f.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output')
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--tables-per-page', type=int, default=1)
+    parser.add_argument('--table-rows', type=int, default=8)
+    parser.add_argument('--numeric-density', type=float, default=0.6)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_pdf(args.output, args.pages, args.tables_per_page, args.table_rows, args.numeric_density, args.seed)
+    print(f"Wrote {args.pages} pages to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
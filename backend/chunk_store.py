@@ -0,0 +1,191 @@
+"""
+Columnar, array-backed storage for chunk text and metadata
+"""
+import hashlib
+import numpy as np
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+
+def assign_vector_ids(chunks: List[Dict], occurrences: Counter) -> List[Dict]:
+    """
+    Give each chunk a stable 63-bit vector id derived from its text
+
+    The same text gets the same id across uploads, so an amended filing only
+    adds and removes the vectors whose text changed. Repeated text within a
+    document is told apart by its occurrence number.
+
+    Args:
+        chunks: Chunks to label (modified in place)
+        occurrences: Counter of text digests shared across calls for one document
+
+    Returns:
+        The same chunks, each with a 'vector_id' key
+    """
+    for chunk in chunks:
+        text_digest = hashlib.blake2b(chunk['text'].encode('utf-8'), digest_size=16).digest()
+        occurrence = occurrences[text_digest]
+        occurrences[text_digest] += 1
+        digest = hashlib.blake2b(text_digest + occurrence.to_bytes(4, 'little'), digest_size=8).digest()
+        chunk['vector_id'] = int.from_bytes(digest, 'little') & 0x7FFF_FFFF_FFFF_FFFF
+    return chunks
+
+
+class ChunkStore:
+    def __init__(self, capacity: int = 1024):
+        """
+        Initialize an empty store
+
+        Metadata lives in NumPy columns and all chunk text in one UTF-8
+        buffer addressed by offsets, so rows cost a few bytes of overhead
+        instead of a dict each.
+
+        Args:
+            capacity: Initial number of rows allocated
+        """
+        self.size = 0
+        self.vector_id = np.empty(capacity, dtype=np.int64)
+        self.chunk_id = np.empty(capacity, dtype=np.int64)
+        self.page = np.empty(capacity, dtype=np.int32)
+        self.page_end = np.empty(capacity, dtype=np.int32)
+        self.start_char = np.empty(capacity, dtype=np.int64)
+        self.end_char = np.empty(capacity, dtype=np.int64)
+        self.text_offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.text = bytearray()
+        self.row_by_id: Dict[int, int] = {}
+        self.row_by_vector: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _reserve(self, rows: int):
+        capacity = len(self.chunk_id)
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2)
+        for name in ('vector_id', 'chunk_id', 'page', 'page_end', 'start_char', 'end_char'):
+            column = getattr(self, name)
+            grown = np.empty(new_capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+        offsets = np.zeros(new_capacity + 1, dtype=np.int64)
+        offsets[:self.size + 1] = self.text_offsets[:self.size + 1]
+        self.text_offsets = offsets
+
+    def append(self, chunks: Iterable[Dict]):
+        """
+        Append chunks (dicts with vector_id, chunk_id, page, text, start_char, end_char
+        and optionally page_end for chunks spanning pages)
+
+        Args:
+            chunks: Chunks in the order their vectors were added to the index
+        """
+        chunks = list(chunks)
+        start = self.size
+        end = start + len(chunks)
+        self._reserve(end)
+
+        offset = int(self.text_offsets[start])
+        for row, chunk in enumerate(chunks, start=start):
+            encoded = chunk['text'].encode('utf-8')
+            self.text += encoded
+            offset += len(encoded)
+            self.text_offsets[row + 1] = offset
+            self.vector_id[row] = chunk['vector_id']
+            self.chunk_id[row] = chunk['chunk_id']
+            self.page[row] = chunk['page']
+            self.page_end[row] = chunk.get('page_end', chunk['page'])
+            self.start_char[row] = chunk.get('start_char', 0)
+            self.end_char[row] = chunk.get('end_char', 0)
+            self.row_by_id[int(chunk['chunk_id'])] = row
+            self.row_by_vector[int(chunk['vector_id'])] = row
+
+        self.size = end
+
+    def text_at(self, row: int) -> str:
+        return self.text[self.text_offsets[row]:self.text_offsets[row + 1]].decode('utf-8')
+
+    def row_of(self, chunk_id: int) -> Optional[int]:
+        """O(1) lookup of the row holding a chunk id"""
+        return self.row_by_id.get(int(chunk_id))
+
+    def get(self, row: int) -> Dict:
+        """Return the full chunk at a row"""
+        return {
+            'chunk_id': int(self.chunk_id[row]),
+            'page': int(self.page[row]),
+            'page_end': int(self.page_end[row]),
+            'text': self.text_at(row),
+            'start_char': int(self.start_char[row]),
+            'end_char': int(self.end_char[row])
+        }
+
+    def results(self, vector_ids: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        """
+        Build search results for vector ids returned by the index
+
+        Args:
+            vector_ids: Ids returned by the index (-1 and unknown ids are skipped)
+            scores: Matching similarity scores
+
+        Returns:
+            Dicts with chunk_id, page, page_end, text and score
+        """
+        hits = [(self.row_by_vector.get(vector_id), score)
+                for vector_id, score in zip(vector_ids.tolist(), scores.tolist())]
+        hits = [(row, score) for row, score in hits if row is not None]
+        if not hits:
+            return []
+        rows = np.fromiter((row for row, _ in hits), dtype=np.int64, count=len(hits))
+        chunk_ids = self.chunk_id[rows].tolist()
+        pages = self.page[rows].tolist()
+        page_ends = self.page_end[rows].tolist()
+        return [
+            {'chunk_id': chunk_id, 'page': page, 'page_end': page_end, 'text': self.text_at(row), 'score': score}
+            for (row, score), chunk_id, page, page_end in zip(hits, chunk_ids, pages, page_ends)
+        ]
+
+    def vector_ids(self) -> np.ndarray:
+        return self.vector_id[:self.size]
+
+    def memory_bytes(self) -> int:
+        """Approximate in-memory footprint of the stored rows"""
+        columns = (self.vector_id.itemsize + self.chunk_id.itemsize + 2 * self.page.itemsize + self.start_char.itemsize
+                   + self.end_char.itemsize + self.text_offsets.itemsize)
+        # Dict entry + boxed int key/value, roughly
+        id_index = (len(self.row_by_id) + len(self.row_by_vector)) * 100
+        return self.size * columns + len(self.text) + id_index
+
+    def save(self, path: str):
+        """Write the columns to an uncompressed .npz"""
+        n = self.size
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                vector_id=self.vector_id[:n],
+                chunk_id=self.chunk_id[:n],
+                page=self.page[:n],
+                page_end=self.page_end[:n],
+                start_char=self.start_char[:n],
+                end_char=self.end_char[:n],
+                text_offsets=self.text_offsets[:n + 1],
+                text=np.frombuffer(bytes(self.text), dtype=np.uint8)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'ChunkStore':
+        """Read columns written by save(); no per-row parsing is needed"""
+        store = cls(capacity=0)
+        with np.load(path) as data:
+            store.vector_id = data['vector_id']
+            store.chunk_id = data['chunk_id']
+            store.page = data['page']
+            store.page_end = data['page_end']
+            store.start_char = data['start_char']
+            store.end_char = data['end_char']
+            store.text_offsets = data['text_offsets']
+            store.text = bytearray(data['text'].tobytes())
+        store.size = len(store.chunk_id)
+        store.row_by_id = dict(zip(store.chunk_id.tolist(), range(store.size)))
+        store.row_by_vector = dict(zip(store.vector_id.tolist(), range(store.size)))
+        return store
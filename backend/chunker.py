@@ -1,7 +1,16 @@
 """
 Text chunking module for splitting documents into retrievable chunks
 """
-from typing import List, Dict
+import re
+import numpy as np
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Tuple
+
+# Sentence ends (punctuation followed by whitespace) and blank lines
+SENTENCE_BREAK = re.compile(r'(?<=[.!?;])\s+(?=[A-Z0-9"\'(\[$])|\n\s*\n')
+LINE = re.compile(r'[^\n]+')
+
+# Rough chars per token, used only when no tokenizer is available
+CHARS_PER_TOKEN = 4
 
 class TextChunker:
     def __init__(self, chunk_size: int = 3600, overlap: int = 800):
@@ -14,6 +23,10 @@ class TextChunker:
         """
         self.chunk_size = chunk_size
         self.overlap = overlap
+
+    def config(self) -> Dict:
+        """Settings that change the produced chunks"""
+        return {'chunker': 'chars', 'chunk_size': self.chunk_size, 'overlap': self.overlap}
     
     def chunk_text(self, pages_data: List[Dict]) -> List[Dict]:
         """
@@ -25,7 +38,18 @@ class TextChunker:
         Returns:
             List of chunks with metadata
         """
-        chunks = []
+        return list(self.iter_chunks(pages_data))
+
+    def iter_chunks(self, pages_data: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Lazily chunk pages as they arrive (used by the streaming pipeline)
+
+        Args:
+            pages_data: Iterable of dicts with 'page' and 'text' keys
+
+        Yields:
+            Chunks with metadata, numbered consecutively from 0
+        """
         chunk_id = 0
         
         for page_data in pages_data:
@@ -39,13 +63,13 @@ class TextChunker:
                 chunk_text = text[start:end]
                 
                 if chunk_text.strip():  # Only add non-empty chunks
-                    chunks.append({
+                    yield {
                         'chunk_id': chunk_id,
                         'page': page_num,
                         'text': chunk_text.strip(),
                         'start_char': start,
                         'end_char': end
-                    })
+                    }
                     chunk_id += 1
                 
                 # Move start forward, accounting for overlap
@@ -54,5 +78,185 @@ class TextChunker:
                 # Break if we're at the end
                 if end >= len(text):
                     break
-        
-        return chunks
+
+
+class TokenChunker:
+    def __init__(self, tokenizer=None, max_tokens: int = 256, overlap_tokens: int = 0,
+                 min_tokens: int = 64):
+        """
+        Initialize a tokenizer-aware, sentence-aligned chunker
+
+        Chunks are packed from whole sentences up to the embedding model's
+        sequence length, so no chunk text is silently truncated. Chunks
+        prefer to end at page boundaries, but a page tail shorter than
+        min_tokens is merged with the start of the next page instead of
+        becoming its own chunk; such chunks record the page range.
+
+        Args:
+            tokenizer: Hugging Face (fast) tokenizer of the embedding model;
+                None estimates tokens from character counts
+            max_tokens: Model sequence length, including special tokens
+            overlap_tokens: Tokens of trailing sentences repeated at the start
+                of the next chunk
+            min_tokens: Smallest chunk cut at a page boundary
+        """
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        # Leave room for the [CLS]/[SEP] tokens the model adds
+        self.budget = max_tokens - 2
+        self.overlap_tokens = min(overlap_tokens, self.budget // 2)
+        self.min_tokens = min(min_tokens, self.budget)
+
+    def config(self) -> Dict:
+        """Settings that change the produced chunks"""
+        return {'chunker': 'tokens', 'max_tokens': self.max_tokens,
+                'overlap_tokens': self.overlap_tokens, 'min_tokens': self.min_tokens}
+
+    def count_tokens(self, texts: List[str]) -> np.ndarray:
+        """Token count of each text, from one batched tokenizer call"""
+        if not texts:
+            return np.zeros(0, dtype=np.int64)
+        if self.tokenizer is None:
+            return np.fromiter((len(t) // CHARS_PER_TOKEN + 1 for t in texts), dtype=np.int64, count=len(texts))
+        ids = self.tokenizer(texts, add_special_tokens=False)['input_ids']
+        return np.fromiter((len(i) for i in ids), dtype=np.int64, count=len(ids))
+
+    def chunk_text(self, pages_data: List[Dict]) -> List[Dict]:
+        """
+        Chunk text from pages into sentence-aligned chunks
+
+        Args:
+            pages_data: List of dicts with 'page' and 'text' keys
+
+        Returns:
+            List of chunks with metadata
+        """
+        return list(self.iter_chunks(pages_data))
+
+    def _split_long(self, text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """Split a span longer than the budget at line breaks, then at token boundaries"""
+        lines = [(start + m.start(), start + m.end()) for m in LINE.finditer(text[start:end])]
+        counts = self.count_tokens([text[s:e] for s, e in lines])
+        spans = []
+        for (s, e), count in zip(lines, counts):
+            if count <= self.budget:
+                spans.append((s, e))
+                continue
+            if self.tokenizer is None:
+                step = self.budget * CHARS_PER_TOKEN
+                spans.extend((i, min(i + step, e)) for i in range(s, e, step))
+                continue
+            offsets = self.tokenizer(text[s:e], add_special_tokens=False,
+                                     return_offsets_mapping=True)['offset_mapping']
+            cuts = [s + offsets[i][0] for i in range(0, len(offsets), self.budget)] + [e]
+            spans.extend(zip(cuts[:-1], cuts[1:]))
+        return spans
+
+    def _segments(self, text: str) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+        """Sentence spans of a page and their token counts"""
+        spans = []
+        start = 0
+        for match in SENTENCE_BREAK.finditer(text):
+            spans.append((start, match.start()))
+            start = match.end()
+        spans.append((start, len(text)))
+        spans = [(s, e) for s, e in spans if text[s:e].strip()]
+
+        counts = self.count_tokens([text[s:e] for s, e in spans])
+        if (counts > self.budget).any():
+            split_spans = []
+            for (s, e), count in zip(spans, counts):
+                split_spans.extend(self._split_long(text, s, e) if count > self.budget else [(s, e)])
+            spans = split_spans
+            counts = self.count_tokens([text[s:e] for s, e in spans])
+        return spans, counts
+
+    def iter_chunks(self, pages_data: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Lazily chunk pages as they arrive (used by the streaming pipeline)
+
+        Sentences of the current page and any unfinished tail of earlier
+        pages are packed with cumulative token sums and binary search, so
+        each page costs one tokenizer call plus O(chunks log sentences).
+
+        Args:
+            pages_data: Iterable of dicts with 'page' and 'text' keys
+
+        Yields:
+            Chunks with chunk_id, page (first page), page_end, text,
+            start_char (on the first page) and end_char (on the last page)
+        """
+        chunk_id = 0
+        texts: Dict[int, str] = {}
+        # Pending sentences: page, char span, token count, starts-a-page flag
+        pages = np.zeros(0, dtype=np.int64)
+        starts = np.zeros(0, dtype=np.int64)
+        ends = np.zeros(0, dtype=np.int64)
+        tokens = np.zeros(0, dtype=np.int64)
+        page_starts = np.zeros(0, dtype=bool)
+
+        def emit(first: int, last: int) -> Dict:
+            pieces = []
+            for page in np.unique(pages[first:last]):
+                in_page = np.flatnonzero(pages[first:last] == page) + first
+                pieces.append(texts[int(page)][starts[in_page[0]]:ends[in_page[-1]]].strip())
+            return {
+                'chunk_id': chunk_id,
+                'page': int(pages[first]),
+                'page_end': int(pages[last - 1]),
+                'text': '\n'.join(pieces),
+                'start_char': int(starts[first]),
+                'end_char': int(ends[last - 1])
+            }
+
+        page_iter = iter(pages_data)
+        final = False
+        while not final:
+            page_data = next(page_iter, None)
+            if page_data is None:
+                final = True
+            else:
+                text = page_data['text'] or ''
+                spans, counts = self._segments(text)
+                if not spans:
+                    continue
+                page_num = page_data['page']
+                texts[page_num] = text
+                flags = np.zeros(len(spans), dtype=bool)
+                flags[0] = True
+                pages = np.concatenate([pages, np.full(len(spans), page_num, dtype=np.int64)])
+                starts = np.concatenate([starts, [s for s, _ in spans]]).astype(np.int64)
+                ends = np.concatenate([ends, [e for _, e in spans]]).astype(np.int64)
+                tokens = np.concatenate([tokens, counts])
+                page_starts = np.concatenate([page_starts, flags])
+
+            n = len(tokens)
+            cum = np.concatenate([[0], np.cumsum(tokens)])
+            breaks = np.flatnonzero(page_starts)
+            start = 0
+            while start < n:
+                # Furthest sentence boundary within the token budget
+                end = max(int(np.searchsorted(cum, cum[start] + self.budget, side='right')) - 1, start + 1)
+                if end >= n and not final:
+                    break  # the chunk could still grow with the next page
+                # Prefer the last page boundary that leaves a big enough chunk
+                inside = breaks[(breaks > start) & (breaks < end)]
+                inside = inside[cum[inside] - cum[start] >= self.min_tokens]
+                if len(inside):
+                    end = int(inside[-1])
+                    next_start = end
+                else:
+                    next_start = end
+                    if self.overlap_tokens and end < n:
+                        overlap_from = int(np.searchsorted(cum, cum[end] - self.overlap_tokens, side='left'))
+                        next_start = min(max(overlap_from, start + 1), end)
+
+                yield emit(start, end)
+                chunk_id += 1
+                start = next_start
+
+            # Keep the unfinished tail for the next page
+            pages, starts, ends = pages[start:], starts[start:], ends[start:]
+            tokens, page_starts = tokens[start:], page_starts[start:]
+            pending = set(pages.tolist())
+            texts = {page: text for page, text in texts.items() if page in pending}
@@ -0,0 +1,174 @@
+"""
+Post-retrieval stage: MMR diversification, overlap removal and token-budget packing
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from chunker import CHARS_PER_TOKEN
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM tokens of a text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def mmr(query_embedding: np.ndarray, embeddings: np.ndarray, k: int, lambda_: float = 0.7) -> List[int]:
+    """
+    Maximal marginal relevance selection
+
+    The pairwise similarity matrix is computed once; each step then only
+    updates the running max-similarity vector, so selection is O(k * n).
+
+    Args:
+        query_embedding: Normalized query vector
+        embeddings: Normalized candidate vectors, one row per candidate
+        k: Candidates to select
+        lambda_: Relevance weight (1.0 = plain top-k, lower = more diverse)
+
+    Returns:
+        Indices of the selected candidates, in selection order
+    """
+    n = len(embeddings)
+    if n == 0:
+        return []
+    relevance = embeddings @ query_embedding
+    similarity = embeddings @ embeddings.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    chosen = np.zeros(n, dtype=bool)
+    chosen[selected[0]] = True
+    for _ in range(min(k, n) - 1):
+        scores = lambda_ * relevance - (1 - lambda_) * max_similarity
+        scores[chosen] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        chosen[best] = True
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+def shared_prefix(previous: str, text: str, anchor: int = 16) -> int:
+    """
+    Length of the longest prefix of text that is also a suffix of previous
+
+    Args:
+        previous: Text of the preceding chunk
+        text: Text of the following chunk
+        anchor: Leading characters of text searched for in previous
+            (shorter overlaps are ignored)
+
+    Returns:
+        Number of leading characters of text that repeat previous
+    """
+    head = text[:anchor]
+    if len(head) < anchor:
+        return 0
+    # The earliest matching position gives the longest overlap
+    position = previous.find(head)
+    while position != -1:
+        if text.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(head, position + 1)
+    return 0
+
+
+class ContextPacker:
+    def __init__(self, top_k: int = 6, fetch_k: int = 20, mmr_lambda: float = 0.7,
+                 max_context_tokens: int = 1500, min_block_tokens: int = 32):
+        """
+        Initialize the post-retrieval stage
+
+        Args:
+            top_k: Chunks selected for the prompt
+            fetch_k: Candidates retrieved for MMR to choose from
+            mmr_lambda: Relevance vs diversity trade-off (1.0 disables MMR)
+            max_context_tokens: Token budget for all chunk text in the prompt
+            min_block_tokens: Smallest truncated chunk worth including at the
+                end of the budget
+        """
+        self.top_k = top_k
+        self.fetch_k = max(fetch_k, top_k)
+        self.mmr_lambda = mmr_lambda
+        self.max_context_tokens = max_context_tokens
+        self.min_block_tokens = min_block_tokens
+
+    def remove_overlaps(self, chunks: List[Dict]) -> List[Tuple[Dict, str]]:
+        """
+        Trim text a chunk repeats from the preceding chunk of the same document
+
+        Chunks whose text is entirely repeated are dropped.
+
+        Args:
+            chunks: Selected chunks (not modified)
+
+        Returns:
+            (chunk, trimmed text) pairs for the remaining chunks, in input order
+        """
+        by_id = {(c.get('document_id'), c['chunk_id']): c for c in chunks}
+        trimmed = []
+        for chunk in chunks:
+            text = chunk['text']
+            previous = by_id.get((chunk.get('document_id'), chunk['chunk_id'] - 1))
+            if previous is not None:
+                repeated = shared_prefix(previous['text'], text)
+                if repeated:
+                    text = text[repeated:].lstrip()
+            if text:
+                trimmed.append((chunk, text))
+        return trimmed
+
+    def pack(self, query_embedding: np.ndarray,
+             candidates: List[Dict]) -> Tuple[List[Dict], List[Dict], Dict]:
+        """
+        Choose, de-duplicate and budget the chunks sent to the LLM
+
+        Args:
+            query_embedding: Normalized query vector
+            candidates: Retrieval results in score order, each with an
+                'embedding' (removed here)
+
+        Returns:
+            Tuple of (chunks to cite, chunks for the prompt, token report).
+            Cited chunks are the retrieval results with their full text;
+            prompt chunks are copies with overlaps trimmed and the last one
+            cut to the budget. The report compares against pasting the plain
+            top_k results verbatim, and the prompt is never larger than that.
+        """
+        embeddings = [c.pop('embedding', None) for c in candidates]
+        tokens_before = sum(estimate_tokens(c['text']) for c in candidates[:self.top_k])
+
+        if candidates and self.mmr_lambda < 1.0 and all(e is not None for e in embeddings):
+            order = mmr(np.asarray(query_embedding, dtype=np.float32), np.stack(embeddings),
+                        self.top_k, self.mmr_lambda)
+            selected = [candidates[i] for i in order]
+        else:
+            selected = candidates[:self.top_k]
+
+        cited, prompt = [], []
+        # Never send more than the plain top_k would have: MMR may pick longer chunks
+        budget = min(self.max_context_tokens, tokens_before)
+        for chunk, text in self.remove_overlaps(selected):
+            tokens = estimate_tokens(text)
+            if tokens > budget:
+                if budget >= self.min_block_tokens:
+                    # Cut at a word boundary within the remaining budget
+                    # (estimate_tokens rounds up, hence budget - 1)
+                    words = text[:(budget - 1) * CHARS_PER_TOKEN].rsplit(None, 1)
+                    if words:
+                        cited.append(chunk)
+                        prompt.append(dict(chunk, text=words[0]))
+                break
+            cited.append(chunk)
+            prompt.append(dict(chunk, text=text))
+            budget -= tokens
+
+        tokens_after = sum(estimate_tokens(c['text']) for c in prompt)
+        return cited, prompt, {
+            'candidates': len(candidates),
+            'chunks': len(prompt),
+            'tokens_before': tokens_before,
+            'tokens_after': tokens_after,
+            'tokens_saved': tokens_before - tokens_after
+        }
@@ -0,0 +1,330 @@
+"""
+Per-session conversation history with bounded memory and token-budgeted prompts
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from chunker import CHARS_PER_TOKEN
+from context_packer import estimate_tokens
+from sqlite_db import SQLiteDatabase
+
+# Summarizer: (older messages, previous summary) -> new summary
+Summarizer = Callable[[List[Dict], Optional[str]], str]
+
+
+class Conversation:
+    def __init__(self, session_id: str):
+        """
+        One client's message history
+
+        Args:
+            session_id: Client-chosen or server-issued session id
+        """
+        self.session_id = session_id
+        # Question/answer pairs, oldest first, and their token estimates
+        self.turns: List[List[Dict]] = []
+        self.tokens: List[int] = []
+        self.summary: Optional[str] = None
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens)
+
+
+class ConversationStore:
+    def __init__(self, max_sessions: int = 1000, ttl: float = 3600, max_history_tokens: int = 1500,
+                 max_summary_tokens: int = 300, summarizer: Optional[Summarizer] = None):
+        """
+        Initialize the store
+
+        Args:
+            max_sessions: Sessions kept; the least recently used are evicted
+            ttl: Seconds of inactivity after which a session expires
+            max_history_tokens: Token budget for history sent with a prompt;
+                older messages are dropped (or summarized) beyond it
+            max_summary_tokens: Cap on a session's running summary
+            summarizer: Optional function folding dropped messages into a
+                running summary; runs in the background
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_history_tokens = max_history_tokens
+        self.max_summary_tokens = max_summary_tokens
+        self.summarizer = summarizer
+        self.sessions: 'OrderedDict[str, Conversation]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='summarize') if summarizer else None
+
+    def new_session_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def _expired(self, conversation: Conversation, now: float) -> bool:
+        return bool(self.ttl) and now - conversation.last_used > self.ttl
+
+    def _get(self, session_id: str, create: bool) -> Optional[Conversation]:
+        now = time.monotonic()
+        with self.lock:
+            conversation = self.sessions.get(session_id)
+            if conversation is not None and self._expired(conversation, now):
+                del self.sessions[session_id]
+                self.evictions += 1
+                conversation = None
+            if conversation is None:
+                if not create:
+                    return None
+                conversation = Conversation(session_id)
+                self.sessions[session_id] = conversation
+            conversation.last_used = now
+            self.sessions.move_to_end(session_id)
+            self._evict(now)
+            return conversation
+
+    def _evict(self, now: float):
+        """Drop expired sessions from the LRU end, then any beyond max_sessions"""
+        while self.sessions:
+            session_id, oldest = next(iter(self.sessions.items()))
+            if len(self.sessions) <= self.max_sessions and not self._expired(oldest, now):
+                break
+            del self.sessions[session_id]
+            self.evictions += 1
+
+    def history(self, session_id: str) -> List[Dict]:
+        """
+        Messages to send with the next prompt, newest last, within the token budget
+
+        Args:
+            session_id: Session id
+
+        Returns:
+            Chat messages; a running summary of older turns comes first
+        """
+        conversation = self._get(session_id, create=False)
+        if conversation is None:
+            return []
+        with conversation.lock:
+            return self._prompt_messages(conversation)
+
+    def _prompt_messages(self, conversation: Conversation) -> List[Dict]:
+        turns = []
+        budget = self.max_history_tokens
+        for turn, tokens in zip(reversed(conversation.turns), reversed(conversation.tokens)):
+            if tokens > budget:
+                break
+            turns.append(turn)
+            budget -= tokens
+        messages = [message for turn in reversed(turns) for message in turn]
+        if conversation.summary:
+            messages.insert(0, {
+                'role': 'system',
+                'content': f"Summary of the earlier conversation: {conversation.summary}"
+            })
+        return messages
+
+    def append(self, session_id: str, query: str, answer: str):
+        """
+        Record a question and its answer, dropping turns beyond the budget
+
+        Args:
+            session_id: Session id
+            query: User question
+            answer: Assistant answer
+        """
+        conversation = self._get(session_id, create=True)
+        with conversation.lock:
+            dropped = self._add_turn(conversation, query, answer)
+
+        if dropped and self.executor is not None:
+            self.executor.submit(self._summarize, conversation, dropped)
+
+    def _add_turn(self, conversation: Conversation, query: str, answer: str) -> List[Dict]:
+        """Append a turn and return the messages dropped to stay within the budget"""
+        conversation.turns.append([{'role': 'user', 'content': query},
+                                   {'role': 'assistant', 'content': answer}])
+        conversation.tokens.append(estimate_tokens(query) + estimate_tokens(answer))
+
+        # Memory stays bounded: only what fits the prompt budget is kept
+        dropped = []
+        while len(conversation.turns) > 1 and conversation.total_tokens > self.max_history_tokens:
+            dropped.extend(conversation.turns.pop(0))
+            conversation.tokens.pop(0)
+        return dropped
+
+    def _new_summary(self, dropped: List[Dict], previous: Optional[str]) -> Optional[str]:
+        try:
+            summary = self.summarizer(dropped, previous)
+        except Exception as e:
+            print(f"Conversation summary failed: {e}")
+            return None
+        # Keep the summary within its own budget
+        return summary[:self.max_summary_tokens * CHARS_PER_TOKEN]
+
+    def _summarize(self, conversation: Conversation, dropped: List[Dict]):
+        with conversation.lock:
+            previous = conversation.summary
+        summary = self._new_summary(dropped, previous)
+        if summary is not None:
+            with conversation.lock:
+                conversation.summary = summary
+
+    def clear(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def clear_all(self):
+        with self.lock:
+            self.sessions.clear()
+
+    def shutdown(self):
+        """Finish pending summaries"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self.lock:
+            self._evict(now)
+            sessions = list(self.sessions.values())
+            evictions = self.evictions
+        return {
+            'sessions': len(sessions),
+            'max_sessions': self.max_sessions,
+            'evictions': evictions,
+            'history_tokens': sum(c.total_tokens for c in sessions),
+            'max_history_tokens': self.max_history_tokens
+        }
+
+
+class SQLiteConversationStore(ConversationStore):
+    def __init__(self, path: str = 'cache/conversations.sqlite', **kwargs):
+        """
+        Conversation store shared by the worker processes of a pre-fork server
+
+        Same budgets and eviction as ConversationStore, but sessions live in
+        SQLite so any worker can serve any session's next question.
+
+        Args:
+            path: SQLite database file
+            **kwargs: ConversationStore arguments
+        """
+        super().__init__(**kwargs)
+        self.db = SQLiteDatabase(path, [
+            'CREATE TABLE IF NOT EXISTS conversations (session_id TEXT PRIMARY KEY, turns TEXT NOT NULL, '
+            'tokens TEXT NOT NULL, summary TEXT, last_used REAL NOT NULL, total_tokens INTEGER NOT NULL DEFAULT 0)',
+            'CREATE INDEX IF NOT EXISTS conversations_used ON conversations (last_used)'
+        ])
+        # Databases created before total_tokens existed
+        with self.db.lock:
+            columns = [row[1] for row in self.db.conn.execute('PRAGMA table_info(conversations)')]
+            if 'total_tokens' not in columns:
+                self.db.conn.execute('ALTER TABLE conversations ADD COLUMN total_tokens INTEGER NOT NULL DEFAULT 0')
+                self.db.conn.commit()
+
+    def _load(self, session_id: str) -> Optional[Conversation]:
+        row = self.db.conn.execute(
+            'SELECT turns, tokens, summary, last_used FROM conversations WHERE session_id = ?', (session_id,)
+        ).fetchone()
+        if row is None or (self.ttl and time.time() - row[3] > self.ttl):
+            return None
+        conversation = Conversation(session_id)
+        conversation.turns = json.loads(row[0])
+        conversation.tokens = json.loads(row[1])
+        conversation.summary = row[2]
+        return conversation
+
+    def _save(self, conversation: Conversation):
+        self.db.conn.execute(
+            'INSERT OR REPLACE INTO conversations (session_id, turns, tokens, summary, last_used, total_tokens) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (conversation.session_id, json.dumps(conversation.turns), json.dumps(conversation.tokens),
+             conversation.summary, time.time(), conversation.total_tokens)
+        )
+
+    def _evict_rows(self):
+        now = time.time()
+        cursor = self.db.conn.execute('DELETE FROM conversations WHERE last_used < ?',
+                                      (now - self.ttl if self.ttl else 0,))
+        evicted = cursor.rowcount
+        cursor = self.db.conn.execute(
+            'DELETE FROM conversations WHERE session_id IN '
+            '(SELECT session_id FROM conversations ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+            (self.max_sessions,)
+        )
+        self.evictions += evicted + cursor.rowcount
+
+    def history(self, session_id: str) -> List[Dict]:
+        with self.db.lock:
+            conversation = self._load(session_id)
+            if conversation is None:
+                return []
+            self.db.conn.execute('UPDATE conversations SET last_used = ? WHERE session_id = ?',
+                                 (time.time(), session_id))
+            self.db.conn.commit()
+        return self._prompt_messages(conversation)
+
+    def append(self, session_id: str, query: str, answer: str):
+        with self.db.lock:
+            # Read-modify-write under a write lock held across processes
+            self.db.conn.execute('BEGIN IMMEDIATE')
+            try:
+                conversation = self._load(session_id) or Conversation(session_id)
+                dropped = self._add_turn(conversation, query, answer)
+                self._save(conversation)
+                self._evict_rows()
+                self.db.conn.commit()
+            except Exception:
+                self.db.conn.rollback()
+                raise
+
+        if dropped and self.executor is not None:
+            self.executor.submit(self._summarize_session, session_id, dropped)
+
+    def _summarize_session(self, session_id: str, dropped: List[Dict]):
+        with self.db.lock:
+            row = self.db.conn.execute('SELECT summary FROM conversations WHERE session_id = ?',
+                                       (session_id,)).fetchone()
+        if row is None:
+            return
+        summary = self._new_summary(dropped, row[0])
+        if summary is not None:
+            with self.db.lock:
+                self.db.conn.execute('UPDATE conversations SET summary = ? WHERE session_id = ?',
+                                     (summary, session_id))
+                self.db.conn.commit()
+
+    def clear(self, session_id: str):
+        with self.db.lock:
+            self.db.conn.execute('DELETE FROM conversations WHERE session_id = ?', (session_id,))
+            self.db.conn.commit()
+
+    def clear_all(self):
+        with self.db.lock:
+            self.db.conn.execute('DELETE FROM conversations')
+            self.db.conn.commit()
+
+    def shutdown(self):
+        super().shutdown()
+        self.db.close()
+
+    def stats(self) -> Dict:
+        # Read-only (scraped by /metrics): expired rows are skipped here and
+        # deleted on the write path by append()
+        with self.db.lock:
+            sessions, tokens = self.db.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(total_tokens), 0) FROM conversations WHERE last_used >= ?',
+                (time.time() - self.ttl if self.ttl else 0,)
+            ).fetchone()
+        return {
+            'sessions': sessions,
+            'max_sessions': self.max_sessions,
+            'evictions': self.evictions,
+            'history_tokens': tokens,
+            'max_history_tokens': self.max_history_tokens
+        }
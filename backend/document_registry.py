@@ -0,0 +1,433 @@
+"""
+Registry of ingested documents, one FAISS shard per document
+"""
+import heapq
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from embedder import Embedder
+from faiss_store import FAISSStore
+
+INDEX_FILE = 'index.faiss'
+METADATA_FILE = 'metadata.npz'
+MANIFEST_FILE = 'shard.json'
+# Replaced whenever a manifest is written or removed, so sync() can skip the glob
+GENERATION_FILE = 'generation'
+
+
+class UnknownDocument(LookupError):
+    """Raised when a requested document id is not registered"""
+
+
+class DocumentShard:
+    def __init__(self, document_id: str, filename: str, store: FAISSStore, total_pages: int):
+        """
+        One document's vector store plus bookkeeping for eviction
+
+        Args:
+            document_id: Content hash identifying the document
+            filename: Original upload name (used in citations)
+            store: Populated vector store
+            total_pages: Page count of the document
+        """
+        self.document_id = document_id
+        self.filename = filename
+        self.total_pages = total_pages
+        self.total_chunks = len(store.chunk_store)
+        self.store_params = {'dimension': store.dimension, 'index_type': store.index_type,
+                             'storage': store.storage}
+        self.store: Optional[FAISSStore] = store
+        self.footprint = store.footprint()
+        self.memory_bytes = self.footprint['total_bytes']
+        self.persisted = False
+        self.added_at = time.time()
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_manifest(cls, manifest: Dict) -> 'DocumentShard':
+        """An unloaded shard persisted by another worker process"""
+        shard = cls.__new__(cls)
+        shard.document_id = manifest['document_id']
+        shard.filename = manifest['filename']
+        shard.total_pages = manifest['pages']
+        shard.total_chunks = manifest['chunks']
+        shard.store_params = manifest['store_params']
+        shard.store = None
+        shard.footprint = manifest['footprint']
+        shard.memory_bytes = shard.footprint['total_bytes']
+        shard.persisted = True
+        shard.added_at = manifest['added_at']
+        shard.last_used = time.monotonic()
+        shard.lock = threading.Lock()
+        return shard
+
+    def manifest(self) -> Dict:
+        return {
+            'document_id': self.document_id,
+            'filename': self.filename,
+            'pages': self.total_pages,
+            'chunks': self.total_chunks,
+            'store_params': self.store_params,
+            'footprint': self.footprint,
+            'added_at': self.added_at
+        }
+
+    @property
+    def loaded(self) -> bool:
+        return self.store is not None
+
+    def to_dict(self) -> Dict:
+        return {
+            'document_id': self.document_id,
+            'filename': self.filename,
+            'pages': self.total_pages,
+            'chunks': self.total_chunks,
+            'loaded': self.loaded,
+            'memory_bytes': self.memory_bytes,
+            'footprint': self.footprint
+        }
+
+
+class DocumentRegistry:
+    def __init__(self, model_name: str, query_cache=None, shard_dir: str = 'cache/shards',
+                 memory_budget: int = 1024 ** 3, search_workers: int = 4, embedding_backend: str = 'torch',
+                 shared: bool = False):
+        """
+        Initialize the registry
+
+        Args:
+            model_name: Embedding model for queries (must match the shards')
+            query_cache: Optional QueryCache for query embeddings
+            shard_dir: Where evicted shards are written
+            memory_budget: Bytes of loaded shards kept in memory; least
+                recently used shards beyond it are evicted to disk
+            search_workers: Threads used to search shards in parallel
+            embedding_backend: Model runtime for queries (must match ingestion)
+            shared: Several worker processes serve the same documents. Shards
+                are persisted with a manifest as soon as they are added, and
+                each worker picks up (and drops) other workers' documents
+                from shard_dir.
+        """
+        self.model_name = model_name
+        self.query_cache = query_cache
+        self.embedding_backend = embedding_backend
+        self._embedder = None
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_budget = memory_budget
+        self.shared = shared
+        self.shards: Dict[str, DocumentShard] = {}
+        self.lock = threading.Lock()
+        self._generation = None
+        self._synced = False
+        self.executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix='shard-search')
+
+    @property
+    def embedder(self) -> Embedder:
+        # Created on first query so constructing the registry never blocks on model loading
+        if self._embedder is None:
+            self._embedder = Embedder(self.model_name, query_cache=self.query_cache,
+                                      backend=self.embedding_backend)
+        return self._embedder
+
+    def add(self, document_id: str, filename: str, store: FAISSStore, total_pages: int) -> DocumentShard:
+        """
+        Register an ingested document (replacing any shard with the same id)
+
+        Args:
+            document_id: Content hash identifying the document
+            filename: Original upload name
+            store: Populated vector store
+            total_pages: Page count of the document
+
+        Returns:
+            The new shard
+        """
+        shard = DocumentShard(document_id, filename, store, total_pages)
+        if self.shared:
+            self._persist(shard)
+        with self.lock:
+            self.shards[document_id] = shard
+        self._enforce_budget(keep=document_id)
+        return shard
+
+    def remove_stale_shards(self):
+        """
+        Delete shards a previous process evicted without a manifest (call
+        once at server start; a no-op in shared mode)
+
+        Only the process that evicted such a shard can reload it, so after a
+        restart they would stay on disk forever. Shards with a manifest are
+        complete documents that shared mode registers again.
+        """
+        if self.shared:
+            return
+        for path in self.shard_dir.iterdir():
+            if path.is_dir() and not (path / MANIFEST_FILE).exists():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _persist(self, shard: DocumentShard):
+        """Write the shard and, last, its manifest (marking it complete for other workers)"""
+        path = self.shard_dir / shard.document_id
+        path.mkdir(parents=True, exist_ok=True)
+        shard.store.save(str(path / INDEX_FILE), str(path / METADATA_FILE))
+        tmp = path / f".{MANIFEST_FILE}.{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump(shard.manifest(), f)
+        os.replace(tmp, path / MANIFEST_FILE)
+        shard.persisted = True
+        self._bump_generation()
+
+    def _bump_generation(self):
+        tmp = self.shard_dir / f".{GENERATION_FILE}.{os.getpid()}.{threading.get_ident()}"
+        tmp.write_text(uuid.uuid4().hex)
+        os.replace(tmp, self.shard_dir / GENERATION_FILE)
+
+    def _read_generation(self):
+        try:
+            stat = os.stat(self.shard_dir / GENERATION_FILE)
+        except FileNotFoundError:
+            return None
+        # A replaced file is a new inode, even within one mtime tick
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def sync(self, load: bool = False):
+        """
+        Reconcile with shard_dir in shared mode: register documents added by
+        other workers and forget those they removed
+
+        Called on every lookup, so it costs one stat() of the generation file
+        unless a worker has added or removed a document since the last sync.
+
+        Args:
+            load: Also load every shard into memory (within the budget);
+                used before forking so workers share the index pages
+        """
+        if not self.shared:
+            return
+        # Read before the glob: a change made during the glob is seen next time
+        generation = self._read_generation()
+        with self.lock:
+            unchanged = self._synced and generation == self._generation
+        if unchanged and not load:
+            return
+        manifests = {}
+        for path in self.shard_dir.glob(f"*/{MANIFEST_FILE}"):
+            manifests[path.parent.name] = path
+        with self.lock:
+            for document_id in [d for d in self.shards if d not in manifests]:
+                del self.shards[document_id]
+            new = [d for d in manifests if d not in self.shards]
+        for document_id in new:
+            try:
+                with open(manifests[document_id], 'r') as f:
+                    shard = DocumentShard.from_manifest(json.load(f))
+            except (OSError, ValueError) as e:
+                # Removed or still being replaced; picked up on a later sync
+                print(f"Skipping shard {document_id[:12]}: {e}")
+                continue
+            with self.lock:
+                self.shards.setdefault(document_id, shard)
+        with self.lock:
+            self._generation = generation
+            self._synced = True
+        if load:
+            with self.lock:
+                shards = sorted(self.shards.values(), key=lambda s: s.added_at, reverse=True)
+            budget = self.memory_budget
+            for shard in shards:
+                if shard.memory_bytes > budget:
+                    break
+                self._store(shard)
+                budget -= shard.memory_bytes
+
+    def latest_id(self) -> Optional[str]:
+        """Most recently added document, the default for queries"""
+        self.sync()
+        with self.lock:
+            if not self.shards:
+                return None
+            return max(self.shards.values(), key=lambda s: s.added_at).document_id
+
+    def remove(self, document_id: str) -> bool:
+        self.sync()
+        with self.lock:
+            shard = self.shards.pop(document_id, None)
+        if shard is None:
+            return False
+        path = self.shard_dir / document_id
+        # Manifest first, so other workers stop picking the shard up
+        (path / MANIFEST_FILE).unlink(missing_ok=True)
+        if self.shared:
+            self._bump_generation()
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+
+    def clear(self):
+        self.sync()
+        with self.lock:
+            document_ids = list(self.shards)
+        for document_id in document_ids:
+            self.remove(document_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def get(self, document_id: str) -> Optional[DocumentShard]:
+        self.sync()
+        with self.lock:
+            return self.shards.get(document_id)
+
+    def load_store(self, document_id: str) -> FAISSStore:
+        """Return a document's vector store (reloaded from disk if evicted)"""
+        shard = self._resolve([document_id])[0]
+        return self._store(shard)
+
+    def list(self) -> List[Dict]:
+        self.sync()
+        with self.lock:
+            return [shard.to_dict() for shard in self.shards.values()]
+
+    def __len__(self) -> int:
+        self.sync()
+        return len(self.shards)
+
+    def _resolve(self, document_ids: Optional[List[str]]) -> List[DocumentShard]:
+        self.sync()
+        with self.lock:
+            if document_ids is None:
+                return list(self.shards.values())
+            missing = [d for d in document_ids if d not in self.shards]
+            if missing:
+                raise UnknownDocument(f"Unknown document ids: {', '.join(missing)}")
+            return [self.shards[d] for d in document_ids]
+
+    def _store(self, shard: DocumentShard) -> FAISSStore:
+        """Return the shard's store, loading it from disk if it was evicted"""
+        with shard.lock:
+            shard.last_used = time.monotonic()
+            store = shard.store
+            if store is None:
+                path = self.shard_dir / shard.document_id
+                store = FAISSStore(**shard.store_params)
+                store.load(str(path / INDEX_FILE), str(path / METADATA_FILE))
+                shard.store = store
+                print(f"Reloaded shard {shard.document_id[:12]} from disk")
+                reloaded = True
+            else:
+                reloaded = False
+        if reloaded:
+            self._enforce_budget(keep=shard.document_id)
+        return store
+
+    def _evict(self, shard: DocumentShard):
+        with shard.lock:
+            if shard.store is None:
+                return
+            if not shard.persisted:
+                path = self.shard_dir / shard.document_id
+                path.mkdir(parents=True, exist_ok=True)
+                shard.store.save(str(path / INDEX_FILE), str(path / METADATA_FILE))
+                shard.persisted = True
+            # In-flight searches keep their own reference to the store
+            shard.store = None
+        print(f"Evicted shard {shard.document_id[:12]} to disk")
+
+    def _enforce_budget(self, keep: str = None):
+        """Evict least recently used loaded shards until under the memory budget"""
+        with self.lock:
+            loaded = [s for s in self.shards.values() if s.loaded]
+        total = sum(s.memory_bytes for s in loaded)
+        for shard in sorted(loaded, key=lambda s: s.last_used):
+            if total <= self.memory_budget:
+                break
+            if shard.document_id == keep:
+                continue
+            self._evict(shard)
+            total -= shard.memory_bytes
+
+    def _search_shard(self, shard: DocumentShard, embeddings: np.ndarray, top_k: int,
+                      with_vectors: bool = False) -> List[List[Dict]]:
+        results = self._store(shard).search_batch(embeddings, top_k, with_vectors=with_vectors)
+        for per_query in results:
+            for result in per_query:
+                result['document_id'] = shard.document_id
+                result['filename'] = shard.filename
+        return results
+
+    def search_batch(self, embeddings: np.ndarray, document_ids: Optional[List[str]] = None,
+                     top_k: int = 6, with_vectors: bool = False) -> List[List[Dict]]:
+        """
+        Search the selected shards in parallel and merge an exact global top-k
+
+        Args:
+            embeddings: Query vectors, one row per query
+            document_ids: Shards to search; None searches all documents
+            top_k: Results per query
+            with_vectors: Attach each result's stored vector as 'embedding'
+
+        Returns:
+            One result list per query; each result carries document_id and
+            filename alongside page/chunk_id
+        """
+        shards = self._resolve(document_ids)
+        embeddings = np.atleast_2d(embeddings)
+        if not shards:
+            return [[] for _ in range(len(embeddings))]
+
+        if len(shards) == 1:
+            per_shard = [self._search_shard(shards[0], embeddings, top_k, with_vectors)]
+        else:
+            per_shard = list(self.executor.map(
+                lambda shard: self._search_shard(shard, embeddings, top_k, with_vectors), shards
+            ))
+
+        # Every shard returns its own top-k, so the merged top-k is exact
+        return [
+            heapq.nlargest(top_k, (r for shard_results in per_shard for r in shard_results[q]),
+                           key=lambda r: r['score'])
+            for q in range(len(embeddings))
+        ]
+
+    def query(self, query_text: str, document_ids: Optional[List[str]] = None, top_k: int = 6) -> List[Dict]:
+        """
+        Retrieve the top chunks for a query across documents
+
+        Args:
+            query_text: Query string
+            document_ids: Documents to search; None searches all
+            top_k: Number of results
+
+        Returns:
+            List of relevant chunks with document citations
+        """
+        embedding = self.embedder.embed_query(query_text)
+        return self.search_batch(embedding, document_ids, top_k)[0]
+
+    def query_batch(self, queries: List[str], document_ids: Optional[List[str]] = None,
+                    top_k: int = 6) -> List[List[Dict]]:
+        """Retrieve top chunks for several queries with one embedding pass"""
+        if not queries:
+            return []
+        embeddings = self.embedder.embed_queries(queries)
+        return self.search_batch(embeddings, document_ids, top_k)
+
+    def get_chunk(self, document_id: str, chunk_id: int) -> Optional[Dict]:
+        shard = self.get(document_id)
+        if shard is None:
+            return None
+        chunk = self._store(shard).get_chunk_by_id(chunk_id)
+        if chunk is not None:
+            chunk['document_id'] = shard.document_id
+            chunk['filename'] = shard.filename
+        return chunk
@@ -1,49 +1,130 @@
 """
 Embeddings module using SentenceTransformers
 """
-from sentence_transformers import SentenceTransformer
+from model_registry import get_registry, model_key
 import numpy as np
 from typing import List
 
 class Embedder:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', query_cache=None, embedding_cache=None,
+                 backend: str = 'torch'):
         """
-        Initialize embedder with SentenceTransformer model
-        
+        Initialize embedder with a shared SentenceTransformer model
+
         Args:
             model_name: Name of the sentence transformer model
+            query_cache: Optional QueryCache reused for repeated queries
+            embedding_cache: Optional EmbeddingCache of chunk vectors keyed by text hash
+            backend: Runtime for the model ('torch', 'torch_int8', 'onnx', 'onnx_int8')
         """
-        print(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        self.dimension = 384  # all-MiniLM-L6-v2 produces 384-dim vectors
-    
-    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        self.model_name = model_name
+        self.backend = backend
+        # Caches are keyed per backend since their vectors differ slightly
+        self.model_key = model_key(model_name, backend)
+        self.query_cache = query_cache
+        self.embedding_cache = embedding_cache
+        self.registry = get_registry()
+        self.model = self.registry.get(model_name, backend)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    @property
+    def tokenizer(self):
+        """The model's tokenizer (None if the backend does not expose one)"""
+        return getattr(self.model, 'tokenizer', None)
+
+    @property
+    def max_seq_length(self) -> int:
+        """Tokens the model reads per text; anything longer is truncated"""
+        return getattr(self.model, 'max_seq_length', None) or 256
+
+    def embed_texts(self, texts: List[str], show_progress_bar: bool = True, query: bool = False) -> np.ndarray:
         """
         Generate embeddings for a list of texts
-        
+
         Args:
             texts: List of text strings
-            
+            show_progress_bar: Print a progress bar while encoding
+            query: Encode ahead of waiting ingestion batches
+
         Returns:
             Numpy array of embeddings (normalized)
         """
-        embeddings = self.model.encode(texts, show_progress_bar=True)
-        
-        # Normalize vectors for cosine similarity with inner product
-        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-        
+        if self.embedding_cache is None:
+            return self._encode(texts, show_progress_bar, query)
+
+        # Run the model only for texts not embedded before
+        cached = self.embedding_cache.get_many(self.model_key, texts)
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        missing = []
+        for i, embedding in enumerate(cached):
+            if embedding is None:
+                missing.append(i)
+            else:
+                embeddings[i] = embedding
+
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            fresh = self._encode(missing_texts, show_progress_bar, query)
+            self.embedding_cache.put_many(self.model_key, missing_texts, fresh)
+            embeddings[missing] = fresh
+        return embeddings
+
+    def _encode(self, texts: List[str], show_progress_bar: bool, query: bool = False) -> np.ndarray:
+        embeddings = self.registry.encode(self.model_name, texts, backend=self.backend, query=query,
+                                          show_progress_bar=show_progress_bar)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        # Normalize in place for cosine similarity with inner product; only
+        # the (n, 1) norms are allocated, not a second embedding matrix
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
         return embeddings
-    
+
     def embed_query(self, query: str) -> np.ndarray:
         """
         Generate embedding for a single query
-        
+
         Args:
             query: Query string
-            
+
         Returns:
             Normalized embedding vector
         """
-        embedding = self.model.encode([query])[0]
-        embedding = embedding / np.linalg.norm(embedding)
+        if self.query_cache is not None:
+            embedding = self.query_cache.get_embedding(self.model_key, query)
+            if embedding is not None:
+                return embedding
+
+        embedding = self.registry.encode(self.model_name, [query], backend=self.backend, query=True,
+                                         show_progress_bar=False)[0]
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding /= np.linalg.norm(embedding)
+
+        if self.query_cache is not None:
+            self.query_cache.put_embedding(self.model_key, query, embedding)
         return embedding
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Generate embeddings for several queries in one forward pass
+
+        Args:
+            queries: Query strings
+
+        Returns:
+            Normalized embedding matrix, one row per query
+        """
+        if self.query_cache is None:
+            return self.embed_texts(queries, show_progress_bar=False, query=True)
+
+        # Run the model only for cache misses
+        cached = [self.query_cache.get_embedding(self.model_key, q) for q in queries]
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        if missing:
+            fresh = self.embed_texts([queries[i] for i in missing], show_progress_bar=False, query=True)
+            for i, embedding in zip(missing, fresh):
+                # Copy so the cache does not pin the whole batch matrix
+                embedding = embedding.copy()
+                self.query_cache.put_embedding(self.model_key, queries[i], embedding)
+                cached[i] = embedding
+        return np.stack(cached)
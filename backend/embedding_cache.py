@@ -0,0 +1,114 @@
+"""
+Persistent chunk-level cache of text embeddings keyed by content hash
+"""
+import hashlib
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from sqlite_db import SQLiteDatabase
+
+
+def text_key(model_name: str, text: str) -> str:
+    """Cache key for a text embedded with a given model"""
+    return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = 'cache/embeddings.sqlite', max_entries: int = 500_000):
+        """
+        Initialize the embedding cache
+
+        Vectors are stored as float32 blobs in SQLite, so an amended or
+        re-uploaded document only runs the model for chunks whose text is new.
+
+        Args:
+            path: SQLite database file
+            max_entries: Entries kept; least recently used are pruned beyond it
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.db = SQLiteDatabase(path, [
+            'CREATE TABLE IF NOT EXISTS embeddings '
+            '(key TEXT PRIMARY KEY, vector BLOB NOT NULL, used REAL NOT NULL)',
+            'CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used)'
+        ])
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings for several texts
+
+        Args:
+            model_name: Embedding model name
+            texts: Texts to look up
+
+        Returns:
+            One vector or None per text, in input order
+        """
+        keys = [text_key(model_name, text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self.db.lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.db.conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+            if found:
+                now = time.time()
+                self.db.conn.executemany('UPDATE embeddings SET used = ? WHERE key = ?',
+                                      [(now, key) for key in found])
+                self.db.conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model_name: str, texts: List[str], embeddings: np.ndarray):
+        """
+        Store embeddings for several texts, pruning old entries if needed
+
+        Args:
+            model_name: Embedding model name
+            texts: Embedded texts
+            embeddings: Matching vectors, one row per text
+        """
+        now = time.time()
+        rows = [
+            (text_key(model_name, text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, embeddings)
+        ]
+        with self.db.lock:
+            self.db.conn.executemany('INSERT OR REPLACE INTO embeddings (key, vector, used) VALUES (?, ?, ?)', rows)
+            count = self.db.conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            if count > self.max_entries:
+                self.db.conn.execute(
+                    'DELETE FROM embeddings WHERE key IN '
+                    '(SELECT key FROM embeddings ORDER BY used LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+            self.db.conn.commit()
+
+    def clear(self):
+        with self.db.lock:
+            self.db.conn.execute('DELETE FROM embeddings')
+            self.db.conn.commit()
+
+    def stats(self) -> Dict:
+        with self.db.lock:
+            size = self.db.conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'size': size,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+    def close(self):
+        self.db.close()
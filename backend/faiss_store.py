@@ -1,40 +1,400 @@
 """
 FAISS vector store for similarity search
 """
-import faiss
+import copy
 import numpy as np
-import json
-from typing import List, Dict, Tuple
+from collections import Counter
+from chunk_store import ChunkStore, assign_vector_ids
+from lazy_import import LazyModule
+from typing import Callable, List, Dict, Tuple
+
+# Imported on first use, not at server startup
+faiss = LazyModule('faiss')
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+# How vectors are stored: float32, float16, 8-bit scalar quantized, or
+# product quantized (bytes per 384-d vector: 1536, 768, 384, 48)
+STORAGE_TYPES = ('fp32', 'fp16', 'sq8', 'pq')
+SQ_TYPES = {
+    'fp16': 'QT_fp16',
+    'sq8': 'QT_8bit'
+}
+
+
+def _sq_type(storage: str) -> int:
+    """faiss.ScalarQuantizer type for a scalar-quantized storage"""
+    return getattr(faiss.ScalarQuantizer, SQ_TYPES[storage])
+
+
+# Below this many vectors brute force is both exact and fast enough
+FLAT_MAX_VECTORS = 20_000
+HNSW_MAX_VECTORS = 200_000
+IVF_FLAT_MAX_VECTORS = 2_000_000
+
+# FAISS wants ~39 training points per IVF list and 256 per PQ codebook
+MIN_POINTS_PER_LIST = 39
+MIN_PQ_TRAINING_POINTS = 39 * 256
+
+
+def choose_index_type(num_vectors: int) -> str:
+    """
+    Pick an index backend for a corpus size
+
+    Args:
+        num_vectors: Number of vectors to be indexed
+
+    Returns:
+        One of INDEX_TYPES
+    """
+    if num_vectors <= FLAT_MAX_VECTORS:
+        return 'flat'
+    if num_vectors <= HNSW_MAX_VECTORS:
+        return 'hnsw'
+    if num_vectors <= IVF_FLAT_MAX_VECTORS:
+        return 'ivf_flat'
+    return 'ivf_pq'
+
+
+def _pq_subquantizers(dimension: int, requested: int = None) -> int:
+    """Largest divisor of dimension giving >= 8 dims per sub-vector (or the requested m)"""
+    if requested:
+        return requested
+    for m in range(dimension // 8, 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def build_index(index_type: str, dimension: int, num_vectors: int, hnsw_m: int = 32,
+                pq_m: int = None, storage: str = 'fp32') -> Tuple['faiss.Index', str]:
+    """
+    Create an empty (untrained) inner-product index
+
+    IVF variants fall back to a simpler type when there are too few
+    vectors to train them well, and PQ storage falls back to 8-bit scalar
+    quantization for the same reason.
+
+    Args:
+        index_type: One of INDEX_TYPES
+        dimension: Vector dimension
+        num_vectors: Vectors available for training
+        hnsw_m: HNSW graph degree
+        pq_m: PQ sub-quantizers (default: 8 dims per sub-vector)
+        storage: One of STORAGE_TYPES (ignored by 'ivf_pq', which is always PQ)
+
+    Returns:
+        Tuple of (index, effective index type)
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type}")
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage type: {storage}")
+
+    if index_type == 'ivf_pq' and num_vectors < MIN_PQ_TRAINING_POINTS:
+        index_type = 'ivf_flat'
+    if storage == 'pq' and num_vectors < MIN_PQ_TRAINING_POINTS:
+        storage = 'sq8'
+
+    nlist = min(int(4 * np.sqrt(max(num_vectors, 1))), num_vectors // MIN_POINTS_PER_LIST)
+    if index_type in ('ivf_flat', 'ivf_pq') and nlist < 2:
+        index_type = 'flat'
+
+    metric = faiss.METRIC_INNER_PRODUCT
+    m = _pq_subquantizers(dimension, pq_m)
+
+    if index_type == 'flat':
+        if storage == 'fp32':
+            return faiss.IndexFlatIP(dimension), index_type
+        if storage == 'pq':
+            return faiss.IndexPQ(dimension, m, 8, metric), index_type
+        return faiss.IndexScalarQuantizer(dimension, _sq_type(storage), metric), index_type
+
+    if index_type == 'hnsw':
+        if storage == 'fp32':
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m, metric)
+        elif storage == 'pq':
+            index = faiss.IndexHNSWPQ(dimension, m, hnsw_m, 8, metric)
+        else:
+            index = faiss.IndexHNSWSQ(dimension, _sq_type(storage), hnsw_m, metric)
+        index.hnsw.efConstruction = 80
+        return index, index_type
+
+    quantizer = faiss.IndexFlatIP(dimension)
+    if index_type == 'ivf_pq' or storage == 'pq':
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, m, 8, metric)
+    elif storage == 'fp32':
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+    else:
+        index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, _sq_type(storage), metric)
+    return index, index_type
+
+
+def unwrap_index(index: 'faiss.Index') -> 'faiss.Index':
+    """Return the index inside an ID map (or the index itself)"""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def with_ids(index: 'faiss.Index') -> 'faiss.Index':
+    """Wrap indexes without native id support (flat, HNSW) in an ID map"""
+    if isinstance(index, faiss.IndexIVF):
+        return index
+    return faiss.IndexIDMap2(index)
+
+
+def index_kind(index: 'faiss.Index') -> str:
+    """Return the INDEX_TYPES name of a built index"""
+    index = unwrap_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf_flat'
+    return 'flat'
+
+
+def index_storage(index: 'faiss.Index') -> str:
+    """Return the STORAGE_TYPES name of a built index"""
+    index = unwrap_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return 'pq'
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return 'fp16' if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else 'sq8'
+    return 'fp32'
+
 
 class FAISSStore:
-    def __init__(self, dimension: int = 384):
+    def __init__(self, dimension: int = 384, index_type: str = 'flat', nprobe: int = 16,
+                 ef_search: int = 64, hnsw_m: int = 32, pq_m: int = None, train_size: int = 50_000,
+                 storage: str = 'fp32'):
         """
         Initialize FAISS index
         
         Args:
             dimension: Dimension of embedding vectors
+            index_type: 'flat', 'ivf_flat', 'ivf_pq', 'hnsw', or 'auto' to
+                choose from the vector count once ingestion finishes
+            nprobe: IVF lists scanned per query (recall vs latency)
+            ef_search: HNSW candidate list size per query (recall vs latency)
+            hnsw_m: HNSW graph degree
+            pq_m: PQ sub-quantizers for 'ivf_pq'
+            train_size: Vectors collected before an IVF index is trained
+            storage: Vector encoding, one of STORAGE_TYPES; 'sq8' and 'pq'
+                are trained when the index is finalized
         """
+        if index_type != 'auto' and index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage type: {storage}")
+
         self.dimension = dimension
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-        self.chunks = []
-        self.metadata = []
-    
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.hnsw_m = hnsw_m
+        self.pq_m = pq_m
+        self.train_size = train_size
+        self.storage = storage
+        self.index = self._initial_index()
+        # Vectors are added under stable ids (see assign_vector_ids); the
+        # chunk store maps each id back to its chunk
+        self.chunk_store = ChunkStore()
+        self.occurrences = Counter()
+
+    def _initial_index(self) -> 'faiss.Index':
+        # IVF types, 'auto' and trained codecs (sq8, pq) collect vectors in a
+        # flat index until there is enough data to train on (or until
+        # finalize()); HNSW and fp16 need no training
+        untrained = self.storage if self.storage in ('fp32', 'fp16') else 'fp32'
+        if self.index_type == 'hnsw' and untrained == self.storage:
+            index, _ = build_index('hnsw', self.dimension, 0, hnsw_m=self.hnsw_m, storage=self.storage)
+            index.hnsw.efSearch = self.ef_search
+            return with_ids(index)
+        # Inner product for cosine similarity
+        index, _ = build_index('flat', self.dimension, 0, storage=untrained)
+        return with_ids(index)
+
+    @property
+    def active_index_type(self) -> str:
+        """Type of the index currently serving searches"""
+        return index_kind(self.index)
+
+    @property
+    def active_storage(self) -> str:
+        """Vector encoding of the index currently serving searches"""
+        return index_storage(self.index)
+
+    def set_search_params(self, nprobe: int = None, ef_search: int = None):
+        """
+        Tune query-time recall/latency
+
+        Args:
+            nprobe: IVF lists scanned per query
+            ef_search: HNSW candidate list size per query
+        """
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+
+        kind = self.active_index_type
+        inner = unwrap_index(self.index)
+        if kind in ('ivf_flat', 'ivf_pq'):
+            inner.nprobe = self.nprobe
+        elif kind == 'hnsw':
+            inner.hnsw.efSearch = self.ef_search
+
+    def _mapped_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectors and ids of an ID-mapped flat or HNSW index"""
+        inner = unwrap_index(self.index)
+        vectors = inner.reconstruct_n(0, inner.ntotal)
+        ids = faiss.vector_to_array(self.index.id_map).astype('int64')
+        return vectors, ids
+
+    def _convert(self, target: str):
+        """Rebuild the collected flat vectors into a trained index of the target type"""
+        index, effective = build_index(target, self.dimension, self.index.ntotal,
+                                       hnsw_m=self.hnsw_m, pq_m=self.pq_m, storage=self.storage)
+        if effective == self.active_index_type and index_storage(index) == self.active_storage:
+            return
+
+        vectors, ids = self._mapped_vectors()
+        print(f"Building {effective} index ({index_storage(index)}) over {len(vectors)} vectors...")
+        if not index.is_trained:
+            index.train(vectors)
+        index = with_ids(index)
+        index.add_with_ids(vectors, ids)
+        self.index = index
+        self.set_search_params()
+        self._enable_reconstruct()
+
+    def _enable_reconstruct(self):
+        """IVF indexes need an id -> list map to reconstruct vectors by id"""
+        inner = unwrap_index(self.index)
+        if isinstance(inner, faiss.IndexIVF):
+            inner.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    def finalize(self):
+        """
+        Finish building after the last add
+
+        Trains IVF indexes that never reached train_size, trains sq8/pq
+        codecs and, for 'auto', switches to the backend chosen for the
+        final vector count.
+        """
+        if self.active_index_type != 'flat' or self.index.ntotal == 0:
+            return
+
+        if self.index_type == 'auto':
+            target = choose_index_type(self.index.ntotal)
+        else:
+            target = self.index_type
+        self._convert(target)
+
     def add_embeddings(self, embeddings: np.ndarray, chunks: List[Dict]):
         """
         Add embeddings and their metadata to the index
         
         Args:
             embeddings: Numpy array of embedding vectors
-            chunks: List of chunk dictionaries with metadata
-        """
-        self.index.add(embeddings.astype('float32'))
-        self.chunks.extend(chunks)
-        self.metadata.extend([{
-            'chunk_id': chunk['chunk_id'],
-            'page': chunk['page'],
-            'text': chunk['text']
-        } for chunk in chunks])
-    
+            chunks: List of chunk dictionaries with metadata; chunks without
+                a 'vector_id' are given one
+        """
+        missing = [chunk for chunk in chunks if 'vector_id' not in chunk]
+        assign_vector_ids(missing, self.occurrences)
+        ids = np.fromiter((chunk['vector_id'] for chunk in chunks), dtype=np.int64, count=len(chunks))
+        self.index.add_with_ids(np.ascontiguousarray(embeddings, dtype='float32'), ids)
+        self.chunk_store.append(chunks)
+
+        # Train IVF indexes as soon as enough vectors have arrived
+        if (self.index_type in ('ivf_flat', 'ivf_pq') and self.active_index_type == 'flat'
+                and self.index.ntotal >= self.train_size):
+            self._convert(self.index_type)
+
+    def remove_ids(self, vector_ids: np.ndarray):
+        """
+        Remove vectors by id
+
+        Flat and IVF indexes delete in place. HNSW graphs cannot delete, so
+        the remaining vectors are re-inserted into a fresh graph.
+
+        Args:
+            vector_ids: Ids to remove
+        """
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        if len(vector_ids) == 0:
+            return
+        if self.active_index_type != 'hnsw':
+            self.index.remove_ids(vector_ids)
+            return
+
+        vectors, ids = self._mapped_vectors()
+        keep = ~np.isin(ids, vector_ids)
+        index, _ = build_index('hnsw', self.dimension, int(keep.sum()), hnsw_m=self.hnsw_m,
+                               pq_m=self.pq_m, storage=self.active_storage)
+        if not index.is_trained:
+            index.train(vectors[keep])
+        index = with_ids(index)
+        index.add_with_ids(vectors[keep], ids[keep])
+        self.index = index
+        self.set_search_params()
+
+    def apply_update(self, chunks: List[Dict], embed_texts: Callable[[List[str]], np.ndarray]) -> Dict:
+        """
+        Bring the index in line with a new chunking of the same document
+
+        Chunks whose text is unchanged keep their vectors; only removed
+        chunks are deleted and only new chunks are embedded and added, so
+        the cost follows the size of the change rather than the document.
+
+        Args:
+            chunks: Full chunk list of the amended document
+            embed_texts: Function embedding a list of texts
+
+        Returns:
+            Counts of added, removed and unchanged chunks
+        """
+        occurrences = Counter()
+        assign_vector_ids(chunks, occurrences)
+
+        old_ids = set(self.chunk_store.vector_ids().tolist())
+        new_ids = {chunk['vector_id'] for chunk in chunks}
+        removed = np.fromiter(old_ids - new_ids, dtype=np.int64)
+        added = [chunk for chunk in chunks if chunk['vector_id'] not in old_ids]
+
+        self.remove_ids(removed)
+        if added:
+            embeddings = np.ascontiguousarray(embed_texts([chunk['text'] for chunk in added]), dtype='float32')
+            ids = np.fromiter((chunk['vector_id'] for chunk in added), dtype=np.int64, count=len(added))
+            self.index.add_with_ids(embeddings, ids)
+
+        # Chunk ids and pages may have shifted even where text did not, so
+        # the (cheap) metadata is rebuilt from the new chunk list
+        self.chunk_store = ChunkStore(capacity=len(chunks))
+        self.chunk_store.append(chunks)
+        self.occurrences = occurrences
+        self.finalize()
+
+        return {
+            'added': len(added),
+            'removed': len(removed),
+            'unchanged': len(chunks) - len(added)
+        }
+
+    def clone(self) -> 'FAISSStore':
+        """Independent copy, so an update can be built while the original serves queries"""
+        clone = copy.copy(self)
+        clone.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+        clone._enable_reconstruct()
+        clone.chunk_store = copy.deepcopy(self.chunk_store)
+        clone.occurrences = Counter(self.occurrences)
+        return clone
+
     def search(self, query_embedding: np.ndarray, top_k: int = 6) -> List[Dict]:
         """
         Search for similar chunks
@@ -49,39 +409,96 @@ class FAISSStore:
         query_embedding = query_embedding.reshape(1, -1).astype('float32')
         distances, indices = self.index.search(query_embedding, top_k)
         
-        results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx < len(self.metadata):
-                result = self.metadata[idx].copy()
-                result['score'] = float(distance)
-                results.append(result)
-        
-        return results
-    
+        # Approximate indexes pad missing results with -1; the store skips them
+        return self.chunk_store.results(indices[0], distances[0])
+
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 6,
+                     with_vectors: bool = False) -> List[List[Dict]]:
+        """
+        Search for several queries with one matrix search
+
+        Args:
+            query_embeddings: Matrix of query vectors, one row per query
+            top_k: Number of results per query
+            with_vectors: Attach each result's stored vector as 'embedding'
+                (used for redundancy-aware reranking)
+
+        Returns:
+            One result list per query, in input order
+        """
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        distances, indices = self.index.search(query_embeddings, top_k)
+        if not with_vectors:
+            return [self.chunk_store.results(ids, scores) for ids, scores in zip(indices, distances)]
+
+        batches = []
+        for ids, scores in zip(indices, distances):
+            known = np.fromiter((i in self.chunk_store.row_by_vector for i in ids.tolist()), dtype=bool, count=len(ids))
+            ids, scores = ids[known], scores[known]
+            results = self.chunk_store.results(ids, scores)
+            if len(ids):
+                for result, vector in zip(results, self.index.reconstruct_batch(ids)):
+                    result['embedding'] = vector
+            batches.append(results)
+        return batches
+
     def save(self, index_path: str, metadata_path: str):
         """
         Save index and metadata to disk
-        
+
+        Metadata is written as an uncompressed .npz of columnar arrays plus
+        one UTF-8 text buffer, so loading needs no JSON parsing.
+
         Args:
             index_path: Path to save FAISS index
-            metadata_path: Path to save metadata JSON
+            metadata_path: Path to save metadata (.npz)
         """
         faiss.write_index(self.index, index_path)
-        with open(metadata_path, 'w') as f:
-            json.dump(self.metadata, f)
-    
+        self.chunk_store.save(metadata_path)
+
     def load(self, index_path: str, metadata_path: str):
         """
         Load index and metadata from disk
-        
+
         Args:
             index_path: Path to FAISS index
-            metadata_path: Path to metadata JSON
+            metadata_path: Path to metadata (.npz)
         """
         self.index = faiss.read_index(index_path)
-        with open(metadata_path, 'r') as f:
-            self.metadata = json.load(f)
-    
+        self.set_search_params()
+        self._enable_reconstruct()
+        self.chunk_store = ChunkStore.load(metadata_path)
+        # Recount occurrences so later adds keep ids unique
+        self.occurrences = Counter()
+        assign_vector_ids([{'text': self.chunk_store.text_at(row)} for row in range(len(self.chunk_store))],
+                          self.occurrences)
+
+    def memory_bytes(self) -> int:
+        """Approximate in-memory size of the index plus chunk store"""
+        return self.footprint()['total_bytes']
+
+    def footprint(self) -> Dict:
+        """
+        Report the in-memory size of the index and chunk metadata
+
+        Returns:
+            Dict with index type, storage, vector count, bytes per vector
+            (codes plus graph/id overhead) and index/chunk/total bytes
+        """
+        # The serialized form mirrors the index's in-memory arrays
+        index_bytes = int(faiss.serialize_index(self.index).nbytes)
+        chunk_bytes = self.chunk_store.memory_bytes()
+        vectors = int(self.index.ntotal)
+        return {
+            'index_type': self.active_index_type,
+            'storage': self.active_storage,
+            'vectors': vectors,
+            'bytes_per_vector': round(index_bytes / vectors, 1) if vectors else None,
+            'index_bytes': index_bytes,
+            'chunk_bytes': chunk_bytes,
+            'total_bytes': index_bytes + chunk_bytes
+        }
+
     def get_chunk_by_id(self, chunk_id: int) -> Dict:
         """
         Retrieve a specific chunk by ID
@@ -92,13 +509,15 @@ class FAISSStore:
         Returns:
             Chunk dictionary
         """
-        for chunk in self.metadata:
-            if chunk['chunk_id'] == chunk_id:
-                return chunk
-        return None
+        row = self.chunk_store.row_of(chunk_id)
+        if row is None:
+            return None
+        chunk = self.chunk_store.get(row)
+        return {'chunk_id': chunk['chunk_id'], 'page': chunk['page'], 'page_end': chunk['page_end'],
+                'text': chunk['text']}
     
     def reset(self):
         """Reset the index and metadata"""
-        self.index = faiss.IndexFlatIP(self.dimension)
-        self.chunks = []
-        self.metadata = []
+        self.index = self._initial_index()
+        self.chunk_store = ChunkStore()
+        self.occurrences = Counter()
@@ -2,17 +2,93 @@
 Groq LLM client for generating answers
 """
 import os
+import json
+import random
+import threading
+import time
 import requests
-from typing import List, Dict
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Iterator, Optional
+from metrics import REGISTRY, span
+
+DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+LLM_REQUESTS = REGISTRY.counter('finsight_llm_requests_total', 'LLM HTTP attempts by response status', ['status'])
+LLM_REQUEST_SECONDS = REGISTRY.histogram('finsight_llm_request_seconds',
+                                         'LLM HTTP attempts: time until response headers', ['stream'])
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.histogram('finsight_llm_time_to_first_token_seconds',
+                                             'Streamed answers: time until the first token')
+LLM_RETRIES = REGISTRY.counter('finsight_llm_retries_total', 'LLM attempts retried after 429/5xx or connection errors')
+LLM_FALLBACKS = REGISTRY.counter('finsight_llm_fallbacks_total', 'Answers served by the local fallback', ['reason'])
+LLM_IN_FLIGHT = REGISTRY.gauge('finsight_llm_in_flight', 'LLM requests holding a connection slot', per_process=True)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request cannot complete within its deadline"""
+
+
+class IncompleteStream(Exception):
+    """Raised when a completion stream closes without its terminator"""
+
+
+class StreamInterrupted(Exception):
+    """Raised when a streamed answer fails after part of it was already yielded"""
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
 
 class GroqClient:
-    def __init__(self):
-        """Initialize Groq client"""
+    def __init__(self, max_in_flight: int = None, max_retries: int = None, timeout: float = None,
+                 cache=None):
+        """
+        Initialize Groq client
+
+        Requests share one pooled HTTP session, so connections (and TLS
+        sessions) are reused across queries.
+
+        Args:
+            max_in_flight: Concurrent LLM requests allowed (GROQ_MAX_IN_FLIGHT, default 8)
+            max_retries: Retries for 429/5xx and connection errors (GROQ_MAX_RETRIES, default 3)
+            timeout: Default per-request budget in seconds (GROQ_TIMEOUT, default 30)
+            cache: Optional QueryCache for answers to repeated questions
+        """
         self.api_key = os.getenv('GROQ_API_KEY')
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
+        # Any OpenAI-compatible server works (e.g. a local mock for testing)
+        self.base_url = os.getenv('GROQ_BASE_URL', DEFAULT_BASE_URL).rstrip('/') + "/chat/completions"
         self.model = "llama-3.3-70b-versatile"  # Using available model instead of gpt-oss-120b
-        
-    def generate_answer(self, query: str, retrieved_chunks: List[Dict], chat_history: List[Dict] = None) -> str:
+
+        self.max_in_flight = max_in_flight or int(os.getenv('GROQ_MAX_IN_FLIGHT', 8))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('GROQ_MAX_RETRIES', 3))
+        self.timeout = timeout or float(os.getenv('GROQ_TIMEOUT', 30))
+        self.backoff_base = 0.5
+        self.backoff_cap = 8.0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.cache = cache
+
+    def generate_answer(self, query: str, retrieved_chunks: List[Dict], chat_history: List[Dict] = None,
+                        deadline: float = None, document_hash: str = None, query_embedding=None) -> str:
         """
         Generate answer using Groq LLM
         
@@ -20,13 +96,21 @@ class GroqClient:
             query: User query
             retrieved_chunks: List of retrieved chunks from FAISS
             chat_history: Previous conversation messages
+            deadline: time.monotonic() value by which the answer is needed;
+                defaults to now + timeout
+            document_hash: Hash of the queried document; enables the answer cache
+            query_embedding: Normalized query vector for near-duplicate cache hits
             
         Returns:
             Generated answer with citations
         """
         # If no API key, return local fallback
         if not self.api_key:
-            return self._local_fallback(retrieved_chunks)
+            return self._fallback(retrieved_chunks, 'no_api_key')
+
+        cached = self._cached_answer(query, retrieved_chunks, document_hash, query_embedding)
+        if cached is not None:
+            return cached
         
         # Build context from retrieved chunks
         context = self._build_context(retrieved_chunks)
@@ -35,38 +119,257 @@ class GroqClient:
         messages = self._build_messages(query, context, chat_history)
         
         try:
-            response = requests.post(
-                self.base_url,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "temperature": 0.3,
-                    "max_tokens": 1000
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                return response.json()['choices'][0]['message']['content']
-            else:
-                print(f"Groq API error: {response.status_code} - {response.text}")
-                return self._local_fallback(retrieved_chunks)
+            with span('llm'), self._request(messages, self._deadline(deadline)) as response:
+                if response.status_code == 200:
+                    answer = response.json()['choices'][0]['message']['content']
+                    self._cache_answer(query, retrieved_chunks, document_hash, query_embedding, answer)
+                    return answer
+                else:
+                    print(f"Groq API error: {response.status_code} - {response.text}")
+                    return self._fallback(retrieved_chunks, 'http_error')
                 
         except Exception as e:
             print(f"Error calling Groq API: {e}")
-            return self._local_fallback(retrieved_chunks)
+            return self._fallback(retrieved_chunks, self._failure_reason(e))
     
+    def stream_answer(self, query: str, retrieved_chunks: List[Dict], chat_history: List[Dict] = None,
+                      deadline: float = None, document_hash: str = None, query_embedding=None) -> Iterator[str]:
+        """
+        Generate an answer, yielding text deltas as the LLM produces them
+
+        Args:
+            query: User query
+            retrieved_chunks: List of retrieved chunks from FAISS
+            chat_history: Previous conversation messages
+            deadline: time.monotonic() value by which the answer is needed
+            document_hash: Hash of the queried document; enables the answer cache
+            query_embedding: Normalized query vector for near-duplicate cache hits
+
+        Yields:
+            Answer text fragments; local fallback and cached answers are
+            yielded as one piece
+
+        Raises:
+            StreamInterrupted: The stream failed (e.g. the deadline passed)
+                after some fragments were yielded; the answer is incomplete
+        """
+        if not self.api_key:
+            yield self._fallback(retrieved_chunks, 'no_api_key')
+            return
+
+        cached = self._cached_answer(query, retrieved_chunks, document_hash, query_embedding)
+        if cached is not None:
+            yield cached
+            return
+
+        context = self._build_context(retrieved_chunks)
+        messages = self._build_messages(query, context, chat_history)
+
+        deadline = self._deadline(deadline)
+        started = time.perf_counter()
+        streamed_any = False
+        parts = []
+        try:
+            # The span includes the time the consumer takes to send each delta on
+            with span('llm'), self._request(messages, deadline, stream=True) as response:
+                if response.status_code != 200:
+                    print(f"Groq API error: {response.status_code} - {response.text}")
+                    yield self._fallback(retrieved_chunks, 'http_error')
+                    return
+
+                for delta in self._iter_stream_deltas(response):
+                    if not streamed_any:
+                        LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started)
+                    streamed_any = True
+                    parts.append(delta)
+                    yield delta
+                    if time.monotonic() > deadline:
+                        raise DeadlineExceeded("LLM stream exceeded its deadline")
+
+            self._cache_answer(query, retrieved_chunks, document_hash, query_embedding, "".join(parts))
+
+        except Exception as e:
+            print(f"Error streaming from Groq API: {e}")
+            # The user has already seen part of an answer: report it as cut off
+            if streamed_any:
+                raise StreamInterrupted(f"Answer incomplete: {e}") from e
+            yield self._fallback(retrieved_chunks, self._failure_reason(e))
+
+    def summarize(self, messages: List[Dict], previous_summary: Optional[str] = None,
+                  max_tokens: int = 300) -> str:
+        """
+        Fold older conversation turns into a short running summary
+
+        Args:
+            messages: Turns dropped from the history, oldest first
+            previous_summary: Summary of the turns before them, if any
+            max_tokens: Length cap of the summary
+
+        Returns:
+            Summary text (the turns truncated and joined if the LLM is unavailable)
+        """
+        transcript = '\n'.join(f"{m['role']}: {m['content']}" for m in messages)
+        fallback = ' '.join(filter(None, [previous_summary, transcript]))[-max_tokens * 4:]
+        if not self.api_key:
+            return fallback
+
+        prompt = [
+            {"role": "system", "content": "Summarize this conversation about a financial document in a few "
+                                          "sentences. Keep figures, page citations and open questions."},
+            {"role": "user", "content": f"Earlier summary: {previous_summary or 'none'}\n\n{transcript}"}
+        ]
+        try:
+            with span('summarize'), self._request(prompt, self._deadline(None), max_tokens=max_tokens) as response:
+                if response.status_code == 200:
+                    return response.json()['choices'][0]['message']['content']
+                print(f"Groq API error: {response.status_code} - {response.text}")
+        except Exception as e:
+            print(f"Error calling Groq API: {e}")
+        return fallback
+
+    def _iter_stream_deltas(self, response) -> Iterator[str]:
+        """
+        Parse an OpenAI-style SSE completion stream into content deltas
+
+        Raises:
+            IncompleteStream: The connection closed before [DONE] or a
+                'stop' finish reason, so the answer may be cut off
+        """
+        finished = False
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            choice = (json.loads(data).get('choices') or [{}])[0]
+            content = choice.get('delta', {}).get('content')
+            if content:
+                yield content
+            finished = finished or choice.get('finish_reason') == 'stop'
+        if not finished:
+            raise IncompleteStream("LLM stream ended before completion")
+
+    def _cached_answer(self, query, chunks, document_hash, query_embedding) -> Optional[str]:
+        if self.cache is None or document_hash is None:
+            return None
+        chunk_ids = self._chunk_keys(chunks)
+        return self.cache.get_answer(document_hash, query, chunk_ids, query_embedding)
+
+    def _cache_answer(self, query, chunks, document_hash, query_embedding, answer: str):
+        # Only real LLM answers are cached, never the local fallback
+        if self.cache is None or document_hash is None or not answer:
+            return
+        chunk_ids = self._chunk_keys(chunks)
+        self.cache.put_answer(document_hash, query, chunk_ids, answer, query_embedding)
+
+    def _chunk_keys(self, chunks: List[Dict]) -> List[str]:
+        # Chunk ids are only unique within a document
+        return [f"{chunk.get('document_id', '')}:{chunk['chunk_id']}" for chunk in chunks]
+
+    def _deadline(self, deadline: Optional[float]) -> float:
+        return deadline if deadline is not None else time.monotonic() + self.timeout
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    @contextmanager
+    def _request(self, messages: List[Dict], deadline: float, stream: bool = False, max_tokens: int = 1000):
+        """
+        POST a completion request with pooling, a concurrency cap and retries
+
+        Retries 429/5xx responses and connection errors with jittered
+        exponential backoff (or the server's Retry-After), never past the
+        deadline. A connection slot is held only while a request is in
+        flight, including while a streamed body is being read.
+
+        Args:
+            messages: Chat messages
+            deadline: time.monotonic() value after which no attempt is made
+            stream: Request a streamed completion
+
+        Yields:
+            The final HTTP response
+        """
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("LLM request deadline exceeded")
+            if not self._slots.acquire(timeout=remaining):
+                raise DeadlineExceeded("No free LLM connection before deadline")
+
+            retry_after = None
+            LLM_IN_FLIGHT.inc()
+            try:
+                started = time.perf_counter()
+                try:
+                    response = self.session.post(
+                        self.base_url,
+                        headers=self._headers(),
+                        json=self._payload(messages, stream=stream, max_tokens=max_tokens),
+                        timeout=(min(5.0, remaining), remaining),
+                        stream=stream
+                    )
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    LLM_REQUESTS.inc(status='timeout' if isinstance(e, requests.Timeout) else 'connection_error')
+                    if attempt >= self.max_retries:
+                        raise
+                    print(f"Groq API request failed ({e}), retrying")
+                else:
+                    LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, stream=str(stream).lower())
+                    LLM_REQUESTS.inc(status=response.status_code)
+                    if response.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                        with response:
+                            yield response
+                        return
+                    retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+                    print(f"Groq API returned {response.status_code}, retrying")
+                    response.close()
+            finally:
+                LLM_IN_FLIGHT.dec()
+                self._slots.release()
+
+            LLM_RETRIES.inc()
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            if time.monotonic() + delay >= deadline:
+                raise DeadlineExceeded("LLM retry would exceed the deadline")
+            time.sleep(delay)
+            attempt += 1
+
+    def _headers(self) -> Dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, messages: List[Dict], stream: bool = False, max_tokens: int = 1000) -> Dict:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.3,
+            "max_tokens": max_tokens
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _page_label(self, chunk: Dict) -> str:
+        """'Page 5', or 'Pages 5-6' for a chunk spanning pages"""
+        page_end = chunk.get('page_end', chunk['page'])
+        if page_end != chunk['page']:
+            return f"Pages {chunk['page']}-{page_end}"
+        return f"Page {chunk['page']}"
+
     def _build_context(self, chunks: List[Dict]) -> str:
         """Build context string from chunks"""
         context_parts = []
         for chunk in chunks:
-            context_parts.append(
-                f"[Page {chunk['page']}, Chunk {chunk['chunk_id']}]\n{chunk['text']}\n"
-            )
+            source = f"{self._page_label(chunk)}, Chunk {chunk['chunk_id']}"
+            if chunk.get('filename'):
+                source = f"Document {chunk['filename']}, {source}"
+            context_parts.append(f"[{source}]\n{chunk['text']}\n")
         return "\n---\n".join(context_parts)
     
     def _build_messages(self, query: str, context: str, chat_history: List[Dict] = None) -> List[Dict]:
@@ -77,7 +380,7 @@ Your role is to answer questions about financial documents with precision and cl
 
 CRITICAL RULES:
 1. Use ONLY the retrieved document chunks as evidence
-2. ALWAYS cite sources in this exact format: (page: X, chunk: Y)
+2. ALWAYS cite sources in this exact format: (page: X, chunk: Y); when several documents are provided, use (document: NAME, page: X, chunk: Y)
 3. If information is not in the provided chunks, say: "Not available in the provided document."
 4. For follow-up questions, extend your previous answer with new context
 5. Structure your responses clearly with bullet points or paragraphs as appropriate
@@ -92,9 +395,9 @@ Be professional, accurate, and helpful. Financial professionals rely on your pre
             {"role": "system", "content": system_prompt}
         ]
         
-        # Add chat history if provided (last 10 messages)
+        # Add chat history if provided (already trimmed to the history token budget)
         if chat_history:
-            messages.extend(chat_history[-10:])
+            messages.extend(chat_history)
         
         # Add current query with context
         user_message = f"""Retrieved document context:
@@ -111,6 +414,20 @@ Please answer based on the retrieved context above, citing sources."""
         
         return messages
     
+    def _failure_reason(self, error: Exception) -> str:
+        """Fallback reason label for an exception from a request"""
+        if isinstance(error, DeadlineExceeded):
+            return 'deadline'
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return 'connection'
+        if isinstance(error, IncompleteStream):
+            return 'incomplete_stream'
+        return 'error'
+
+    def _fallback(self, chunks: List[Dict], reason: str) -> str:
+        LLM_FALLBACKS.inc(reason=reason)
+        return self._local_fallback(chunks)
+
     def _local_fallback(self, chunks: List[Dict]) -> str:
         """Fallback response when Groq API is unavailable"""
         if not chunks:
@@ -119,7 +436,7 @@ Please answer based on the retrieved context above, citing sources."""
         response = "Here are the most relevant excerpts from the document:\n\n"
         
         for chunk in chunks[:3]:  # Show top 3 chunks
-            response += f"**Page {chunk['page']}, Chunk {chunk['chunk_id']}:**\n"
+            response += f"**{self._page_label(chunk)}, Chunk {chunk['chunk_id']}:**\n"
             response += f"{chunk['text'][:300]}...\n\n"
         
         response += "\n_Note: Running in local mode. Set GROQ_API_KEY environment variable for AI-powered responses._"
@@ -0,0 +1,47 @@
+"""
+Production server: gunicorn -c gunicorn.conf.py app:app (run from backend/)
+
+The master imports the app once (preload_app; cheap, heavy modules are lazy),
+binds the socket, then loads the embedding model and persisted FAISS shards
+before forking the workers. Their memory pages are shared copy-on-write until
+written. Each worker serves requests on a small thread pool, so streaming
+answers and long LLM calls do not block others.
+"""
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+os.environ["WEB_CONCURRENCY"] = str(workers)
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+preload_app = True
+
+bind = f"0.0.0.0:{os.getenv('PORT', 3000)}"
+# Uploads and LLM calls are slow; QUERY_TIMEOUT_S bounds queries separately
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+# On SIGTERM, workers get this long to finish in-flight requests and stop ingestion
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# 0: workers start serving immediately and each loads the model itself in the
+# background (faster first /api/health, no memory sharing)
+preload_model = os.getenv("PRELOAD_MODEL", "1") == "1"
+
+
+def when_ready(server):
+    if preload_model:
+        from app import preload
+
+        preload()
+
+
+def post_fork(server, worker):
+    from app import on_worker_start
+
+    # Split the cores between workers instead of each using all of them
+    on_worker_start(max(1, (os.cpu_count() or 1) // workers))
+
+
+def worker_exit(server, worker):
+    from app import shutdown
+
+    shutdown()
@@ -0,0 +1,149 @@
+"""
+Content-addressed on-disk cache of built FAISS indexes
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+from faiss_store import FAISSStore
+
+# Bump when the on-disk layout changes so stale entries are never loaded
+CACHE_VERSION = 3
+
+INDEX_FILE = 'index.faiss'
+METADATA_FILE = 'metadata.npz'
+INFO_FILE = 'info.json'
+
+_evict_lock = threading.Lock()
+
+
+def hash_file(path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 of a file without reading it into memory at once
+
+    Args:
+        path: Path to the file
+        block_size: Bytes read per step
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexCache:
+    def __init__(self, cache_dir: str = 'cache/index', max_bytes: int = 2 * 1024 ** 3):
+        """
+        Initialize the index cache
+
+        Args:
+            cache_dir: Directory holding one sub-directory per cached index
+            max_bytes: Total size budget; least recently used entries are evicted
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def make_key(self, document_hash: str, config: Dict) -> str:
+        """
+        Build the cache key for a document and pipeline configuration
+
+        Args:
+            document_hash: SHA-256 of the uploaded bytes
+            config: Chunker/embedder settings that affect the index
+
+        Returns:
+            Hex digest identifying the cache entry
+        """
+        payload = json.dumps(
+            {'version': CACHE_VERSION, 'document': document_hash, 'config': config},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def load(self, key: str, store: FAISSStore) -> Optional[Dict]:
+        """
+        Load a cached index into the given store
+
+        Args:
+            key: Cache key from make_key()
+            store: Vector store to populate
+
+        Returns:
+            Stored ingestion info, or None on a cache miss
+        """
+        entry = self.cache_dir / key
+        info_path = entry / INFO_FILE
+        if not info_path.is_file():
+            return None
+
+        try:
+            store.load(str(entry / INDEX_FILE), str(entry / METADATA_FILE))
+            with open(info_path, 'r') as f:
+                info = json.load(f)
+        except Exception as e:
+            print(f"Discarding unreadable cache entry {key}: {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+            store.reset()
+            return None
+
+        # Mark as recently used for LRU eviction
+        os.utime(info_path)
+        return info
+
+    def save(self, key: str, store: FAISSStore, info: Dict):
+        """
+        Persist an index, then evict old entries if over budget
+
+        Args:
+            key: Cache key from make_key()
+            store: Populated vector store
+            info: Small JSON-serializable ingestion summary
+        """
+        entry = self.cache_dir / key
+        tmp = self.cache_dir / f".{key}.{uuid.uuid4().hex}.tmp"
+        tmp.mkdir()
+
+        try:
+            store.save(str(tmp / INDEX_FILE), str(tmp / METADATA_FILE))
+            # info.json is written last: its presence marks a complete entry
+            with open(tmp / INFO_FILE, 'w') as f:
+                json.dump(info, f)
+            if entry.exists():
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until under max_bytes"""
+        with _evict_lock:
+            entries = []
+            total = 0
+            for entry in self.cache_dir.iterdir():
+                info_path = entry / INFO_FILE
+                if entry.name.startswith('.') or not info_path.is_file():
+                    continue
+                size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+                entries.append((info_path.stat().st_mtime, size, entry))
+                total += size
+
+            entries.sort(key=lambda e: e[0])
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                print(f"Evicted cached index {entry.name}")
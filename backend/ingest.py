@@ -2,47 +2,234 @@
 Document ingestion pipeline
 """
 from pdf_parser import PDFParser
-from chunker import TextChunker
+from chunker import TextChunker, TokenChunker
 from embedder import Embedder
+from embedding_cache import EmbeddingCache
 from faiss_store import FAISSStore
-from typing import Dict
+from index_cache import IndexCache, hash_file
+from page_cache import PageCache
+from metrics import REGISTRY
+from pipeline import IngestionCancelled, IngestionPipeline
+from query_cache import QueryCache
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import threading
+import time
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+
+INGEST_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+INGESTIONS = REGISTRY.counter('finsight_ingestions_total', 'Documents ingested, by how the index was obtained',
+                              ['result'])
+INGEST_SECONDS = REGISTRY.histogram('finsight_ingest_seconds', 'Time to ingest a document', ['result'],
+                                    buckets=INGEST_BUCKETS)
+INGEST_STAGE_SECONDS = REGISTRY.histogram('finsight_ingest_stage_seconds',
+                                          'Busy time of each ingestion pipeline stage per document', ['stage'],
+                                          buckets=INGEST_BUCKETS)
+INGESTED_PAGES = REGISTRY.counter('finsight_ingested_pages_total', 'Pages parsed by ingestion')
+INGESTED_CHUNKS = REGISTRY.counter('finsight_ingested_chunks_total', 'Chunks indexed by ingestion')
 
 class DocumentIngestor:
-    def __init__(self):
-        """Initialize the ingestion pipeline"""
-        self.pdf_parser = PDFParser()
-        self.chunker = TextChunker(chunk_size=3600, overlap=800)
-        self.embedder = Embedder('all-MiniLM-L6-v2')
-        self.vector_store = FAISSStore(dimension=384)
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, index_cache: Optional[IndexCache] = None,
+                 parser_workers: int = 1, embed_batch_size: int = 32, query_cache: Optional[QueryCache] = None,
+                 index_type: str = 'auto', embedding_cache: Optional[EmbeddingCache] = None,
+                 embedding_backend: str = 'torch', vector_storage: str = 'fp32', chunker: str = 'tokens',
+                 parser_backend: str = 'pdfplumber', table_fallback: bool = True,
+                 page_cache: Optional[PageCache] = None, pdf_parser: Optional[PDFParser] = None):
+        """
+        Initialize the ingestion pipeline
+
+        Args:
+            model_name: Embedding model, shared process-wide via the model registry
+            index_cache: Persistent index cache; None disables caching
+            parser_workers: Processes used for PDF text extraction
+            embed_batch_size: Chunks embedded per micro-batch while streaming
+            query_cache: Shared cache of query embeddings; None disables caching
+            index_type: FAISS backend ('flat', 'ivf_flat', 'ivf_pq', 'hnsw' or 'auto')
+            embedding_cache: Persistent chunk embedding cache; None disables it
+            embedding_backend: Model runtime ('torch', 'torch_int8', 'onnx', 'onnx_int8')
+            vector_storage: Vector encoding ('fp32', 'fp16', 'sq8' or 'pq')
+            chunker: 'tokens' for sentence-aligned chunks sized to the model's
+                sequence length, or 'chars' for fixed character windows
+            parser_backend: PDF text extraction engine ('pdfplumber', 'pdftotext',
+                'pdfium' or 'auto')
+            table_fallback: Re-extract tabular pages with pdfplumber when a
+                faster engine is used
+            page_cache: Persistent extracted-page cache; None disables it
+            pdf_parser: Parser shared between ingestors (and its worker pool);
+                replaces parser_workers, parser_backend, table_fallback and
+                page_cache
+        """
+        self.pdf_parser = pdf_parser or PDFParser(workers=parser_workers, backend=parser_backend,
+                                                  table_fallback=table_fallback, page_cache=page_cache)
+        self.embedder = Embedder(model_name, query_cache=query_cache, embedding_cache=embedding_cache,
+                                 backend=embedding_backend)
+        if chunker == 'chars':
+            self.chunker = TextChunker(chunk_size=3600, overlap=800)
+        elif chunker == 'tokens':
+            self.chunker = TokenChunker(self.embedder.tokenizer, max_tokens=self.embedder.max_seq_length)
+        else:
+            raise ValueError(f"Unknown chunker: {chunker}")
+        self.vector_store = FAISSStore(dimension=self.embedder.dimension, index_type=index_type,
+                                       storage=vector_storage)
+        self.index_cache = index_cache
+        self.embed_batch_size = embed_batch_size
+        self.document_hash = None
+
+    def cache_config(self) -> Dict:
+        """Settings that change the built index and so belong in the cache key"""
+        return {
+            **self.chunker.config(),
+            **self.pdf_parser.config(),
+            'model': self.embedder.model_key,
+            'dimension': self.embedder.dimension,
+            'index_type': self.vector_store.index_type,
+            'storage': self.vector_store.storage
+        }
     
-    def ingest_pdf(self, pdf_path: str) -> Dict:
+    def ingest_pdf(self, pdf_path: str, progress: Optional[Callable] = None,
+                   cancel_event: Optional[threading.Event] = None, document_hash: Optional[str] = None) -> Dict:
         """
         Full ingestion pipeline: parse -> chunk -> embed -> store
+
+        Stages run concurrently (see IngestionPipeline) and the index is
+        filled incrementally as embedding micro-batches complete.
         
         Args:
             pdf_path: Path to PDF file
+            progress: Optional callback receiving pipeline progress counters
+            cancel_event: Optional event that aborts ingestion when set
+            document_hash: SHA-256 of the file when already known (computed
+                while the upload was received), saving a pass over the file
             
         Returns:
             Dictionary with ingestion stats
         """
-        print("Step 1: Parsing PDF...")
-        parsed_data = self.pdf_parser.parse_pdf(pdf_path)
-        
-        print("Step 2: Chunking text...")
-        chunks = self.chunker.chunk_text(parsed_data['pages'])
-        
-        print(f"Step 3: Generating embeddings for {len(chunks)} chunks...")
-        chunk_texts = [chunk['text'] for chunk in chunks]
-        embeddings = self.embedder.embed_texts(chunk_texts)
-        
-        print("Step 4: Building FAISS index...")
-        self.vector_store.add_embeddings(embeddings, chunks)
-        
+        started = time.perf_counter()
+        self.document_hash = document_hash or hash_file(pdf_path)
+        cached = self._load_cached(progress, started)
+        if cached is not None:
+            return cached
+
+        print("Ingesting PDF: parse -> chunk -> embed -> index...")
+        stats = IngestionPipeline(
+            self.pdf_parser, self.chunker, self.embedder, self.vector_store,
+            batch_size=self.embed_batch_size
+        ).run(pdf_path, progress=progress, cancel_event=cancel_event, document_hash=self.document_hash)
+        print(f"Ingested {stats['total_chunks']} chunks in {stats['elapsed_seconds']}s "
+              f"(bottleneck: {stats['bottleneck']})")
+
+        info = {
+            'total_pages': stats['total_pages'],
+            'total_chunks': stats['total_chunks']
+        }
+        self._save_cached(info)
+        for name, stage in stats['stages'].items():
+            INGEST_STAGE_SECONDS.observe(stage['busy_seconds'], stage=name)
+        self._record('built', info, started)
+
+        return {
+            **info,
+            'document_hash': self.document_hash,
+            'cached': False,
+            'stages': stats['stages'],
+            'status': 'success'
+        }
+
+    def update_pdf(self, pdf_path: str, base_store: FAISSStore, progress: Optional[Callable] = None,
+                   cancel_event: Optional[threading.Event] = None, document_hash: Optional[str] = None) -> Dict:
+        """
+        Ingest an amended version of an already indexed document
+
+        The new chunking is diffed against base_store by stable vector id:
+        unchanged chunks keep their vectors, removed ones are deleted and
+        only new text is embedded. base_store itself is left untouched.
+
+        Args:
+            pdf_path: Path to the amended PDF
+            base_store: Vector store of the previous version
+            progress: Optional callback receiving progress counters
+            cancel_event: Optional event that aborts ingestion when set
+            document_hash: SHA-256 of the file, if already known
+
+        Returns:
+            Dictionary with ingestion stats, including added/removed counts
+        """
+        started = time.perf_counter()
+        self.document_hash = document_hash or hash_file(pdf_path)
+        cached = self._load_cached(progress, started)
+        if cached is not None:
+            return cached
+
+        pages = self.pdf_parser.parse_pdf(pdf_path, self.document_hash)
+        if progress is not None:
+            progress(pages_total=pages['total_pages'], pages_parsed=pages['total_pages'])
+        chunks = self.chunker.chunk_text(pages['pages'])
+        if cancel_event is not None and cancel_event.is_set():
+            raise IngestionCancelled()
+
+        self.vector_store = base_store.clone()
+        changes = self.vector_store.apply_update(
+            chunks, lambda texts: self.embedder.embed_texts(texts, show_progress_bar=False)
+        )
+        print(f"Updated index: {changes['added']} chunks added, {changes['removed']} removed, "
+              f"{changes['unchanged']} unchanged")
+        if progress is not None:
+            progress(chunks_embedded=len(chunks))
+
+        info = {
+            'total_pages': pages['total_pages'],
+            'total_chunks': len(chunks)
+        }
+        self._save_cached(info)
+        self._record('updated', info, started)
+
+        return {
+            **info,
+            **changes,
+            'document_hash': self.document_hash,
+            'cached': False,
+            'status': 'success'
+        }
+
+    def _cache_key(self) -> Optional[str]:
+        if self.index_cache is None:
+            return None
+        return self.index_cache.make_key(self.document_hash, self.cache_config())
+
+    def _record(self, result: str, info: Dict, started: float):
+        INGESTIONS.inc(result=result)
+        INGEST_SECONDS.observe(time.perf_counter() - started, result=result)
+        if result != 'cached':
+            INGESTED_PAGES.inc(info['total_pages'])
+            INGESTED_CHUNKS.inc(info['total_chunks'])
+
+    def _load_cached(self, progress: Optional[Callable], started: float) -> Optional[Dict]:
+        """Load the index for self.document_hash from the cache, if present"""
+        cache_key = self._cache_key()
+        if cache_key is None:
+            return None
+        info = self.index_cache.load(cache_key, self.vector_store)
+        if info is None:
+            return None
+
+        print(f"Loaded cached index for document {self.document_hash[:12]}")
+        self._record('cached', info, started)
+        if progress is not None:
+            progress(pages_total=info['total_pages'], pages_parsed=info['total_pages'],
+                     chunks_embedded=info['total_chunks'])
         return {
-            'total_pages': parsed_data['total_pages'],
-            'total_chunks': len(chunks),
+            'total_pages': info['total_pages'],
+            'total_chunks': info['total_chunks'],
+            'document_hash': self.document_hash,
+            'cached': True,
             'status': 'success'
         }
+
+    def _save_cached(self, info: Dict):
+        cache_key = self._cache_key()
+        if cache_key is not None:
+            self.index_cache.save(cache_key, self.vector_store, info)
     
     def query(self, query_text: str, top_k: int = 6) -> list:
         """
@@ -55,9 +242,36 @@ class DocumentIngestor:
         Returns:
             List of relevant chunks
         """
-        query_embedding = self.embedder.embed_query(query_text)
+        query_embedding = self.embed_query(query_text)
         results = self.vector_store.search(query_embedding, top_k)
         return results
+
+    def query_batch(self, queries: List[str], top_k: int = 6) -> List[list]:
+        """
+        Query the vector store with several questions at once
+
+        Uncached questions are embedded in a single forward pass and all of
+        them are searched with one matrix search.
+
+        Args:
+            queries: Query strings
+            top_k: Number of results per query
+
+        Returns:
+            One list of relevant chunks per query, in input order
+        """
+        if not queries:
+            return []
+        embeddings = self.embed_queries(queries)
+        return self.vector_store.search_batch(embeddings, top_k)
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed several queries (cached vectors are reused)"""
+        return self.embedder.embed_queries(queries)
+
+    def embed_query(self, query_text: str) -> np.ndarray:
+        """Embed a query (cached vectors are reused)"""
+        return self.embedder.embed_query(query_text)
     
     def get_chunk(self, chunk_id: int) -> Dict:
         """Get a specific chunk by ID"""
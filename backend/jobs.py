@@ -0,0 +1,232 @@
+"""
+Background ingestion jobs with progress reporting and cancellation
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from sqlite_db import SQLiteDatabase
+
+# Seconds between progress writes to the shared job table
+PUBLISH_INTERVAL = 0.5
+
+
+class IngestionJob:
+    def __init__(self, filename: str):
+        """
+        State of one ingestion job
+
+        Args:
+            filename: Name of the uploaded file
+        """
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = 'queued'
+        self.progress = {'pages_total': None, 'pages_parsed': 0, 'chunks_embedded': 0}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        # Called after each progress update (set by a shared JobManager)
+        self.listener: Optional[Callable[['IngestionJob'], None]] = None
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> 'IngestionJob':
+        """Snapshot of a job running in another worker process"""
+        job = cls(state['filename'])
+        job.id = state['job_id']
+        for name in ('status', 'progress', 'result', 'error', 'created_at', 'started_at', 'finished_at'):
+            setattr(job, name, state[name])
+        return job
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def update_progress(self, **progress):
+        """Merge progress counters reported by the ingestion pipeline"""
+        self.progress.update(progress)
+        if self.listener is not None:
+            self.listener(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers: int = 2, max_finished: int = 100, store_path: Optional[str] = None):
+        """
+        Initialize the job manager
+
+        Args:
+            max_workers: Jobs allowed to run at the same time
+            max_finished: Finished jobs kept for status polling
+            store_path: SQLite file shared by the worker processes of a
+                pre-fork server. Job state is published there, so any worker
+                can report or cancel a job another worker is running.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self.max_finished = max_finished
+        self.jobs: 'OrderedDict[str, IngestionJob]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+        if store_path:
+            self.db = SQLiteDatabase(store_path, [
+                'CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, status TEXT NOT NULL, '
+                'state TEXT NOT NULL, cancel_requested INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL)'
+            ])
+        self._published: Dict[str, float] = {}
+
+    def submit(self, filename: str, work: Callable[[IngestionJob], Dict]) -> IngestionJob:
+        """
+        Queue a job
+
+        Args:
+            filename: Name of the uploaded file
+            work: Function run on a worker thread; receives the job and
+                returns a JSON-serializable result
+
+        Returns:
+            The queued job
+        """
+        job = IngestionJob(filename)
+        if self.db is not None:
+            job.listener = self._on_progress
+        with self.lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self._publish(job)
+        self.executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None and self.db is not None:
+            with self.db.lock:
+                row = self.db.conn.execute('SELECT state FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is not None:
+                job = IngestionJob.from_dict(json.loads(row[0]))
+        return job
+
+    def list(self) -> list:
+        if self.db is not None:
+            with self.db.lock:
+                rows = self.db.conn.execute('SELECT state FROM jobs ORDER BY created_at').fetchall()
+            return [json.loads(row[0]) for row in rows]
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Request cancellation; a running job stops at its next checkpoint
+
+        Returns:
+            The job, or None if unknown
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            local = job_id in self.jobs
+        if not local:
+            # Running in another worker: it picks the request up at its next progress update
+            with self.db.lock:
+                self.db.conn.execute('UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?', (job_id,))
+                self.db.conn.commit()
+            return job
+        job.cancel_event.set()
+        with self.lock:
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        self._publish(job)
+        return job
+
+    def shutdown(self, wait: bool = True):
+        """Cancel outstanding jobs and stop the workers"""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            if not job.done:
+                self.cancel(job.id)
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        if self.db is not None:
+            self.db.close()
+
+    def _publish(self, job: IngestionJob):
+        """Write the job's state to the shared table and pick up remote cancellation"""
+        if self.db is None:
+            return
+        self._published[job.id] = time.monotonic()
+        with self.db.lock:
+            self.db.conn.execute(
+                'INSERT INTO jobs (job_id, status, state, created_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(job_id) DO UPDATE SET status = excluded.status, state = excluded.state',
+                (job.id, job.status, json.dumps(job.to_dict()), job.created_at)
+            )
+            cancel_requested = self.db.conn.execute(
+                'SELECT cancel_requested FROM jobs WHERE job_id = ?', (job.id,)
+            ).fetchone()[0]
+            self.db.conn.commit()
+        if cancel_requested:
+            job.cancel_event.set()
+
+    def _on_progress(self, job: IngestionJob):
+        if time.monotonic() - self._published.get(job.id, 0) >= PUBLISH_INTERVAL:
+            self._publish(job)
+
+    def _run(self, job: IngestionJob, work: Callable[[IngestionJob], Dict]):
+        with self.lock:
+            if job.status == 'cancelled':
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+        # Also picks up a cancellation requested by another worker while queued
+        self._publish(job)
+
+        try:
+            result = work(job)
+            status, job.result = 'succeeded', result
+        except Exception as e:
+            if job.cancel_event.is_set():
+                status = 'cancelled'
+            else:
+                print(f"Ingestion job {job.id} failed: {e}")
+                status, job.error = 'failed', str(e)
+
+        with self.lock:
+            job.status = status
+            job.finished_at = time.time()
+        self._publish(job)
+        self._published.pop(job.id, None)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+        if self.db is not None:
+            with self.db.lock:
+                self.db.conn.execute(
+                    "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs "
+                    "WHERE status IN ('succeeded', 'failed', 'cancelled') "
+                    "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_finished,)
+                )
+                self.db.conn.commit()
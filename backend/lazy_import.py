@@ -0,0 +1,38 @@
+"""
+Deferred imports for heavy optional dependencies
+"""
+import importlib
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name: str):
+        """
+        Stand-in for a module that is imported on first attribute access
+
+        Keeps `import app` (and therefore server startup and /api/health)
+        from paying for faiss, pdfplumber and similar at module load.
+        Unlike importlib.util.LazyLoader this is safe when several threads
+        touch the module first at the same time.
+
+        Args:
+            name: Module to import, e.g. 'faiss'
+        """
+        super().__init__(name)
+        self._lazy_lock = threading.Lock()
+        self._lazy_module = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._lazy_module is not None
+
+    def load(self) -> types.ModuleType:
+        if self._lazy_module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self.__name__)
+        return self._lazy_module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
@@ -0,0 +1,376 @@
+"""
+In-process metrics: counters, gauges, latency histograms and timing spans,
+exposed in the Prometheus text format
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; spans range from sub-millisecond searches to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage timings of the request being served, when it asked for them (see collect_timings)
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('finsight_timings', default=None)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 function: Optional[Callable] = None):
+        """
+        A named family of samples, one per combination of label values
+
+        Args:
+            name: Metric name, e.g. 'finsight_llm_requests_total'
+            documentation: HELP text
+            labels: Label names
+            function: Optional callback evaluated at collection time instead
+                of recorded values; returns a number, or a dict mapping label
+                value tuples to numbers
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.function = function
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def values(self) -> Dict[Tuple[str, ...], object]:
+        """Current values keyed by label values"""
+        if self.function is None:
+            with self._lock:
+                return {key: list(value) if isinstance(value, list) else value
+                        for key, value in self._values.items()}
+        try:
+            value = self.function()
+        except Exception as e:
+            print(f"Metric {self.name} collection failed: {e}")
+            return {}
+        if not isinstance(value, dict):
+            return {(): value}
+        return {
+            tuple(str(v) for v in (key if isinstance(key, tuple) else (key,))): sample
+            for key, sample in value.items()
+        }
+
+    def render(self, values: Dict[Tuple[str, ...], object]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 function: Optional[Callable] = None, per_process: bool = False):
+        """
+        A value that goes up and down
+
+        Args:
+            per_process: Describes this process only (e.g. its memory), so
+                with several workers each reports its own sample under a pid
+                label. Other gauges describe shared state and are reported
+                by whichever worker answers the scrape.
+        """
+        super().__init__(name, documentation, labels, function)
+        self.per_process = per_process
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Distribution of observations in cumulative buckets
+
+        Args:
+            buckets: Upper bounds, ascending; +Inf is implied
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # Per label set: a count per bucket (+Inf last), then sum and count
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self, values: Dict[Tuple[str, ...], object]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        bucket_labels = self.labels + ('le',)
+        for key, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + (_format_value(bound),))} "
+                             f"{cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Process-wide collection of metrics
+
+        With several worker processes, call enable_multiprocess(): each
+        worker then periodically writes its counters and histograms to a
+        shared directory, and a scrape of any worker reports the sum over
+        all live workers.
+        """
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+        self.snapshot_dir: Optional[Path] = None
+        self.flush_interval = 5.0
+        self._last_flush = 0.0
+
+    def _register(self, cls, name: str, *args, **kwargs) -> Metric:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = (),
+                function: Optional[Callable] = None) -> Counter:
+        return self._register(Counter, name, documentation, labels, function)
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = (),
+              function: Optional[Callable] = None, per_process: bool = False) -> Gauge:
+        return self._register(Gauge, name, documentation, labels, function, per_process)
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labels, buckets)
+
+    def enable_multiprocess(self, snapshot_dir: str, flush_interval: float = 5.0):
+        """
+        Share metrics between worker processes through snapshot files
+
+        Args:
+            snapshot_dir: Directory every worker can write to
+            flush_interval: Minimum seconds between a worker's snapshot writes
+        """
+        self.snapshot_dir = Path(snapshot_dir)
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+
+    def _snapshot(self) -> Dict:
+        """This process's mergeable samples: counters, histograms and per-process gauges"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {
+            metric.name: [[list(key), value] for key, value in metric.values().items()]
+            for metric in metrics
+            if not isinstance(metric, Gauge) or metric.per_process
+        }
+
+    def _snapshot_path(self, pid: int) -> Path:
+        return self.snapshot_dir / f"{pid}.json"
+
+    def maybe_flush(self):
+        """Write this worker's snapshot if flush_interval has passed (cheap to call per request)"""
+        if self.snapshot_dir is None or time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        self.flush()
+
+    def flush(self):
+        if self.snapshot_dir is None:
+            return
+        self._last_flush = time.monotonic()
+        path = self._snapshot_path(os.getpid())
+        tmp = path.with_suffix('.tmp')
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self._snapshot(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Metrics snapshot failed: {e}")
+
+    def remove_snapshot(self):
+        """Drop this worker's snapshot when it exits (its counts leave the totals, like a restart)"""
+        if self.snapshot_dir is not None:
+            self._snapshot_path(os.getpid()).unlink(missing_ok=True)
+
+    def _other_snapshots(self) -> Dict[int, Dict]:
+        snapshots = {}
+        for path in self.snapshot_dir.glob('*.json'):
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                # Snapshots of crashed workers are ignored and cleaned up
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                path.unlink(missing_ok=True)
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path, 'r') as f:
+                    snapshots[pid] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        others = self._other_snapshots() if self.snapshot_dir is not None else {}
+
+        lines = []
+        for metric in metrics:
+            values = metric.values()
+            if isinstance(metric, Gauge) and metric.per_process and self.snapshot_dir is not None:
+                # One sample per worker, told apart by pid
+                merged = {key + (str(os.getpid()),): value for key, value in values.items()}
+                for pid, snapshot in others.items():
+                    for key, value in snapshot.get(metric.name, []):
+                        merged[tuple(key) + (str(pid),)] = value
+                labelled = Gauge(metric.name, metric.documentation, metric.labels + ('pid',))
+                lines.extend(labelled.render(merged))
+                continue
+            if not isinstance(metric, Gauge):
+                for snapshot in others.values():
+                    for key, value in snapshot.get(metric.name, []):
+                        key = tuple(key)
+                        if key not in values:
+                            values[key] = value
+                        elif isinstance(value, list):
+                            values[key] = [a + b for a, b in zip(values[key], value)]
+                        else:
+                            values[key] += value
+            lines.extend(metric.render(values))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram('finsight_stage_seconds', 'Time spent in query pipeline stages', ['stage'])
+STAGE_ERRORS = REGISTRY.counter('finsight_stage_errors_total', 'Query pipeline stages that raised', ['stage'])
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a block as a pipeline stage
+
+    Observes finsight_stage_seconds, counts exceptions, and adds the time to
+    the current request's breakdown when it is being collected. Costs a few
+    microseconds, so it is always on.
+
+    Args:
+        stage: Stage name, e.g. 'embed', 'search', 'llm'
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+@contextmanager
+def collect_timings():
+    """
+    Collect the spans of the enclosed block (in this thread) into a dict
+
+    Yields:
+        Dict of stage name -> seconds, filled as spans finish
+    """
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def timings_ms(timings: Dict[str, float], total: float) -> Dict[str, float]:
+    """A timing breakdown for API responses: '<stage>_ms' keys plus total_ms"""
+    breakdown = {f"{stage}_ms": round(seconds * 1000, 2) for stage, seconds in timings.items()}
+    breakdown['total_ms'] = round(total * 1000, 2)
+    return breakdown
+
+
+def resident_memory_bytes() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # No /proc (macOS): peak instead of current RSS
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
@@ -0,0 +1,240 @@
+"""
+Process-wide registry of loaded embedding models
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# torch: fp32 SentenceTransformer (reference)
+# torch_int8: same model with dynamically quantized int8 Linear layers
+# onnx / onnx_int8: ONNX Runtime export, fp32 or int8 weights
+BACKENDS = ('torch', 'torch_int8', 'onnx', 'onnx_int8')
+# onnxruntime sessions run concurrently (OnnxEncoder serializes only its
+# tokenizer); SentenceTransformer.encode shares a fast tokenizer that fails
+# under concurrent calls, so torch models take one caller at a time
+CONCURRENT_BACKENDS = ('onnx', 'onnx_int8')
+
+ENCODE_WAIT_SECONDS = REGISTRY.histogram('finsight_embedding_encode_wait_seconds',
+                                         'Time encodes waited for a model in use, by caller', ['caller'])
+
+
+def model_key(model_name: str, backend: str = 'torch') -> str:
+    """Identify a model + backend pair (embeddings differ slightly across backends)"""
+    return model_name if backend == 'torch' else f"{model_name}@{backend}"
+
+
+def load_model(model_name: str, backend: str = 'torch', onnx_dir: str = 'cache/onnx'):
+    """
+    Load a model with the given backend
+
+    Args:
+        model_name: Name of the sentence transformer model
+        backend: One of BACKENDS
+        onnx_dir: Where ONNX exports are cached
+
+    Returns:
+        Object with SentenceTransformer-style encode() and
+        get_sentence_embedding_dimension()
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    if backend in ('onnx', 'onnx_int8'):
+        from onnx_encoder import OnnxEncoder
+        return OnnxEncoder(model_name, export_dir=onnx_dir, quantized=backend == 'onnx_int8')
+
+    # Imported here: torch and transformers take seconds to import
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device='cpu' if backend == 'torch_int8' else None)
+    if backend == 'torch_int8':
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+class EncodeLock:
+    def __init__(self):
+        """
+        One-at-a-time model lock where queries go ahead of waiting ingestion
+
+        A query embed then waits for at most the ingestion micro-batch
+        already running, not for every batch queued behind it.
+        """
+        self._condition = threading.Condition()
+        self._busy = False
+        self._queries_waiting = 0
+
+    @contextmanager
+    def hold(self, query: bool = False):
+        """
+        Hold the model for one encode
+
+        Args:
+            query: Serve this caller before waiting ingestion batches
+        """
+        started = time.perf_counter()
+        with self._condition:
+            if query:
+                self._queries_waiting += 1
+                while self._busy:
+                    self._condition.wait()
+                self._queries_waiting -= 1
+            else:
+                while self._busy or self._queries_waiting:
+                    self._condition.wait()
+            self._busy = True
+        ENCODE_WAIT_SECONDS.observe(time.perf_counter() - started, caller='query' if query else 'ingest')
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+
+class ModelRegistry:
+    def __init__(self, onnx_dir: str = 'cache/onnx'):
+        """
+        Initialize an empty registry
+
+        Models are loaded once per backend, on first use or via warmup(),
+        and shared by every Embedder in the process.
+
+        Args:
+            onnx_dir: Where ONNX exports are cached
+        """
+        self.onnx_dir = onnx_dir
+        self._models: Dict[str, 'SentenceTransformer'] = {}
+        self._encode_locks: Dict[str, Optional[EncodeLock]] = {}
+        self._load_lock = threading.Lock()
+        # Per model key: state (loading, loaded, ready, failed) and timings
+        self._status: Dict[str, Dict] = {}
+
+    def get(self, model_name: str, backend: str = 'torch') -> 'SentenceTransformer':
+        """
+        Return the shared model instance, loading it if needed
+
+        Args:
+            model_name: Name of the sentence transformer model
+            backend: One of BACKENDS
+
+        Returns:
+            Loaded SentenceTransformer (or backend equivalent)
+        """
+        key = model_key(model_name, backend)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._load_lock:
+            # Another thread may have finished loading while we waited
+            model = self._models.get(key)
+            if model is None:
+                print(f"Loading embedding model: {model_name} ({backend})")
+                self._status[key] = {'state': 'loading'}
+                started = time.perf_counter()
+                try:
+                    model = load_model(model_name, backend, self.onnx_dir)
+                except Exception as e:
+                    self._status[key] = {'state': 'failed', 'error': str(e)}
+                    raise
+                self._encode_locks[key] = None if backend in CONCURRENT_BACKENDS else EncodeLock()
+                self._models[key] = model
+                self._status[key] = {'state': 'loaded',
+                                     'load_s': round(time.perf_counter() - started, 3)}
+        return model
+
+    def register(self, model_name: str, model, backend: str = 'torch'):
+        """
+        Use an already constructed model under a name (e.g. a stand-in
+        model for offline benchmarks)
+
+        Args:
+            model_name: Name Embedders will ask for
+            model: Object with encode() and get_sentence_embedding_dimension()
+            backend: One of BACKENDS
+        """
+        key = model_key(model_name, backend)
+        with self._load_lock:
+            self._encode_locks[key] = None if backend in CONCURRENT_BACKENDS else EncodeLock()
+            self._models[key] = model
+            self._status[key] = {'state': 'loaded', 'load_s': 0.0}
+
+    def encode(self, model_name: str, texts: List[str], backend: str = 'torch', query: bool = False,
+               **kwargs) -> np.ndarray:
+        """
+        Encode texts with the shared model
+
+        ONNX models encode concurrently; other backends take one caller at
+        a time, with queries ahead of waiting ingestion batches. The wait is
+        exported as finsight_embedding_encode_wait_seconds.
+
+        Args:
+            model_name: Name of the sentence transformer model
+            texts: List of text strings
+            backend: One of BACKENDS
+            query: Latency-sensitive query embed rather than ingestion
+            **kwargs: Extra arguments passed to encode()
+
+        Returns:
+            Numpy array of raw (unnormalized) embeddings
+        """
+        model = self.get(model_name, backend)
+        lock = self._encode_locks[model_key(model_name, backend)]
+        if lock is None:
+            return model.encode(texts, **kwargs)
+        with lock.hold(query):
+            return model.encode(texts, **kwargs)
+
+    def warmup(self, model_names: List[str], backend: str = 'torch'):
+        """
+        Load models and run a dummy encode so the first request is fast
+
+        Args:
+            model_names: Models to load
+            backend: One of BACKENDS
+        """
+        for model_name in model_names:
+            key = model_key(model_name, backend)
+            try:
+                self.get(model_name, backend)
+                started = time.perf_counter()
+                self.encode(model_name, ["warmup"], backend=backend, show_progress_bar=False)
+            except Exception as e:
+                print(f"Embedding model warmup failed: {model_name} ({backend}): {e}")
+                self._status[key] = {**self._status.get(key, {}), 'state': 'failed', 'error': str(e)}
+                continue
+            self._status[key] = {**self._status[key], 'state': 'ready',
+                                 'warmup_s': round(time.perf_counter() - started, 3)}
+            print(f"Embedding model ready: {model_name} ({backend})")
+
+    def is_loaded(self, model_name: str, backend: str = 'torch') -> bool:
+        """Check whether a model has already been loaded"""
+        return model_key(model_name, backend) in self._models
+
+    def status(self, model_name: str, backend: str = 'torch') -> Dict:
+        """
+        Load state of a model, for readiness checks
+
+        Returns:
+            Dict with 'state' (not_loaded, loading, loaded, ready or failed)
+            plus load_s/warmup_s timings or an error
+        """
+        return dict(self._status.get(model_key(model_name, backend), {'state': 'not_loaded'}))
+
+
+_registry = ModelRegistry()
+
+
+def get_registry() -> ModelRegistry:
+    """Return the process-wide model registry"""
+    return _registry
@@ -0,0 +1,167 @@
+"""
+ONNX Runtime encoder for sentence-transformer models (optionally int8-quantized)
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+MODEL_FILE = 'model.onnx'
+QUANTIZED_MODEL_FILE = 'model.int8.onnx'
+CONFIG_FILE = 'encoder.json'
+
+
+def export_model(model_name: str, export_dir: Path) -> Dict:
+    """
+    Export a SentenceTransformer's transformer to ONNX, with an int8 copy
+
+    Runs once per model; later loads only need onnxruntime and the tokenizer.
+
+    Args:
+        model_name: Name of the sentence transformer model
+        export_dir: Directory receiving the ONNX files and tokenizer
+
+    Returns:
+        Encoder config (pooling mode, max sequence length, dimension)
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    print(f"Exporting {model_name} to ONNX...")
+    export_dir.mkdir(parents=True, exist_ok=True)
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0]
+    auto_model = transformer.auto_model.eval()
+    pooling = model[1]
+
+    dummy = transformer.tokenizer(['warmup text'], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in dummy]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']}
+    with torch.no_grad():
+        torch.onnx.export(
+            auto_model,
+            tuple(dummy[name] for name in input_names),
+            str(export_dir / MODEL_FILE),
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            do_constant_folding=True,
+            opset_version=14
+        )
+    quantize_dynamic(str(export_dir / MODEL_FILE), str(export_dir / QUANTIZED_MODEL_FILE),
+                     weight_type=QuantType.QInt8)
+
+    transformer.tokenizer.save_pretrained(str(export_dir))
+    config = {
+        'pooling': 'cls' if getattr(pooling, 'pooling_mode_cls_token', False) else 'mean',
+        'max_seq_length': model.max_seq_length,
+        'dimension': model.get_sentence_embedding_dimension(),
+        'input_names': input_names
+    }
+    with open(export_dir / CONFIG_FILE, 'w') as f:
+        json.dump(config, f)
+    return config
+
+
+class OnnxEncoder:
+    def __init__(self, model_name: str, export_dir: str = 'cache/onnx', quantized: bool = True,
+                 max_batch_tokens: int = 16384):
+        """
+        Load (exporting on first use) an ONNX version of a sentence-transformer
+
+        Exposes the subset of the SentenceTransformer interface the model
+        registry uses, so either can back an Embedder.
+
+        Args:
+            model_name: Name of the sentence transformer model
+            export_dir: Root directory of exported models
+            quantized: Use the int8 dynamically quantized weights
+            max_batch_tokens: Padded tokens per batch; batches are built from
+                length-sorted texts so little of this is padding
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.quantized = quantized
+        self.max_batch_tokens = max_batch_tokens
+
+        model_dir = Path(export_dir) / model_name.replace('/', '__')
+        config_path = model_dir / CONFIG_FILE
+        if config_path.is_file():
+            with open(config_path, 'r') as f:
+                self.config = json.load(f)
+        else:
+            self.config = export_model(model_name, model_dir)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        # Fast tokenizers fail under concurrent calls; session.run does not
+        self.tokenizer_lock = threading.Lock()
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+        self.session = ort.InferenceSession(str(model_dir / model_file), options,
+                                            providers=['CPUExecutionProvider'])
+        self.max_seq_length = self.config['max_seq_length']
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config['dimension']
+
+    def _batches(self, lengths: List[int], batch_size: int) -> List[np.ndarray]:
+        """Group text indices, longest first, so each batch pads to similar lengths"""
+        order = np.argsort(lengths)[::-1]
+        batches = []
+        current = []
+        for i in order:
+            # The first text of a batch is its longest, so it sets the padded width
+            width = lengths[current[0]] if current else lengths[i]
+            if current and (len(current) >= batch_size or (len(current) + 1) * width > self.max_batch_tokens):
+                batches.append(np.array(current))
+                current = []
+            current.append(i)
+        if current:
+            batches.append(np.array(current))
+        return batches
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.config['pooling'] == 'cls':
+            return hidden[:, 0]
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               **kwargs) -> np.ndarray:
+        """
+        Encode texts into (unnormalized) sentence embeddings
+
+        Args:
+            texts: List of text strings
+            batch_size: Maximum texts per batch
+            show_progress_bar: Print batch progress
+
+        Returns:
+            float32 array, one row per text in input order
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        with self.tokenizer_lock:
+            encoded = self.tokenizer(list(texts), truncation=True, max_length=self.max_seq_length)
+        lengths = [len(ids) for ids in encoded['input_ids']]
+        output = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        batches = self._batches(lengths, batch_size)
+        for n, batch in enumerate(batches, start=1):
+            with self.tokenizer_lock:
+                features = self.tokenizer.pad(
+                    {name: [encoded[name][i] for i in batch] for name in self.config['input_names']},
+                    return_tensors='np'
+                )
+            inputs = {name: features[name].astype(np.int64) for name in self.config['input_names']}
+            hidden = self.session.run(None, inputs)[0]
+            output[batch] = self._pool(hidden, inputs['attention_mask'])
+            if show_progress_bar:
+                print(f"Encoded batch {n}/{len(batches)}")
+        return output
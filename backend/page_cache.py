@@ -0,0 +1,111 @@
+"""
+Persistent page-level cache of extracted PDF text keyed by document hash
+"""
+import time
+from typing import Dict, List
+
+from sqlite_db import SQLiteDatabase
+
+
+class PageCache:
+    def __init__(self, path: str = 'cache/pages.sqlite', max_entries: int = 200_000):
+        """
+        Initialize the page cache
+
+        Text is stored per (document hash, extraction engine, page), so a
+        document parsed once is never parsed again, and parsing policies
+        that share an engine (e.g. pdfplumber on its own, or as the table
+        fallback of a faster engine) reuse each other's pages.
+
+        Args:
+            path: SQLite database file
+            max_entries: Pages kept; least recently used are pruned beyond it
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.db = SQLiteDatabase(path, [
+            'CREATE TABLE IF NOT EXISTS pages '
+            '(document TEXT NOT NULL, engine TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, '
+            'used REAL NOT NULL, PRIMARY KEY (document, engine, page))',
+            'CREATE INDEX IF NOT EXISTS pages_used ON pages (used)'
+        ])
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, document_hash: str, engine: str, pages: List[int]) -> Dict[int, str]:
+        """
+        Look up the text of several pages
+
+        Args:
+            document_hash: SHA-256 of the PDF
+            engine: Extraction engine name
+            pages: 1-based page numbers
+
+        Returns:
+            Text by page number for the pages found (empty pages map to '')
+        """
+        if not pages:
+            return {}
+        with self.db.lock:
+            found = {}
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(pages), 500):
+                batch = pages[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.db.conn.execute(
+                    f'SELECT page, text FROM pages WHERE document = ? AND engine = ? AND page IN ({placeholders})',
+                    [document_hash, engine, *batch]
+                ).fetchall()
+                found.update(rows)
+            if found:
+                self.db.conn.executemany('UPDATE pages SET used = ? WHERE document = ? AND engine = ? AND page = ?',
+                                         [(time.time(), document_hash, engine, page) for page in found])
+                self.db.conn.commit()
+            self.hits += len(found)
+            self.misses += len(pages) - len(found)
+        return found
+
+    def put_many(self, document_hash: str, engine: str, texts: Dict[int, str]):
+        """
+        Store extracted pages, pruning old entries if needed
+
+        Args:
+            document_hash: SHA-256 of the PDF
+            engine: Extraction engine name
+            texts: Text by 1-based page number
+        """
+        if not texts:
+            return
+        now = time.time()
+        rows = [(document_hash, engine, page, text, now) for page, text in texts.items()]
+        with self.db.lock:
+            self.db.conn.executemany(
+                'INSERT OR REPLACE INTO pages (document, engine, page, text, used) VALUES (?, ?, ?, ?, ?)', rows
+            )
+            count = self.db.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            if count > self.max_entries:
+                self.db.conn.execute(
+                    'DELETE FROM pages WHERE rowid IN (SELECT rowid FROM pages ORDER BY used LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+            self.db.conn.commit()
+
+    def clear(self):
+        with self.db.lock:
+            self.db.conn.execute('DELETE FROM pages')
+            self.db.conn.commit()
+
+    def stats(self) -> Dict:
+        with self.db.lock:
+            size = self.db.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'size': size,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+    def close(self):
+        self.db.close()
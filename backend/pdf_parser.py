@@ -1,37 +1,419 @@
 """
-PDF Parser using pdfplumber for text extraction
+PDF text extraction with pluggable backends: pdfplumber, poppler's pdftotext
+and pdfium, with per-page fallback to pdfplumber for tabular pages
 """
-import pdfplumber
-from typing import List, Dict
+import importlib.util
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import List, Dict, Iterator, Optional, Tuple
+
+from lazy_import import LazyModule
+from metrics import REGISTRY
+
+pdfplumber = LazyModule('pdfplumber')
+pdfium = LazyModule('pypdfium2')
+
+PARSED_PAGES = REGISTRY.counter('finsight_parsed_pages_total', 'Pages extracted from PDFs, by engine', ['engine'])
+
+# A table row: mostly figures ("Net sales 2,475.4 2,302.3 3,219.3"), or a lone figure
+# when an engine emits table columns one cell per line
+NUMBER = re.compile(r'[(\-$€£]*\d[\d,.]*%?\)?')
+
+
+def looks_tabular(text: str, min_rows: int = 3) -> bool:
+    """
+    Whether extracted page text looks like it contains a table
+
+    Args:
+        text: Page text from any engine
+        min_rows: Lines that must be mostly figures
+
+    Returns:
+        True if at least min_rows lines have as many figures as words
+    """
+    rows = 0
+    for line in text.splitlines():
+        tokens = line.split()
+        figures = sum(1 for token in tokens if NUMBER.fullmatch(token))
+        if figures and figures * 2 >= len(tokens):
+            rows += 1
+            if rows >= min_rows:
+                return True
+    return False
+
+
+class ParserBackend(ABC):
+    """Text extraction engine; subclasses extract pages by 1-based number"""
+    name = None
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    @abstractmethod
+    def count_pages(self, pdf_path: str) -> int:
+        """Return the number of pages in a PDF"""
+
+    @abstractmethod
+    def extract(self, pdf_path: str, pages: List[int]) -> Dict[int, str]:
+        """
+        Extract the text of the given pages
+
+        Args:
+            pdf_path: Path to PDF file
+            pages: 1-based page numbers in ascending order
+
+        Returns:
+            Text by page number ('' for pages without text)
+        """
+
+
+class PdfplumberBackend(ParserBackend):
+    """Layout analysis in Python: slow, but keeps table rows on one line"""
+    name = 'pdfplumber'
+
+    def count_pages(self, pdf_path: str) -> int:
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+
+    def extract(self, pdf_path: str, pages: List[int]) -> Dict[int, str]:
+        texts = {}
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_num in pages:
+                page = pdf.pages[page_num - 1]
+                texts[page_num] = page.extract_text() or ''
+                # Drop cached layout objects; long ranges otherwise grow memory
+                page.flush_cache()
+        return texts
+
+
+class PdftotextBackend(ParserBackend):
+    """poppler's pdftotext (poppler-utils), run once per contiguous page run"""
+    name = 'pdftotext'
+
+    @classmethod
+    def available(cls) -> bool:
+        return shutil.which('pdftotext') is not None and shutil.which('pdfinfo') is not None
+
+    def count_pages(self, pdf_path: str) -> int:
+        output = subprocess.run(['pdfinfo', pdf_path], capture_output=True, check=True).stdout
+        match = re.search(rb'^Pages:\s+(\d+)', output, re.MULTILINE)
+        if match is None:
+            raise ValueError(f"pdfinfo reported no page count for {pdf_path}")
+        return int(match.group(1))
+
+    def extract(self, pdf_path: str, pages: List[int]) -> Dict[int, str]:
+        texts = {}
+        for first, last in _runs(pages):
+            output = subprocess.run(
+                ['pdftotext', '-q', '-enc', 'UTF-8', '-f', str(first), '-l', str(last), pdf_path, '-'],
+                capture_output=True, check=True
+            ).stdout.decode('utf-8', errors='replace')
+            # Every page ends with a form feed
+            for page_num, text in zip(range(first, last + 1), output.split('\f')):
+                texts[page_num] = text
+        return texts
+
+
+class PdfiumBackend(ParserBackend):
+    """PDFium's text layer via pypdfium2 (installed with pdfplumber): very fast, no layout analysis"""
+    name = 'pdfium'
+    # PDFium is not thread-safe; concurrent ingestion jobs share this process
+    lock = threading.Lock()
+
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec('pypdfium2') is not None
+
+    def count_pages(self, pdf_path: str) -> int:
+        with self.lock:
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+
+    def extract(self, pdf_path: str, pages: List[int]) -> Dict[int, str]:
+        texts = {}
+        with self.lock:
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                for page_num in pages:
+                    page = pdf[page_num - 1]
+                    text_page = page.get_textpage()
+                    texts[page_num] = text_page.get_text_bounded().replace('\r\n', '\n')
+                    text_page.close()
+                    page.close()
+            finally:
+                pdf.close()
+        return texts
+
+
+BACKENDS = {backend.name: backend for backend in (PdfplumberBackend, PdftotextBackend, PdfiumBackend)}
+# Tried in order by 'auto'
+AUTO_ORDER = ('pdftotext', 'pdfium', 'pdfplumber')
+TABLE_FALLBACK = 'pdfplumber'
+
+
+def resolve_backend(name: str) -> str:
+    """
+    Pick the extraction engine for a backend setting
+
+    Args:
+        name: 'pdfplumber', 'pdftotext', 'pdfium', or 'auto' for the
+            fastest one installed
+
+    Returns:
+        Engine name
+    """
+    if name == 'auto':
+        return next(candidate for candidate in AUTO_ORDER if BACKENDS[candidate].available())
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PDF parser backend: {name}")
+    if not BACKENDS[name].available():
+        raise ValueError(f"PDF parser backend {name} is not installed")
+    return name
+
+
+def _runs(pages: List[int]) -> Iterator[Tuple[int, int]]:
+    """Contiguous (first, last) runs of ascending page numbers"""
+    first = previous = None
+    for page_num in pages:
+        if previous is not None and page_num != previous + 1:
+            yield first, previous
+            first = None
+        if first is None:
+            first = page_num
+        previous = page_num
+    if first is not None:
+        yield first, previous
+
+
+def _extract_pages(pdf_path: str, engine: str, pages: List[int], fallback: Optional[str],
+                   tabular: List[int], fallback_cached: List[int], min_table_rows: int) -> List[Tuple[str, int, str]]:
+    """
+    Extract pages (in a worker process when the parser has several)
+
+    Pages the engine returns no text for (pdftotext and pdfium may stop
+    short of the page count) are extracted with the fallback engine even
+    when the table fallback is off.
+
+    Args:
+        pdf_path: Path to PDF file
+        engine: Backend for pages
+        pages: Pages without primary text yet
+        fallback: Backend re-extracting tabular pages, or None
+        tabular: Pages already known to be tabular that still need fallback text
+        fallback_cached: Pages whose fallback text is already cached
+
+    Returns:
+        (engine, page, text) for every page extracted
+    """
+    texts = BACKENDS[engine]().extract(pdf_path, pages) if pages else {}
+    extracted = [(engine, page_num, text) for page_num, text in texts.items()]
+    skip = set(fallback_cached)
+    redo = set()
+    if engine != TABLE_FALLBACK:
+        redo.update(page_num for page_num in pages if page_num not in texts and page_num not in skip)
+    if fallback is not None:
+        redo.update(tabular)
+        redo.update(page_num for page_num, text in texts.items()
+                    if page_num not in skip and looks_tabular(text, min_table_rows))
+    if redo:
+        extracted.extend((TABLE_FALLBACK, page_num, text)
+                         for page_num, text in BACKENDS[TABLE_FALLBACK]().extract(pdf_path, sorted(redo)).items())
+    return extracted
+
 
 class PDFParser:
-    def __init__(self):
-        pass
-    
-    def parse_pdf(self, pdf_path: str) -> Dict[str, any]:
+    def __init__(self, workers: int = 1, pages_per_task: int = 8, backend: str = 'pdfplumber',
+                 table_fallback: bool = True, page_cache=None, min_table_rows: int = 3):
+        """
+        Initialize parser
+
+        With several workers, one process pool is started on first use and
+        kept until shutdown(). Its processes come from a forkserver, not a
+        fork of this (multithreaded) process, so they never inherit a lock
+        held by another thread such as PdfiumBackend.lock. Like every
+        forkserver child they import the main module again.
+
+        Args:
+            workers: Number of worker processes; 1 parses in-process
+            pages_per_task: Pages extracted per worker task
+            backend: Extraction engine ('pdfplumber', 'pdftotext', 'pdfium' or 'auto')
+            table_fallback: Re-extract pages that look tabular with pdfplumber,
+                whose layout analysis keeps table rows together
+            page_cache: PageCache reused across documents and policies; None disables it
+            min_table_rows: Mostly-numeric lines that make a page tabular
+        """
+        self.workers = max(1, workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.engine = resolve_backend(backend)
+        self.fallback = TABLE_FALLBACK if table_fallback and self.engine != TABLE_FALLBACK else None
+        self.page_cache = page_cache
+        self.min_table_rows = min_table_rows
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        """The worker pool, started on first use"""
+        with self._pool_lock:
+            # A pool inherited through fork (e.g. from gunicorn's master) is the parent's
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('forkserver'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def shutdown(self):
+        """Stop the worker processes started by this process"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pool_pid == os.getpid():
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def config(self) -> Dict:
+        """Settings that change the extracted text and so belong in the index cache key"""
+        return {
+            'parser': self.engine,
+            'table_fallback': self.fallback,
+            'min_table_rows': self.min_table_rows if self.fallback else None
+        }
+
+    def count_pages(self, pdf_path: str) -> int:
+        """Return the number of pages in a PDF"""
+        return BACKENDS[self.engine]().count_pages(pdf_path)
+
+    def _page_ranges(self, total_pages: int) -> Iterator[List[int]]:
+        for start in range(1, total_pages + 1, self.pages_per_task):
+            yield list(range(start, min(start + self.pages_per_task, total_pages + 1)))
+
+    def _plan(self, pdf_path: str, pages: List[int], document_hash: Optional[str]) -> Tuple:
+        """Look up cached pages and build the extraction task for the rest"""
+        primary, fallback = {}, {}
+        if self.page_cache is not None and document_hash is not None:
+            primary = self.page_cache.get_many(document_hash, self.engine, pages)
+            if self.fallback is not None:
+                fallback = self.page_cache.get_many(document_hash, self.fallback, pages)
+
+        missing = [page_num for page_num in pages if page_num not in primary]
+        tabular = [page_num for page_num, text in primary.items()
+                   if self.fallback is not None and page_num not in fallback
+                   and looks_tabular(text, self.min_table_rows)]
+        task = None
+        if missing or tabular:
+            task = (pdf_path, self.engine, missing, self.fallback, tabular, list(fallback), self.min_table_rows)
+        return pages, primary, fallback, task
+
+    def _resolve(self, plan: Tuple, extracted: List[Tuple[str, int, str]],
+                 document_hash: Optional[str]) -> List[Dict]:
+        """Merge cached and newly extracted text into the final pages"""
+        pages, primary, fallback, _ = plan
+        new = {}
+        for engine, page_num, text in extracted:
+            new.setdefault(engine, {})[page_num] = text
+            PARSED_PAGES.inc(engine=engine)
+        if self.page_cache is not None and document_hash is not None:
+            for engine, texts in new.items():
+                self.page_cache.put_many(document_hash, engine, texts)
+        primary.update(new.get(self.engine, {}))
+        if self.engine != TABLE_FALLBACK:
+            fallback.update(new.get(TABLE_FALLBACK, {}))
+
+        pages_text = []
+        for page_num in pages:
+            text = primary.get(page_num)
+            # A page the primary engine did not return is taken from the fallback
+            if text is None or (page_num in fallback and looks_tabular(text, self.min_table_rows)):
+                text = fallback.get(page_num, '')
+            if text.strip():
+                pages_text.append({
+                    'page': page_num,
+                    'text': text
+                })
+        return pages_text
+
+    def iter_pages(self, pdf_path: str, total_pages: int = None,
+                   document_hash: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Yield extracted pages in page order as soon as they are ready
+
+        Page ranges are extracted in a process pool; at most two ranges per
+        worker are in flight so memory stays bounded for large documents.
+        Pages found in the page cache are not extracted again.
+
+        Args:
+            pdf_path: Path to PDF file
+            total_pages: Page count if already known
+            document_hash: SHA-256 of the file; enables the page cache
+
+        Yields:
+            Dicts with 'page' and 'text' keys (pages without text are skipped)
+        """
+        if total_pages is None:
+            total_pages = self.count_pages(pdf_path)
+
+        plans = (self._plan(pdf_path, pages, document_hash) for pages in self._page_ranges(total_pages))
+
+        if self.workers == 1:
+            for plan in plans:
+                task = plan[3]
+                yield from self._resolve(plan, _extract_pages(*task) if task else [], document_hash)
+            return
+
+        pool = self._executor()
+
+        def submit(plan: Tuple) -> Tuple[Tuple, Optional[Future]]:
+            task = plan[3]
+            return plan, pool.submit(_extract_pages, *task) if task else None
+
+        pending = deque()
+        try:
+            pending.extend(submit(plan) for plan in islice(plans, self.workers * 2))
+            while pending:
+                plan, future = pending.popleft()
+                extracted = future.result() if future is not None else []
+                next_plan = next(plans, None)
+                if next_plan is not None:
+                    pending.append(submit(next_plan))
+                yield from self._resolve(plan, extracted, document_hash)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory): the next document gets a new pool
+            with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            # The pool is shared: only drop this document's queued ranges
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+    def parse_pdf(self, pdf_path: str, document_hash: Optional[str] = None) -> Dict[str, any]:
         """
         Extract text from PDF file
-        
+
         Args:
             pdf_path: Path to PDF file
-            
+            document_hash: SHA-256 of the file; enables the page cache
+
         Returns:
             Dictionary with pages and extracted text
         """
-        pages_text = []
-        
-        with pdfplumber.open(pdf_path) as pdf:
-            total_pages = len(pdf.pages)
-            
-            for page_num, page in enumerate(pdf.pages, start=1):
-                text = page.extract_text()
-                if text:
-                    pages_text.append({
-                        'page': page_num,
-                        'text': text
-                    })
-        
+        total_pages = self.count_pages(pdf_path)
+
         return {
             'total_pages': total_pages,
-            'pages': pages_text
+            'pages': list(self.iter_pages(pdf_path, total_pages, document_hash))
         }
@@ -0,0 +1,243 @@
+"""
+Streaming ingestion pipeline: parse -> chunk -> embed -> index
+"""
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from pdf_parser import PDFParser
+from chunker import TextChunker
+from embedder import Embedder
+from faiss_store import FAISSStore
+
+# End-of-stream marker passed between stages
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    """Raised inside a stage when another stage failed or the run was stopped"""
+
+
+class IngestionCancelled(Exception):
+    """Raised by IngestionPipeline.run when its cancel event was set"""
+
+
+class StageStats:
+    def __init__(self, name: str):
+        """
+        Throughput counters for one pipeline stage
+
+        Args:
+            name: Stage name
+        """
+        self.name = name
+        self.items = 0
+        self.wait_seconds = 0.0
+        self.started = None
+        self.finished = None
+
+    @property
+    def busy_seconds(self) -> float:
+        """Time spent working, excluding time blocked on the queues"""
+        if self.started is None:
+            return 0.0
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return max(0.0, end - self.started - self.wait_seconds)
+
+    def as_dict(self) -> Dict:
+        busy = self.busy_seconds
+        return {
+            'items': self.items,
+            'busy_seconds': round(busy, 4),
+            'wait_seconds': round(self.wait_seconds, 4),
+            'items_per_second': round(self.items / busy, 2) if busy > 0 else None
+        }
+
+
+class IngestionPipeline:
+    def __init__(self, parser: PDFParser, chunker: TextChunker, embedder: Embedder,
+                 store: FAISSStore, batch_size: int = 32, queue_size: int = 64):
+        """
+        Initialize the pipeline
+
+        Each stage runs in its own thread and hands work to the next one
+        through a bounded queue, so parsing, embedding and indexing overlap
+        and only a few batches are held in memory at a time.
+
+        Args:
+            parser: PDF parser (its worker pool is used for extraction)
+            chunker: Text chunker
+            embedder: Embedder
+            store: Vector store receiving incremental adds
+            batch_size: Chunks embedded per micro-batch
+            queue_size: Capacity of each inter-stage queue
+        """
+        self.parser = parser
+        self.chunker = chunker
+        self.embedder = embedder
+        self.store = store
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    def run(self, pdf_path: str, progress: Optional[Callable] = None,
+            cancel_event: Optional[threading.Event] = None, document_hash: Optional[str] = None) -> Dict:
+        """
+        Ingest a PDF into the vector store
+
+        Args:
+            pdf_path: Path to PDF file
+            progress: Called with keyword counters (pages_total, pages_parsed,
+                chunks_embedded) as work completes
+            cancel_event: When set, all stages stop and IngestionCancelled is raised
+            document_hash: SHA-256 of the file; lets the parser reuse cached pages
+
+        Returns:
+            Dictionary with page/chunk counts and per-stage throughput
+        """
+        self._stop = threading.Event()
+        self._cancel = cancel_event
+        self._progress = progress
+        self._document_hash = document_hash
+        self._errors: List[BaseException] = []
+        self.stats = {name: StageStats(name) for name in ('parse', 'chunk', 'embed', 'index')}
+
+        started = time.perf_counter()
+        total_pages = self.parser.count_pages(pdf_path)
+        self._report(pages_total=total_pages)
+
+        page_queue = queue.Queue(maxsize=self.queue_size)
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        batch_queue = queue.Queue(maxsize=max(2, self.queue_size // self.batch_size))
+
+        threads = [
+            threading.Thread(target=self._stage, args=('parse', self._parse, pdf_path, total_pages, page_queue),
+                             daemon=True),
+            threading.Thread(target=self._stage, args=('chunk', self._chunk, page_queue, chunk_queue),
+                             daemon=True),
+            threading.Thread(target=self._stage, args=('embed', self._embed, chunk_queue, batch_queue),
+                             daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        # The index stage runs in the calling thread
+        self._stage('index', self._index, batch_queue)
+
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+        if self._cancelled():
+            raise IngestionCancelled()
+
+        stages = {name: stat.as_dict() for name, stat in self.stats.items()}
+        bottleneck = max(self.stats.values(), key=lambda s: s.busy_seconds).name
+
+        return {
+            'total_pages': total_pages,
+            'total_chunks': self.stats['index'].items,
+            'elapsed_seconds': round(time.perf_counter() - started, 4),
+            'stages': stages,
+            'bottleneck': bottleneck
+        }
+
+    def _cancelled(self) -> bool:
+        return self._cancel is not None and self._cancel.is_set()
+
+    def _stopped(self) -> bool:
+        return self._stop.is_set() or self._cancelled()
+
+    def _report(self, **counters):
+        if self._progress is not None:
+            self._progress(**counters)
+
+    def _stage(self, name: str, target, *args):
+        stat = self.stats[name]
+        stat.started = time.perf_counter()
+        try:
+            target(stat, *args)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            stat.finished = time.perf_counter()
+
+    def _put(self, stat: StageStats, q: queue.Queue, item):
+        waited = time.perf_counter()
+        try:
+            while True:
+                if self._stopped():
+                    raise PipelineAborted()
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        finally:
+            stat.wait_seconds += time.perf_counter() - waited
+
+    def _drain(self, stat: StageStats, q: queue.Queue) -> Iterator:
+        while True:
+            waited = time.perf_counter()
+            try:
+                while True:
+                    if self._stopped():
+                        raise PipelineAborted()
+                    try:
+                        item = q.get(timeout=0.1)
+                        break
+                    except queue.Empty:
+                        continue
+            finally:
+                stat.wait_seconds += time.perf_counter() - waited
+            if item is _DONE:
+                return
+            yield item
+
+    def _parse(self, stat: StageStats, pdf_path: str, total_pages: int, out: queue.Queue):
+        pages = self.parser.iter_pages(pdf_path, total_pages, self._document_hash)
+        try:
+            for page in pages:
+                stat.items += 1
+                self._put(stat, out, page)
+                self._report(pages_parsed=page['page'])
+        finally:
+            # Shuts down the parser's worker pool if we stop early
+            pages.close()
+        self._put(stat, out, _DONE)
+
+    def _chunk(self, stat: StageStats, inp: queue.Queue, out: queue.Queue):
+        for chunk in self.chunker.iter_chunks(self._drain(stat, inp)):
+            stat.items += 1
+            self._put(stat, out, chunk)
+        self._put(stat, out, _DONE)
+
+    def _embed(self, stat: StageStats, inp: queue.Queue, out: queue.Queue):
+        batch = []
+        for chunk in self._drain(stat, inp):
+            batch.append(chunk)
+            if len(batch) >= self.batch_size:
+                self._embed_batch(stat, batch, out)
+                batch = []
+        if batch:
+            self._embed_batch(stat, batch, out)
+        self._put(stat, out, _DONE)
+
+    def _embed_batch(self, stat: StageStats, batch: List[Dict], out: queue.Queue):
+        embeddings = self.embedder.embed_texts([chunk['text'] for chunk in batch], show_progress_bar=False)
+        stat.items += len(batch)
+        self._put(stat, out, (embeddings, batch))
+
+    def _index(self, stat: StageStats, inp: queue.Queue):
+        for embeddings, batch in self._drain(stat, inp):
+            self.store.add_embeddings(np.asarray(embeddings), batch)
+            stat.items += len(batch)
+            self._report(chunks_embedded=stat.items)
+        # Train/convert the index now that every vector has arrived
+        self.store.finalize()
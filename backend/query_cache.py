@@ -0,0 +1,163 @@
+"""
+Caches for repeated questions: query embeddings and LLM answers
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r'\s+', ' ', query).strip().lower().rstrip('?.! ')
+
+
+class TTLCache:
+    def __init__(self, max_size: int = 1024, ttl: float = 3600):
+        """
+        Thread-safe LRU cache whose entries also expire after a TTL
+
+        Args:
+            max_size: Maximum number of entries
+            ttl: Seconds an entry stays valid; 0 disables expiry
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data: 'OrderedDict[object, Tuple[float, object]]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[0] > self.ttl:
+                del self.data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic(), value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def items(self) -> List[Tuple[object, object]]:
+        """Snapshot of unexpired (key, value) pairs"""
+        now = time.monotonic()
+        with self.lock:
+            return [(k, v) for k, (t, v) in self.data.items() if not self.ttl or now - t <= self.ttl]
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+
+class QueryCache:
+    def __init__(self, max_embeddings: int = 1024, max_answers: int = 512, ttl: float = 3600,
+                 similarity_threshold: float = 0.0):
+        """
+        Initialize the query cache
+
+        Args:
+            max_embeddings: Query embeddings kept (LRU)
+            max_answers: LLM answers kept (LRU)
+            ttl: Seconds before a cached entry expires
+            similarity_threshold: Cosine similarity at which a differently
+                worded question that retrieved the same chunks reuses a cached
+                answer; 0 disables near-duplicate lookup
+        """
+        self.embeddings = TTLCache(max_embeddings, ttl)
+        self.answers = TTLCache(max_answers, ttl)
+        self.similarity_threshold = similarity_threshold
+        self.near_hits = 0
+
+    def get_embedding(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        return self.embeddings.get((model_name, normalize_query(query)))
+
+    def put_embedding(self, model_name: str, query: str, embedding: np.ndarray):
+        self.embeddings.put((model_name, normalize_query(query)), embedding)
+
+    def _answer_key(self, document_hash: str, query: str, chunk_ids: List[int]) -> str:
+        payload = f"{document_hash}|{normalize_query(query)}|{','.join(map(str, chunk_ids))}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_answer(self, document_hash: str, query: str, chunk_ids: List[int],
+                   query_embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        """
+        Look up a cached answer
+
+        Args:
+            document_hash: Hash of the queried document
+            query: User query
+            chunk_ids: IDs of the retrieved chunks, in rank order
+            query_embedding: Normalized query embedding for near-duplicate lookup
+
+        Returns:
+            Cached answer, or None
+        """
+        entry = self.answers.get(self._answer_key(document_hash, query, chunk_ids))
+        if entry is not None:
+            return entry['answer']
+
+        if not self.similarity_threshold or query_embedding is None:
+            return None
+
+        candidates = [
+            entry for _, entry in self.answers.items()
+            if entry['document_hash'] == document_hash and entry['chunk_ids'] == chunk_ids
+            and entry['embedding'] is not None
+        ]
+        if not candidates:
+            return None
+
+        similarities = np.stack([c['embedding'] for c in candidates]) @ query_embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.similarity_threshold:
+            with self.answers.lock:
+                self.near_hits += 1
+            return candidates[best]['answer']
+        return None
+
+    def put_answer(self, document_hash: str, query: str, chunk_ids: List[int], answer: str,
+                   query_embedding: Optional[np.ndarray] = None):
+        self.answers.put(self._answer_key(document_hash, query, chunk_ids), {
+            'document_hash': document_hash,
+            'chunk_ids': list(chunk_ids),
+            'embedding': query_embedding,
+            'answer': answer
+        })
+
+    def clear(self):
+        self.embeddings.clear()
+        self.answers.clear()
+
+    def stats(self) -> Dict:
+        return {
+            'embeddings': self.embeddings.stats(),
+            'answers': {**self.answers.stats(), 'near_duplicate_hits': self.near_hits}
+        }
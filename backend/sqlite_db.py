@@ -0,0 +1,54 @@
+"""
+SQLite connection that is safe to use across threads and forked worker processes
+"""
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List
+
+
+class SQLiteDatabase:
+    def __init__(self, path: str, schema: List[str]):
+        """
+        Open (and create) a database
+
+        A connection must never cross a fork: under a pre-fork server each
+        worker process transparently opens its own on first use.
+
+        Args:
+            path: Database file
+            schema: Statements run on every new connection (use IF NOT EXISTS)
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.schema = schema
+        self._pid = None
+        self._conn = None
+        self._lock = None
+        self.conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # Locks are recreated too: one held by a thread at fork time
+            # would never be released in the child
+            self._lock = threading.Lock()
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            for statement in self.schema:
+                self._conn.execute(statement)
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    @property
+    def lock(self) -> threading.Lock:
+        self.conn
+        return self._lock
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._pid = None
+        self._conn = None
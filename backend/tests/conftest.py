@@ -0,0 +1,26 @@
+"""
+Shared fixtures: the Flask app under test, imported once per session
+"""
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope='session')
+def client(tmp_path_factory):
+    # app creates uploads/ and cache/ relative to the working directory on import
+    workdir = tmp_path_factory.mktemp('app')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ['MAX_UPLOAD_MB'] = '1'
+    try:
+        app = importlib.import_module('app')
+        yield app.app.test_client(), workdir
+    finally:
+        os.environ.pop('MAX_UPLOAD_MB', None)
+        os.chdir(cwd)
@@ -0,0 +1,74 @@
+"""
+Resumable chunked uploads: create, append, resume after an offset mismatch, complete
+"""
+import hashlib
+import io
+
+import pytest
+
+from upload_store import InvalidUpload, UploadOffsetMismatch, UploadStore
+
+BODY = b'%PDF-1.4\n' + bytes(range(256)) * 40
+
+
+class TrickleStream(io.BytesIO):
+    """Request body that returns at most a few bytes per read, like a slow socket"""
+
+    def read(self, size=-1):
+        return super().read(min(size, 3) if size and size > 0 else 3)
+
+
+def test_store_resumes_after_offset_mismatch_and_completes(tmp_path):
+    store = UploadStore(str(tmp_path), block_size=1024)
+    status = store.create('report.pdf', len(BODY), {'session_id': 's1'})
+    upload_id = status['upload_id']
+    assert status['offset'] == 0
+
+    status = store.append(upload_id, 0, TrickleStream(BODY[:4000]))
+    assert status['offset'] == 4000
+
+    # A retried chunk must not be applied twice
+    with pytest.raises(UploadOffsetMismatch) as mismatch:
+        store.append(upload_id, 0, io.BytesIO(BODY[:4000]))
+    assert mismatch.value.offset == 4000
+
+    status = store.append(upload_id, mismatch.value.offset, io.BytesIO(BODY[4000:]))
+    assert status['offset'] == status['size'] == len(BODY)
+
+    stored, info = store.complete(upload_id)
+    assert stored.sha256 == hashlib.sha256(BODY).hexdigest()
+    assert stored.path.read_bytes() == BODY
+    assert info['metadata'] == {'session_id': 's1'}
+    with pytest.raises(KeyError):
+        store.status(upload_id)
+
+
+def test_store_rejects_first_chunk_without_pdf_magic(tmp_path):
+    store = UploadStore(str(tmp_path))
+    upload_id = store.create('fake.pdf', 100)['upload_id']
+
+    with pytest.raises(InvalidUpload):
+        store.append(upload_id, 0, TrickleStream(b'<html>' + b'0' * 94))
+    assert store.status(upload_id)['offset'] == 0
+
+
+def test_chunk_at_wrong_offset_is_409_with_resume_offset(client):
+    test_client, _ = client
+    created = test_client.post('/api/uploads', json={'filename': 'report.pdf', 'size': len(BODY)})
+    assert created.status_code == 201
+    upload_id = created.get_json()['upload_id']
+
+    first = test_client.put(f'/api/uploads/{upload_id}?offset=0', data=BODY[:1000])
+    assert first.status_code == 200
+    assert first.get_json()['offset'] == 1000
+
+    retried = test_client.put(f'/api/uploads/{upload_id}?offset=0', data=BODY[:1000])
+    assert retried.status_code == 409
+    assert retried.get_json()['offset'] == 1000
+
+    resumed = test_client.put(f'/api/uploads/{upload_id}', data=BODY[1000:2000],
+                              headers={'Upload-Offset': str(retried.get_json()['offset'])})
+    assert resumed.status_code == 200
+    assert test_client.get(f'/api/uploads/{upload_id}').get_json()['offset'] == 2000
+
+    assert test_client.delete(f'/api/uploads/{upload_id}').status_code == 200
@@ -0,0 +1,27 @@
+"""
+Upload size limit: bodies between MAX_UPLOAD_MB and MAX_CONTENT_LENGTH
+"""
+import io
+import os
+
+
+def test_upload_over_limit_is_413_and_leaves_no_partial_file(client):
+    test_client, workdir = client
+    # Over max_bytes (1 MB) but within MAX_CONTENT_LENGTH (max + 1 MB)
+    body = b'%PDF-1.4\n' + b'0' * (1024 * 1024 + 512 * 1024)
+
+    response = test_client.post('/api/upload', data={'file': (io.BytesIO(body), 'big.pdf')})
+
+    assert response.status_code == 413
+    assert response.get_json() == {'error': 'Upload exceeds 1 MB'}
+    assert os.listdir(workdir / 'uploads' / 'partial') == []
+    assert [p for p in os.listdir(workdir / 'uploads') if p.endswith('.pdf')] == []
+
+
+def test_chunked_upload_over_limit_is_413(client):
+    test_client, _ = client
+
+    response = test_client.post('/api/uploads', json={'filename': 'big.pdf', 'size': 2 * 1024 * 1024})
+
+    assert response.status_code == 413
+    assert response.get_json() == {'error': f"Upload exceeds {1024 * 1024} bytes"}
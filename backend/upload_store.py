@@ -0,0 +1,318 @@
+"""
+Uploaded PDFs on disk: streamed in fixed-size blocks, hashed on the way in and
+stored under content-addressed names, with resumable chunked uploads
+"""
+import fcntl
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from index_cache import hash_file
+
+PDF_MAGIC = b'%PDF-'
+PARTIAL_DIR = 'partial'
+
+
+class InvalidUpload(ValueError):
+    """Raised when uploaded bytes are not a PDF or do not match the declared upload"""
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    """
+    Raised when an upload exceeds the size limit
+
+    An HTTP 413 rather than a ValueError: Werkzeug's form parser silently
+    drops ValueErrors raised while it writes a multipart file part.
+    """
+
+
+class UploadOffsetMismatch(Exception):
+    """Raised when a chunk does not start where the partial upload ends"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload continues at byte {offset}")
+        self.offset = offset
+
+
+class UploadBusy(Exception):
+    """Raised when another request is writing to the same partial upload"""
+
+
+class StoredUpload:
+    def __init__(self, path: Path, sha256: str, size: int):
+        """
+        A complete upload at its content-addressed path
+
+        Args:
+            path: <upload_dir>/<sha256>.pdf
+            sha256: Hex digest of the content (also the document hash for ingestion)
+            size: Bytes
+        """
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+
+class IncomingFile:
+    def __init__(self, store: 'UploadStore'):
+        """
+        Writable temporary file that hashes and counts what is written
+
+        Handed to Werkzeug as the container for a multipart file part, so
+        the body goes to disk as it is parsed and is never held in memory.
+        Deleted on close unless committed.
+
+        Args:
+            store: Store the file belongs to
+        """
+        self.store = store
+        self.path = store.partial_dir / f"{uuid.uuid4().hex}.incoming"
+        self.file = open(self.path, 'w+b')
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.committed = False
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.store.max_bytes:
+            self.close()
+            raise UploadTooLarge(f"Upload exceeds {self.store.max_bytes} bytes")
+        if len(self.head) < len(PDF_MAGIC):
+            self.head += data[:len(PDF_MAGIC) - len(self.head)]
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self.file.readline(size)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+        if not self.committed:
+            self.path.unlink(missing_ok=True)
+
+
+class UploadStore:
+    def __init__(self, upload_dir: str = 'uploads', max_bytes: int = 500 * 1024 ** 2,
+                 block_size: int = 1024 * 1024, partial_ttl: float = 24 * 3600):
+        """
+        Initialize the store
+
+        Files are named by the SHA-256 of their content, so concurrent
+        uploads never overwrite each other and identical files are kept
+        once. Partial chunked uploads live on disk (offset = bytes written),
+        so any worker process can continue them.
+
+        Args:
+            upload_dir: Directory for complete uploads
+            max_bytes: Largest accepted upload
+            block_size: Bytes read and written per step; memory per upload
+                stays at about this size whatever the file size
+            partial_ttl: Seconds an idle partial upload is kept
+        """
+        self.upload_dir = Path(upload_dir)
+        self.partial_dir = self.upload_dir / PARTIAL_DIR
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.partial_ttl = partial_ttl
+
+    def incoming(self) -> IncomingFile:
+        return IncomingFile(self)
+
+    def commit(self, incoming: IncomingFile) -> StoredUpload:
+        """
+        Move a fully received file to its content-addressed name
+
+        Args:
+            incoming: File Werkzeug streamed the multipart body into
+
+        Returns:
+            The stored upload
+        """
+        incoming.file.close()
+        if incoming.head != PDF_MAGIC:
+            incoming.close()
+            raise InvalidUpload("File is not a PDF")
+        stored = self._store(incoming.path, incoming.digest.hexdigest(), incoming.size)
+        incoming.committed = True
+        return stored
+
+    def save_stream(self, stream: BinaryIO) -> StoredUpload:
+        """Copy a readable stream to the store block by block"""
+        incoming = self.incoming()
+        try:
+            for block in iter(lambda: stream.read(self.block_size), b''):
+                incoming.write(block)
+            return self.commit(incoming)
+        finally:
+            incoming.close()
+
+    def _store(self, path: Path, sha256: str, size: int) -> StoredUpload:
+        target = self.upload_dir / f"{sha256}.pdf"
+        # Same name means same bytes: replacing an existing copy is harmless,
+        # and readers of the old file keep their open handle
+        os.replace(path, target)
+        return StoredUpload(target, sha256, size)
+
+    # ---------------- Resumable chunked uploads ----------------
+
+    def _partial_paths(self, upload_id: str):
+        if not upload_id.isalnum():
+            raise KeyError(upload_id)
+        return self.partial_dir / f"{upload_id}.part", self.partial_dir / f"{upload_id}.json"
+
+    def create(self, filename: str, size: int, metadata: Optional[Dict] = None) -> Dict:
+        """
+        Start a chunked upload
+
+        Args:
+            filename: Original file name (kept for display)
+            size: Total bytes the client will send
+            metadata: Extra JSON-serializable fields returned on completion
+
+        Returns:
+            Upload status (upload_id, offset, size)
+        """
+        if size <= 0:
+            raise InvalidUpload("size must be positive")
+        if size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self.expire()
+
+        upload_id = uuid.uuid4().hex
+        part_path, info_path = self._partial_paths(upload_id)
+        part_path.touch()
+        # Written last: its presence marks a usable partial upload
+        with open(info_path, 'w') as f:
+            json.dump({'filename': filename, 'size': size, 'metadata': metadata or {}}, f)
+        return self.status(upload_id)
+
+    def _info(self, upload_id: str) -> Dict:
+        part_path, info_path = self._partial_paths(upload_id)
+        try:
+            with open(info_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise KeyError(upload_id)
+
+    def status(self, upload_id: str) -> Dict:
+        """Bytes received so far; raises KeyError for unknown or expired uploads"""
+        info = self._info(upload_id)
+        part_path, _ = self._partial_paths(upload_id)
+        return {
+            'upload_id': upload_id,
+            'filename': info['filename'],
+            'offset': part_path.stat().st_size,
+            'size': info['size']
+        }
+
+    def append(self, upload_id: str, offset: int, stream: BinaryIO) -> Dict:
+        """
+        Write one chunk of a chunked upload
+
+        Args:
+            upload_id: Upload from create()
+            offset: Byte position the chunk starts at; must equal the bytes
+                received so far (see status()) so retries are never applied twice
+            stream: Request body, read block by block
+
+        Returns:
+            Upload status; offset == size means the upload is complete
+        """
+        info = self._info(upload_id)
+        part_path, info_path = self._partial_paths(upload_id)
+        # Active uploads never expire
+        os.utime(info_path)
+        with open(part_path, 'r+b') as f:
+            try:
+                # One writer at a time, across worker processes too
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadBusy(f"Upload {upload_id} is being written by another request")
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise UploadOffsetMismatch(current)
+            if current == 0:
+                # A stream may return fewer bytes than asked for before EOF
+                head = b''
+                while len(head) < len(PDF_MAGIC):
+                    block = stream.read(len(PDF_MAGIC) - len(head))
+                    if not block:
+                        break
+                    head += block
+                if head != PDF_MAGIC:
+                    raise InvalidUpload("File is not a PDF")
+                f.write(head)
+                current = len(head)
+
+            f.seek(current)
+            for block in iter(lambda: stream.read(self.block_size), b''):
+                current += len(block)
+                if current > info['size']:
+                    # Keep what fits so the client can resume from a valid offset
+                    f.truncate(current - len(block))
+                    raise InvalidUpload(f"Upload is larger than the declared {info['size']} bytes")
+                f.write(block)
+        return self.status(upload_id)
+
+    def complete(self, upload_id: str) -> Tuple[StoredUpload, Dict]:
+        """
+        Hash a fully received chunked upload and move it to its content-addressed name
+
+        Returns:
+            The stored upload and the upload's info (filename, size, metadata)
+        """
+        info = self._info(upload_id)
+        part_path, info_path = self._partial_paths(upload_id)
+        size = part_path.stat().st_size
+        if size != info['size']:
+            raise InvalidUpload(f"Upload incomplete: {size} of {info['size']} bytes")
+        # Chunks may arrive at different workers, so the hash is computed here
+        # in one sequential pass rather than carried between requests
+        stored = self._store(part_path, hash_file(str(part_path), self.block_size), size)
+        info_path.unlink(missing_ok=True)
+        return stored, info
+
+    def abort(self, upload_id: str) -> bool:
+        part_path, info_path = self._partial_paths(upload_id)
+        existed = info_path.exists()
+        info_path.unlink(missing_ok=True)
+        part_path.unlink(missing_ok=True)
+        return existed
+
+    def expire(self):
+        """Remove partial uploads idle for longer than partial_ttl"""
+        cutoff = time.time() - self.partial_ttl
+        for path in self.partial_dir.iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+
+    def clear(self):
+        """Delete every upload, complete or partial"""
+        for directory in (self.upload_dir, self.partial_dir):
+            for path in directory.iterdir():
+                if path.is_file():
+                    path.unlink(missing_ok=True)
@@ -7,22 +7,55 @@ export interface UploadResponse {
   filename: string;
   pages: number;
   chunks: number;
+  cached?: boolean;
 }
 
+export interface JobResponse {
+  job_id: string;
+  filename: string;
+  status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+  progress: {
+    pages_total: number | null;
+    pages_parsed: number;
+    chunks_embedded: number;
+  };
+  result: (Omit<UploadResponse, "status"> & { document_id: string }) | null;
+  error: string | null;
+}
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
+// Conversation id issued by the backend; keeps this tab's chat history separate
+let sessionId: string | null = null;
+
 export interface QueryResponse {
   answer: string;
   chunks: Array<{
     chunk_id: number;
     page: number;
+    page_end?: number;
     text: string;
     score: number;
+    document_id?: string;
+    filename?: string;
   }>;
+  context?: {
+    candidates: number;
+    chunks: number;
+    tokens_before: number;
+    tokens_after: number;
+    tokens_saved: number;
+  };
+  session_id?: string;
 }
 
 export interface ChunkResponse {
   chunk_id: number;
   page: number;
+  page_end?: number;
   text: string;
+  document_id?: string;
+  filename?: string;
 }
 
 export interface HealthResponse {
@@ -30,9 +63,29 @@ export interface HealthResponse {
   groq_available: boolean;
 }
 
-export async function uploadPDF(file: File): Promise<UploadResponse> {
+export async function getJob(jobId: string): Promise<JobResponse> {
+  const response = await fetch(`${API_BASE}/jobs/${jobId}`);
+
+  if (!response.ok) {
+    throw new Error("Failed to fetch ingestion status");
+  }
+
+  return response.json();
+}
+
+export async function cancelJob(jobId: string): Promise<JobResponse> {
+  const response = await fetch(`${API_BASE}/jobs/${jobId}/cancel`, { method: "POST" });
+  return response.json();
+}
+
+// Upload returns a job id right away; poll until ingestion finishes
+export async function uploadPDF(
+  file: File,
+  onProgress?: (job: JobResponse) => void,
+): Promise<UploadResponse> {
   const formData = new FormData();
   formData.append("file", file);
+  if (sessionId) formData.append("session_id", sessionId);
 
   const response = await fetch(`${API_BASE}/upload`, {
     method: "POST",
@@ -48,16 +101,35 @@ export async function uploadPDF(file: File): Promise<UploadResponse> {
     throw new Error(message);
   }
 
-  return response.json();
+  const { job_id } = await response.json();
+
+  while (true) {
+    const job = await getJob(job_id);
+    onProgress?.(job);
+
+    if (job.status === "succeeded" && job.result) {
+      return { status: "success", ...job.result };
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error || "Failed to process PDF");
+    }
+    if (job.status === "cancelled") {
+      throw new Error("Upload was cancelled");
+    }
+
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
 }
 
 export async function queryDocument(query: string): Promise<QueryResponse> {
   const response = await fetch(`${API_BASE}/query`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ query }),
+    body: JSON.stringify({ query, session_id: sessionId }),
   });
-  return response.json();
+  const data: QueryResponse = await response.json();
+  if (data.session_id) sessionId = data.session_id;
+  return data;
 }
 
 export async function getChunk(chunkId: number): Promise<ChunkResponse> {
@@ -77,6 +149,7 @@ export async function getChunk(chunkId: number): Promise<ChunkResponse> {
 
 export async function resetApplication(): Promise<void> {
   await fetch(`${API_BASE}/reset`, { method: "POST" });
+  sessionId = null;
 }
 
 export async function checkHealth(): Promise<HealthResponse> {
@@ -28,7 +28,7 @@ export default function ChatPage() {
   const { toast } = useToast();
 
   const uploadMutation = useMutation({
-    mutationFn: uploadPDF,
+    mutationFn: (file: File) => uploadPDF(file),
     onSuccess: (data) => {
       setUploadedFile({
         name: data.filename,
@@ -1,6 +1,7 @@
-from backend.app import app
+from backend.app import app, start_warmup
 
 if __name__ == "__main__":
     import os
     port = int(os.getenv("PORT", 7860))  # HF defaults to 7860
+    start_warmup()
     app.run(host="0.0.0.0", port=port)